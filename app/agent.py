@@ -18,7 +18,7 @@ from langchain.agents import create_tool_calling_agent, AgentExecutor
 from app.tools import (
     add_todo, remove_todo, list_todos, complete_todo, save_user_name, 
     get_user_name, clear_todos, count_todos, get_analytics, 
-    search_todos, get_motivational_quote, set_reminder
+    search_todos, find_todo, get_motivational_quote, set_reminder
 )
 
 # --- 1. Load the LLM ---
@@ -56,7 +56,7 @@ except Exception as e:
 tools = [
     add_todo, remove_todo, list_todos, complete_todo, save_user_name, 
     get_user_name, clear_todos, count_todos, get_analytics, 
-    search_todos, get_motivational_quote, set_reminder
+    search_todos, find_todo, get_motivational_quote, set_reminder
 ]
 
 # --- 3. Create the Prompt ---
@@ -92,6 +92,8 @@ prompt = ChatPromptTemplate.from_messages([
         " • Suggest productivity tips and insights"
         " • Celebrate completions and progress"
         " • Provide detailed analytics when requested"
+        " • To act on a task the user describes loosely, call find_todo and use"
+        " the id it returns rather than listing every todo"
     )),
     MessagesPlaceholder(variable_name="chat_history", optional=True),
     ("human", "{input}"),
@@ -0,0 +1,191 @@
+"""
+Time-bucketed productivity rollups.
+
+Each analytics event (task created, task completed, conversation) bumps a
+per-day and a per-hour counter, so dashboards and range queries never
+scan raw todos or history. Rollups live in storage.json under
+``analytics_rollups``:
+
+    {
+        "daily":  {"2025-09-01": [created, completed, conversations], ...},
+        "hourly": {"2025-09-01T14": [created, completed, conversations], ...},
+        "first_day": "2025-09-01",
+        "best_day": "2025-09-03",
+        "tasks_created": 42
+    }
+
+Hourly buckets older than HOURLY_RETENTION_DAYS are pruned when a new hour
+starts; daily buckets are kept forever (one small entry per active day).
+"""
+
+from datetime import datetime, timedelta
+
+ROLLUP_FIELDS = ("tasks_created", "tasks_completed", "conversations")
+EVENT_FIELDS = {
+    "task_created": 0,
+    "task_completed": 1,
+    "conversation": 2
+}
+HOURLY_RETENTION_DAYS = 14
+MAX_DAILY_BUCKETS = 366
+MAX_HOURLY_BUCKETS = HOURLY_RETENTION_DAYS * 24
+
+
+def _day_key(when):
+    return when.strftime("%Y-%m-%d")
+
+
+def _hour_key(when):
+    return when.strftime("%Y-%m-%dT%H")
+
+
+def to_local_time(when):
+    """Convert an aware datetime to naive local time, the zone buckets are keyed in"""
+    if when.tzinfo is not None:
+        return when.astimezone().replace(tzinfo=None)
+    return when
+
+
+def record_event(rollups, action, when=None, count=1):
+    """
+    Count analytics events in their day and hour buckets.
+
+    Args:
+        rollups (dict): The analytics_rollups document, updated in place
+        action (str): task_created, task_completed or conversation
+        when (datetime): Event time (defaults to now)
+        count (int): Number of events of this kind at that time
+    """
+    field = EVENT_FIELDS.get(action)
+    if field is None or count <= 0:
+        return
+    when = when or datetime.now()
+    daily = rollups.setdefault("daily", {})
+    hourly = rollups.setdefault("hourly", {})
+    day, hour = _day_key(when), _hour_key(when)
+
+    if hour not in hourly:
+        cutoff = _hour_key(when - timedelta(days=HOURLY_RETENTION_DAYS))
+        for key in [key for key in hourly if key < cutoff]:
+            del hourly[key]
+        hourly[hour] = [0] * len(ROLLUP_FIELDS)
+    hourly[hour][field] += count
+
+    bucket = daily.setdefault(day, [0] * len(ROLLUP_FIELDS))
+    bucket[field] += count
+
+    if rollups.get("first_day") is None or day < rollups["first_day"]:
+        rollups["first_day"] = day
+    if action == "task_created":
+        rollups["tasks_created"] = rollups.get("tasks_created", 0) + count
+    elif action == "task_completed":
+        best_day = rollups.get("best_day")
+        if best_day not in daily or _best_day_rank(daily, day) < _best_day_rank(daily, best_day):
+            rollups["best_day"] = day
+
+
+def _best_day_rank(daily, day):
+    """Ordering for best_day: most completions first, ties to the earliest day"""
+    return (-daily[day][1], day)
+
+
+def retract_event(rollups, action, when):
+    """
+    Undo one event counted by record_event, e.g. a completion reverted.
+
+    Buckets that have since been pruned are left alone, and counts never
+    go below zero.
+
+    Args:
+        rollups (dict): The analytics_rollups document, updated in place
+        action (str): task_created, task_completed or conversation
+        when (datetime): Time the event was recorded at
+    """
+    field = EVENT_FIELDS.get(action)
+    if field is None:
+        return
+    day = _day_key(when)
+    for buckets, key in ((rollups.get("daily", {}), day),
+                         (rollups.get("hourly", {}), _hour_key(when))):
+        bucket = buckets.get(key)
+        if bucket is not None and bucket[field] > 0:
+            bucket[field] -= 1
+    if action == "task_created" and rollups.get("tasks_created", 0) > 0:
+        rollups["tasks_created"] -= 1
+    elif action == "task_completed" and rollups.get("best_day") == day:
+        daily = rollups.get("daily", {})
+        best_day = min(daily, key=lambda key: _best_day_rank(daily, key), default=None)
+        rollups["best_day"] = best_day if best_day and daily[best_day][1] else None
+
+
+def productivity_summary(rollups, today=None):
+    """
+    Derive most_productive_day and average_tasks_per_day from rollups.
+
+    The average only counts tasks recorded since rollups began, so older
+    installs aren't skewed by tasks created before the first bucket.
+
+    Args:
+        rollups (dict): The analytics_rollups document
+        today (date): Reference day (defaults to today)
+
+    Returns:
+        dict: most_productive_day (day with most completions, or None)
+        and average_tasks_per_day since the first recorded day
+    """
+    first_day = rollups.get("first_day")
+    if not first_day:
+        return {"most_productive_day": None, "average_tasks_per_day": 0}
+    today = today or datetime.now().date()
+    days = (today - datetime.strptime(first_day, "%Y-%m-%d").date()).days + 1
+    return {
+        "most_productive_day": rollups.get("best_day"),
+        "average_tasks_per_day": round(rollups.get("tasks_created", 0) / max(days, 1), 2)
+    }
+
+
+def timeseries(rollups, start, end, granularity="day"):
+    """
+    Answer a range query from the rollups without touching raw records.
+
+    Args:
+        rollups (dict): The analytics_rollups document
+        start (datetime): First bucket (inclusive); aware values are
+            converted to local time
+        end (datetime): Last bucket (inclusive), likewise
+        granularity (str): "day" or "hour"
+
+    Returns:
+        dict: series (one entry per bucket, zero-filled) and totals
+
+    Raises:
+        ValueError: On an unknown granularity, reversed or oversized range
+    """
+    start, end = to_local_time(start), to_local_time(end)
+    if granularity == "day":
+        buckets, key = rollups.get("daily", {}), _day_key
+        step, limit = timedelta(days=1), MAX_DAILY_BUCKETS
+        start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif granularity == "hour":
+        buckets, key = rollups.get("hourly", {}), _hour_key
+        step, limit = timedelta(hours=1), MAX_HOURLY_BUCKETS
+        start = start.replace(minute=0, second=0, microsecond=0)
+    else:
+        raise ValueError("granularity must be 'day' or 'hour'")
+    if end < start:
+        raise ValueError("end must not be before start")
+    if (end - start) // step + 1 > limit:
+        raise ValueError(f"range exceeds {limit} {granularity} buckets")
+
+    series = []
+    totals = dict.fromkeys(ROLLUP_FIELDS, 0)
+    current = start
+    while current <= end:
+        counts = buckets.get(key(current), [0] * len(ROLLUP_FIELDS))
+        entry = {"bucket": key(current)}
+        for name, value in zip(ROLLUP_FIELDS, counts):
+            entry[name] = value
+            totals[name] += value
+        series.append(entry)
+        current += step
+    return {"series": series, "totals": totals}
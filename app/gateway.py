@@ -0,0 +1,431 @@
+"""
+ASGI gateway: chat on an event loop, everything else through Flask.
+
+Under sync gunicorn workers a chat turn holds a worker for as long as
+OpenRouter takes to answer, so a handful of slow completions stall every
+endpoint. The gateway serves the chat routes (POST /api/chat,
+/api/chat/stream and the legacy /prompt) itself with AsyncLLMClient: a
+turn waiting on the provider is a suspended coroutine costing a few
+kilobytes, not a thread. Every other request goes to the Flask app in
+main.py on a bounded thread pool, so cheap endpoints such as /api/todos
+stay responsive however many chats are in flight.
+
+    gunicorn app.gateway:app -k uvicorn.workers.UvicornWorker
+    uvicorn app.gateway:app --port 5000
+
+At most REX_GATEWAY_MAX_CONCURRENCY provider calls run at once per
+worker. Further chats wait up to REX_GATEWAY_QUEUE_TIMEOUT seconds for a
+slot, then get a 503. Flask runs on REX_GATEWAY_WSGI_THREADS threads,
+which also do the storage writes at the end of each turn. GET
+/api/gateway/stats reports in-flight and queued turns and the async
+client's timings. Flask responses are buffered, which is fine for
+everything except SSE, and the gateway serves its own SSE route.
+"""
+
+import asyncio
+import functools
+import io
+import json
+import os
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import main  # Loads .env before the settings below are read
+from app import llm
+from app import response_cache
+from app import semantic_cache
+
+MAX_CONCURRENCY = int(os.getenv("REX_GATEWAY_MAX_CONCURRENCY", "1000"))
+QUEUE_TIMEOUT = float(os.getenv("REX_GATEWAY_QUEUE_TIMEOUT", "10"))
+WSGI_THREADS = int(os.getenv("REX_GATEWAY_WSGI_THREADS", "16"))
+MAX_CHAT_BODY_BYTES = 1024 * 1024
+AI_TIMEOUT = 30  # Seconds, as in main.get_ai_response
+
+BODY_TOO_LARGE = object()  # _read_body() result for a body over its limit
+
+
+class GatewayBusy(RuntimeError):
+    """No provider slot freed up within the queue timeout"""
+
+
+class Gateway:
+    """ASGI application wrapping a WSGI app with async chat routes"""
+
+    def __init__(self, wsgi_app, max_concurrency=MAX_CONCURRENCY,
+                 queue_timeout=QUEUE_TIMEOUT, wsgi_threads=WSGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.wsgi_threads = wsgi_threads
+        self.executor = ThreadPoolExecutor(max_workers=wsgi_threads,
+                                           thread_name_prefix="rex-wsgi")
+        self.client = None  # AsyncLLMClient; bound to the worker's event loop
+        self._slots = None
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.routes = {
+            ("POST", "/api/chat"): functools.partial(self.chat, field="message"),
+            ("POST", "/prompt"): functools.partial(self.chat, field="prompt"),
+            ("POST", "/api/chat/stream"): self.chat_stream,
+            ("GET", "/api/gateway/stats"): self.stats,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        handler = self.routes.get((scope["method"], scope["path"]))
+        if handler is None:
+            await self._call_wsgi(scope, receive, send)
+        else:
+            await handler(scope, receive, send)
+
+    # --- Lifecycle ----------------------------------------------------------
+
+    def _ensure_client(self):
+        if self.client is None:
+            self.client = llm.AsyncLLMClient(max_connections=self.max_concurrency)
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self.client
+
+    async def _preconnect(self):
+        try:
+            connect_ms = await self._ensure_client().preconnect()
+            print(f"🔌 Gateway pre-connected to {self.client.base_url} in {connect_ms} ms")
+        except Exception as e:
+            print(f"Error pre-connecting gateway: {e}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._ensure_client()
+                # Chat routes bypass Flask's before_request hook that runs this
+                await self._run_sync(main.start_app, False)
+                if os.getenv("OPENROUTER_API_KEY"):
+                    asyncio.ensure_future(self._preconnect())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.client is not None:
+                    await self.client.aclose()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # --- Helpers ------------------------------------------------------------
+
+    async def _run_sync(self, func, *args):
+        """Run blocking app code (storage, rule-based replies) off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    @staticmethod
+    async def _read_body(receive, limit=None):
+        """
+        Read the request body.
+
+        Returns:
+            bytes: The body; None if the client disconnected first, or
+            BODY_TOO_LARGE if it exceeds limit bytes
+        """
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            body += message.get("body", b"")
+            if limit is not None and len(body) > limit:
+                return BODY_TOO_LARGE
+            if not message.get("more_body"):
+                return bytes(body)
+
+    @staticmethod
+    async def _wait_for_disconnect(receive, disconnected):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    @staticmethod
+    async def _send_json(send, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _provider_slot(self):
+        """Wait for one of max_concurrency provider slots (give it back with _release_slot())"""
+        self._ensure_client()
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise GatewayBusy("Too many chats in progress, please try again shortly") from None
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    # --- AI responses -------------------------------------------------------
+
+    async def ai_response(self, user_message):
+        """
+        Async counterpart of main.get_ai_response.
+
+        Raises:
+            GatewayBusy: If no provider slot freed up in time
+        """
+        if os.getenv("OPENROUTER_API_KEY"):
+            cached, cache_key = await self._run_sync(main.get_cached_response, user_message)
+            if cached is not None:
+                return cached  # No provider slot needed
+
+            await self._provider_slot()
+            try:
+                content, _ = await self.client.chat_completion(
+                    main.build_ai_messages(user_message), timeout=AI_TIMEOUT
+                )
+                if content is not None:
+                    await self._run_sync(main.cache_ai_response, user_message, cache_key, content)
+                    return content
+            except Exception as e:
+                print(f"Error getting AI response: {e}")
+            finally:
+                self._release_slot()
+        return await self._run_sync(main.get_intelligent_response, user_message)
+
+    async def stream_ai_response(self, user_message):
+        """
+        Async counterpart of main.stream_ai_response.
+
+        Raises:
+            GatewayBusy: If no provider slot freed up in time
+        """
+        if os.getenv("OPENROUTER_API_KEY"):
+            cached, cache_key = await self._run_sync(main.get_cached_response, user_message)
+            if cached is not None:
+                yield cached
+                return
+
+            await self._provider_slot()
+            pieces = []
+            try:
+                async for text in self.client.stream_chat_completion(
+                    main.build_ai_messages(user_message), timeout=AI_TIMEOUT
+                ):
+                    pieces.append(text)
+                    yield text
+                if pieces:
+                    await self._run_sync(main.cache_ai_response, user_message, cache_key,
+                                         "".join(pieces))
+                    return
+            except Exception as e:
+                if pieces:
+                    raise  # Part of the reply was already sent
+                print(f"Error streaming AI response: {e}")
+            finally:
+                self._release_slot()
+        yield await self._run_sync(main.get_intelligent_response, user_message)
+
+    # --- Routes -------------------------------------------------------------
+
+    async def _read_message(self, receive, send, field):
+        """
+        Read field from a JSON request body.
+
+        Returns:
+            str: The stripped field ("" if missing), or None if the request
+            was already answered (413) or the client went away
+        """
+        body = await self._read_body(receive, MAX_CHAT_BODY_BYTES)
+        if body is None:
+            return None
+        if body is BODY_TOO_LARGE:
+            await self._send_json(send, 413, {"error": "Request body too large"})
+            return None
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            data = {}
+        return str(data.get(field, "")).strip() if isinstance(data, dict) else ""
+
+    async def chat(self, scope, receive, send, field):
+        """POST /api/chat and /prompt, as in main.py but without holding a thread"""
+        label = "Message" if field == "message" else "Prompt"
+        user_message = await self._read_message(receive, send, field)
+        if user_message is None:
+            return
+        if not user_message:
+            await self._send_json(send, 400, {"error": f"{label} is required"})
+            return
+
+        user_entry = {
+            "role": "user",
+            "content": user_message,
+            "timestamp": datetime.now().isoformat()
+        }
+        try:
+            ai_response = await self.ai_response(user_message)
+            await self._run_sync(main.save_chat_turn, user_entry, ai_response)
+        except GatewayBusy as e:
+            await self._send_json(send, 503, {"error": str(e), "status": "error"})
+            return
+        except Exception as e:
+            print(f"❌ Gateway chat error: {e}")
+            traceback.print_exc()
+            await self._send_json(send, 500, {
+                "error": f"Failed to process {label.lower()}: {str(e)}",
+                "status": "error"
+            })
+            return
+        await self._send_json(send, 200, {"response": ai_response, "status": "success"})
+
+    async def chat_stream(self, scope, receive, send):
+        """
+        POST /api/chat/stream: same events as main.chat_stream.
+
+        Nothing is saved for a client that disconnects before the turn's
+        save starts; a save already under way runs to completion.
+        """
+        user_message = await self._read_message(receive, send, "message")
+        if user_message is None:
+            return
+        if not user_message:
+            await self._send_json(send, 400, {"error": "Message is required"})
+            return
+
+        user_entry = {
+            "role": "user",
+            "content": user_message,
+            "timestamp": datetime.now().isoformat()
+        }
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        disconnected = asyncio.Event()
+        relay = asyncio.ensure_future(self._relay_stream(send, user_entry, disconnected))
+        watcher = asyncio.ensure_future(self._wait_for_disconnect(receive, disconnected))
+        done, _ = await asyncio.wait({relay, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if relay not in done:
+            relay.cancel()  # Client left: stop generating and save nothing
+        watcher.cancel()
+        await asyncio.gather(relay, watcher, return_exceptions=True)
+
+    async def _relay_stream(self, send, user_entry, disconnected):
+        async def event(name, data):
+            await send({"type": "http.response.body", "more_body": True,
+                        "body": main.sse_event(name, data).encode('utf-8')})
+
+        pieces = []
+        try:
+            async for text in self.stream_ai_response(user_entry["content"]):
+                pieces.append(text)
+                await event("token", {"text": text})
+            ai_response = "".join(pieces)
+            if disconnected.is_set():
+                return  # Left after the last token but before cancel() landed
+            await self._run_sync(main.save_chat_turn, user_entry, ai_response)
+            await event("done", {"response": ai_response, "status": "success"})
+        except GatewayBusy as e:
+            await event("error", {"error": str(e), "status": "error"})
+        except Exception as e:
+            print(f"❌ Gateway chat stream error: {e}")
+            traceback.print_exc()
+            await event("error", {
+                "error": f"Failed to process message: {str(e)}",
+                "status": "error"
+            })
+        await send({"type": "http.response.body", "body": b""})
+
+    async def stats(self, scope, receive, send):
+        """GET /api/gateway/stats"""
+        await self._send_json(send, 200, {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "queue_timeout": self.queue_timeout,
+            "wsgi_threads": self.wsgi_threads,
+            **(self.client.stats() if self.client is not None else {}),
+            **response_cache.get_cache().stats(),
+            **semantic_cache.get_cache().stats(),
+            "status": "success"
+        })
+
+    # --- WSGI bridge --------------------------------------------------------
+
+    @staticmethod
+    def _environ(scope, body):
+        """Build a PEP 3333 environ for an ASGI HTTP request"""
+        server = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode('utf-8').decode('latin-1'),
+            "PATH_INFO": scope["path"].encode('utf-8').decode('latin-1'),
+            "QUERY_STRING": scope.get("query_string", b"").decode('latin-1'),
+            "SERVER_NAME": str(server[0]),
+            "SERVER_PORT": str(server[1] or 80),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope.get("headers", []):
+            name = name.decode('latin-1').upper().replace("-", "_")
+            value = value.decode('latin-1')
+            if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                environ[name] = value
+            else:
+                key = f"HTTP_{name}"
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _run_wsgi(self, environ):
+        """Call the WSGI app on a pool thread; returns (status, headers, body)"""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+            return lambda data: response.setdefault("written", []).append(data)
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            body = b"".join(response.get("written", [])) + b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return response["status"], response["headers"], body
+
+    async def _call_wsgi(self, scope, receive, send):
+        body = await self._read_body(receive)
+        if body is None:
+            return  # Client went away mid-request
+        status, headers, payload = await self._run_sync(
+            self._run_wsgi, self._environ(scope, body)
+        )
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": payload})
+
+
+app = Gateway(main.app)
@@ -0,0 +1,600 @@
+"""
+Append-only conversation history store.
+
+Chat turns used to live inside storage.json, so every message forced a
+full re-serialization of the whole file. History now lives next to it in
+two JSONL files:
+
+- ``<name>.history.jsonl``: the snapshot, one message per line
+- ``<name>.history.journal``: the journal, where new turns are appended
+
+Appending a turn is O(size of the turn). Once the journal grows past
+``compact_threshold`` records a background thread folds it into the
+snapshot and truncates it.
+
+A sidecar ``<name>.history.idx`` records the byte offset of every snapshot
+line, so a page of history is read with one seek instead of parsing the
+whole file. Messages are addressed by their 0-based position, which is
+also the cursor used by ``page()``.
+
+Old messages are moved out of the hot snapshot into a cold tier: gzipped,
+immutable JSONL segments in ``<name>.history.archive/``, one per day of
+messages per archival run, listed in ``manifest.json``. Archival runs after
+each background compaction and keeps the hot snapshot within
+REX_HISTORY_HOT_MAX_MESSAGES messages and REX_HISTORY_HOT_MAX_AGE_DAYS
+days (0 disables either limit). Archived messages keep their positions and
+are decompressed lazily when a page reaches them.
+
+Messages are also indexed for full-text search in
+``<name>.history.fts.db`` (see app/history_search.py). Appends never
+wait on the index: it catches up before each search and after each
+background compaction.
+"""
+
+import gzip
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import groupby
+from pathlib import Path
+
+from app.history_search import HistorySearchIndex
+from app.schema import normalize_message, upgrade_jsonl
+from app.storage import FileLock, atomic_write_bytes
+
+COMPACT_THRESHOLD = int(os.getenv("REX_HISTORY_COMPACT_THRESHOLD", "200"))
+HOT_MAX_MESSAGES = int(os.getenv("REX_HISTORY_HOT_MAX_MESSAGES", "2000"))
+HOT_MAX_AGE_DAYS = int(os.getenv("REX_HISTORY_HOT_MAX_AGE_DAYS", "90"))
+SEGMENT_CACHE_SIZE = 8  # Decompressed cold segments kept in memory
+
+
+def _parse_lines(raw):
+    """
+    Parse JSONL bytes into a list of messages.
+
+    The fast path parses everything as one JSON array. If that fails
+    (e.g. a torn final line after a crash) each line is parsed on its
+    own and unreadable lines are skipped.
+    """
+    lines = [line for line in raw.decode('utf-8').split('\n') if line.strip()]
+    if not lines:
+        return []
+    try:
+        return json.loads('[' + ','.join(lines) + ']')
+    except ValueError:
+        messages = []
+        for line in lines:
+            try:
+                messages.append(json.loads(line))
+            except ValueError:
+                print(f"Skipping unreadable history record: {line[:80]!r}")
+        return messages
+
+
+def _encode(messages):
+    """Encode messages as JSONL bytes"""
+    return ''.join(
+        json.dumps(message, ensure_ascii=False) + '\n' for message in messages
+    ).encode('utf-8')
+
+
+class HistoryJournal:
+    """Snapshot-plus-journal store for conversation_history."""
+
+    def __init__(self, storage_file, compact_threshold=COMPACT_THRESHOLD,
+                 hot_max_messages=HOT_MAX_MESSAGES, hot_max_age_days=HOT_MAX_AGE_DAYS):
+        storage_file = Path(storage_file)
+        self.snapshot_file = storage_file.with_name(f"{storage_file.stem}.history.jsonl")
+        self.journal_file = storage_file.with_name(f"{storage_file.stem}.history.journal")
+        self.index_file = storage_file.with_name(f"{storage_file.stem}.history.idx")
+        self.archive_dir = storage_file.with_name(f"{storage_file.stem}.history.archive")
+        self.manifest_file = self.archive_dir / "manifest.json"
+        self.search_index = HistorySearchIndex(
+            storage_file.with_name(f"{storage_file.stem}.history.fts.db")
+        )
+        self.compact_threshold = compact_threshold
+        self.hot_max_messages = hot_max_messages
+        self.hot_max_age_days = hot_max_age_days
+        # Shared with other workers: compaction must not race their appends
+        self._lock = FileLock(storage_file.with_name(f".{storage_file.stem}.history.lock"))
+        self._journal_records = None  # Lazily counted on first append
+        self._compacting = False
+        self._index = None  # Line-start offsets of the snapshot
+        self._index_key = None  # (st_ino, st_size) the index was built for
+        self._manifest = None
+        self._manifest_key = None
+        self._segments = OrderedDict()  # file name -> messages, for the current manifest
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return b''
+
+    def append(self, *messages):
+        """
+        Append messages to the journal.
+
+        Args:
+            *messages (dict): Chat messages to persist, in order
+
+        Schedules a background compaction once the journal is large enough.
+        """
+        payload = _encode(messages)
+        with self._lock:
+            if self._journal_records is None:
+                self._journal_records = self._read(self.journal_file).count(b'\n')
+            with open(self.journal_file, 'ab') as f:
+                f.write(payload)
+            self._journal_records += len(messages)
+            should_compact = (
+                self._journal_records >= self.compact_threshold and not self._compacting
+            )
+            if should_compact:
+                self._compacting = True
+
+        if should_compact:
+            threading.Thread(target=self._compact_in_background, daemon=True).start()
+
+    def _sync_search_index(self):
+        """Index messages appended since the last sync; never raises"""
+        try:
+            with self._lock:
+                self.search_index.sync(self)
+        except Exception as e:
+            print(f"Error updating history search index: {e}")
+
+    def search(self, query, limit, cursor=0, role=None):
+        """
+        Full-text search over every stored message, archived ones included.
+
+        Appends don't touch the index. It catches up here, and after each
+        background compaction, so chat turns never wait on SQLite.
+
+        Args:
+            query (str): Terms that must all match (AND, word prefixes match)
+            limit (int): Maximum number of hits
+            cursor (int): ``next_cursor`` from the previous page
+            role (str): Only match "user" or "assistant" messages
+
+        Returns:
+            dict: hits (position, role, timestamp, snippet, score), total,
+            next_cursor and has_more
+        """
+        with self._lock:
+            self.search_index.sync(self)  # Catch up on appends since the last sync
+        return self.search_index.search(query, limit, cursor, role)
+
+    def _load_index(self):
+        """
+        Return line-start offsets of the snapshot; callers hold self._lock.
+
+        The sidecar is trusted while the snapshot keeps its inode and size.
+        If the same file only grew (compaction appends), just the new tail
+        is scanned; a replaced snapshot is re-indexed from scratch.
+        """
+        try:
+            stat = os.stat(self.snapshot_file)
+            key = (stat.st_ino, stat.st_size)
+        except FileNotFoundError:
+            key = (0, 0)
+        if self._index is not None and self._index_key == key:
+            return self._index
+
+        offsets, indexed_key = array('Q'), (0, 0)
+        raw = self._read(self.index_file)
+        if len(raw) >= 16:
+            header = array('Q', raw[:16])
+            indexed_key = (header[0], header[1])
+            offsets.frombytes(raw[16:])
+        if indexed_key[0] != key[0] or indexed_key[1] > key[1]:
+            offsets, indexed_key = array('Q'), (key[0], 0)
+
+        indexed_size = indexed_key[1]
+        if indexed_size < key[1]:
+            with open(self.snapshot_file, 'rb') as f:
+                f.seek(indexed_size)
+                tail = f.read(key[1] - indexed_size)
+            pos = 0
+            while pos < len(tail):
+                newline = tail.find(b'\n', pos)
+                if newline == -1:
+                    break  # Torn final line: not a message yet
+                offsets.append(indexed_size + pos)
+                pos = newline + 1
+            indexed_size += pos
+            header = array('Q', [key[0], indexed_size])
+            atomic_write_bytes(self.index_file, header.tobytes() + offsets.tobytes(), fsync=False)
+
+        self._index, self._index_key = offsets, (key[0], indexed_size)
+        return offsets
+
+    def _read_hot(self, start, stop):
+        """Return hot messages at hot positions [start, stop)"""
+        with self._lock:
+            offsets = self._load_index()
+            snapshot_count = len(offsets)
+            messages = []
+            if start < min(stop, snapshot_count):
+                end = offsets[stop] if stop < snapshot_count else self._index_key[1]
+                with open(self.snapshot_file, 'rb') as f:
+                    f.seek(offsets[start])
+                    messages = _parse_lines(f.read(end - offsets[start]))
+            if stop > snapshot_count:
+                journal = _parse_lines(self._read(self.journal_file))
+                messages.extend(journal[max(start - snapshot_count, 0):stop - snapshot_count])
+            return messages
+
+    def read_range(self, start, stop):
+        """
+        Return messages in positions [start, stop) without parsing the rest.
+
+        Args:
+            start (int): Position of the first message
+            stop (int): Position one past the last message
+
+        Returns:
+            list: The messages in that range, oldest first
+        """
+        with self._lock:
+            archived = self._load_manifest()["archived_count"]
+            messages = []
+            if start < min(stop, archived):
+                messages = self._read_archived(start, min(stop, archived))
+            if stop > archived:
+                messages.extend(self._read_hot(max(start - archived, 0), stop - archived))
+            return messages
+
+    def page(self, limit, before=None, after=None):
+        """
+        Return one page of history for cursor pagination.
+
+        Without a cursor the newest ``limit`` messages are returned.
+        ``before`` pages backwards from a position and ``after`` pages
+        forwards; ``next_cursor`` continues in the same direction.
+
+        Args:
+            limit (int): Maximum number of messages
+            before (int): Only messages at positions < before
+            after (int): Only messages at positions > after
+
+        Returns:
+            dict: history, total, next_cursor and has_more
+        """
+        with self._lock:
+            total = self.count()
+            if after is not None:
+                start = max(after + 1, 0)
+                stop = min(start + limit, total)
+                next_cursor = stop - 1 if stop < total else None
+            else:
+                stop = total if before is None else max(min(before, total), 0)
+                start = max(stop - limit, 0)
+                next_cursor = start if start > 0 else None
+            return {
+                "history": self.read_range(start, stop) if start < stop else [],
+                "total": total,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None
+            }
+
+    def read_all(self):
+        """
+        Return the full conversation history, oldest first.
+
+        Returns:
+            list: Archived, snapshot and journaled messages
+        """
+        with self._lock:
+            archived = self._load_manifest()["archived_count"]
+            messages = self._read_archived(0, archived) if archived else []
+            messages.extend(
+                _parse_lines(self._read(self.snapshot_file) + self._read(self.journal_file))
+            )
+            return messages
+
+    def count(self):
+        """Return the number of stored messages without parsing them"""
+        with self._lock:
+            return (self._load_manifest()["archived_count"]
+                    + len(self._load_index())
+                    + self._read(self.journal_file).count(b'\n'))
+
+    def compact(self):
+        """
+        Fold the journal into the snapshot and truncate the journal.
+
+        Safe to re-run after a crash between the snapshot append and the
+        journal truncate: if the snapshot already ends with the journal
+        contents the append is skipped.
+        """
+        with self._lock:
+            journal = self._read(self.journal_file)
+            if not journal:
+                self._journal_records = 0
+                return
+            # Drop a torn trailing record rather than copying it forward
+            journal = journal[:journal.rfind(b'\n') + 1]
+
+            with open(self.snapshot_file, 'a+b') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                already_applied = False
+                if size >= len(journal):
+                    f.seek(size - len(journal))
+                    already_applied = f.read(len(journal)) == journal
+                if not already_applied:
+                    f.seek(0, os.SEEK_END)
+                    f.write(journal)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            with open(self.journal_file, 'wb'):
+                pass
+            self._journal_records = 0
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+            if self.hot_max_messages or self.hot_max_age_days:
+                self.archive()
+        except Exception as e:
+            print(f"Error compacting history journal: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+        self._sync_search_index()  # Keeps the backlog a search catches up on small
+
+    def clear(self):
+        """Delete all stored history"""
+        with self._lock:
+            # Replace rather than truncate the snapshot so the new inode
+            # invalidates every worker's offset index
+            atomic_write_bytes(self.snapshot_file, b'')
+            with open(self.journal_file, 'wb'):
+                pass
+            self._journal_records = 0
+            self.search_index.reset()
+
+            manifest = self._load_manifest()
+            if manifest["segments"] or manifest.get("pending"):
+                segments = manifest["segments"] + manifest.get("pending", {}).get("segments", [])
+                self._save_manifest(_empty_manifest())
+                for segment in segments:
+                    try:
+                        os.unlink(self.archive_dir / segment["file"])
+                    except FileNotFoundError:
+                        pass
+                self._segments.clear()
+
+    def import_legacy(self, messages):
+        """
+        Seed the snapshot from a legacy storage.json conversation_history.
+
+        Args:
+            messages (list): Messages previously stored inline
+
+        Returns:
+            bool: True if the messages were imported, False if a snapshot
+            already existed (e.g. another worker migrated first)
+        """
+        with self._lock:
+            tmp_file = self.snapshot_file.with_name(
+                f"{self.snapshot_file.name}.{os.getpid()}.tmp"
+            )
+            with open(tmp_file, 'wb') as f:
+                f.write(_encode(messages))
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                # os.link fails if the snapshot exists, so only one process wins
+                os.link(tmp_file, self.snapshot_file)
+                return True
+            except FileExistsError:
+                return False
+            finally:
+                os.unlink(tmp_file)
+
+    def upgrade(self, normalize=normalize_message):
+        """
+        Rewrite every stored message in the current record shape.
+
+        Covers the hot snapshot, the journal and every archived segment,
+        all under the history lock so no append, compaction or archival
+        runs in between. Files are only replaced when a record changed;
+        rewritten segments are published by re-saving the manifest, which
+        drops other workers' cached copies.
+
+        Args:
+            normalize (callable): Record upgrade function
+
+        Returns:
+            tuple: (records read, records changed)
+        """
+        with self._lock:
+            records = changed = 0
+            for path in (self.snapshot_file, self.journal_file):
+                if path.exists():
+                    read, upgraded = upgrade_jsonl(path, normalize)
+                    records += read
+                    changed += upgraded
+
+            manifest = self._load_manifest()
+            segments_changed = False
+            for segment in manifest["segments"]:
+                path = self.archive_dir / segment["file"]
+                with open(path, 'rb') as f:
+                    messages = _parse_lines(gzip.decompress(f.read()))
+                upgraded = [normalize(message) for message in messages]
+                differ = sum(
+                    1 for old, new in zip(messages, upgraded)
+                    if new != old or list(new) != list(old)
+                )
+                records += len(messages)
+                if differ:
+                    atomic_write_bytes(path, gzip.compress(_encode(upgraded)))
+                    changed += differ
+                    segments_changed = True
+            if segments_changed:
+                self._save_manifest(manifest)
+
+            if changed:
+                self._journal_records = None
+                self.search_index.reset()  # Re-indexed from the upgraded text
+            return records, changed
+
+    # --- Cold tier -------------------------------------------------------
+
+    def _load_manifest(self):
+        """
+        Return the archive manifest; callers hold self._lock.
+
+        Also finishes or rolls back an archival interrupted by a crash: the
+        manifest records the pending segments and the snapshot inode before
+        the hot snapshot is trimmed. If the snapshot was since replaced the
+        trim happened and the segments are committed, otherwise they are
+        discarded and their messages stay hot.
+        """
+        try:
+            stat = os.stat(self.manifest_file)
+            key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            key = None
+        if self._manifest is not None and self._manifest_key == key:
+            return self._manifest
+
+        manifest = json.loads(self._read(self.manifest_file) or b'null') or _empty_manifest()
+        pending = manifest.get("pending")
+        if pending:
+            try:
+                snapshot_inode = os.stat(self.snapshot_file).st_ino
+            except FileNotFoundError:
+                snapshot_inode = 0
+            if snapshot_inode != pending["snapshot_inode"]:
+                self._commit_pending(manifest)
+            else:
+                for segment in pending["segments"]:
+                    try:
+                        os.unlink(self.archive_dir / segment["file"])
+                    except FileNotFoundError:
+                        pass
+                del manifest["pending"]
+                self._save_manifest(manifest)
+            return self._load_manifest()
+
+        # Segment names repeat after a clear() and re-archive (possibly by
+        # another worker), so cached contents are only valid for the
+        # manifest they were read under
+        self._segments.clear()
+        self._manifest, self._manifest_key = manifest, key
+        return manifest
+
+    def _save_manifest(self, manifest):
+        self.archive_dir.mkdir(exist_ok=True)
+        atomic_write_bytes(self.manifest_file, json.dumps(manifest, indent=2).encode('utf-8'))
+        self._manifest = None
+
+    def _commit_pending(self, manifest):
+        pending = manifest.pop("pending")
+        manifest["segments"].extend(pending["segments"])
+        manifest["archived_count"] += sum(segment["count"] for segment in pending["segments"])
+        self._save_manifest(manifest)
+
+    def _read_segment(self, segment):
+        """Decompress a cold segment, keeping recently used ones in memory"""
+        name = segment["file"]
+        if name in self._segments:
+            self._segments.move_to_end(name)
+            return self._segments[name]
+        with open(self.archive_dir / name, 'rb') as f:
+            messages = _parse_lines(gzip.decompress(f.read()))
+        self._segments[name] = messages
+        if len(self._segments) > SEGMENT_CACHE_SIZE:
+            self._segments.popitem(last=False)
+        return messages
+
+    def _read_archived(self, start, stop):
+        """Return archived messages at positions [start, stop)"""
+        segments = self._load_manifest()["segments"]
+        starts = [segment["start"] for segment in segments]
+        messages = []
+        i = max(bisect_right(starts, start) - 1, 0)
+        while i < len(segments) and segments[i]["start"] < stop:
+            segment = segments[i]
+            first = max(start - segment["start"], 0)
+            last = min(stop - segment["start"], segment["count"])
+            messages.extend(self._read_segment(segment)[first:last])
+            i += 1
+        return messages
+
+    def archive(self, max_messages=None, max_age_days=None):
+        """
+        Move old messages from the hot snapshot into compressed segments.
+
+        Args:
+            max_messages (int): Keep at most this many hot messages
+                (defaults to hot_max_messages, 0 = no limit)
+            max_age_days (int): Archive messages older than this many days
+                (defaults to hot_max_age_days, 0 = no limit)
+
+        Returns:
+            int: Number of messages archived
+        """
+        max_messages = self.hot_max_messages if max_messages is None else max_messages
+        max_age_days = self.hot_max_age_days if max_age_days is None else max_age_days
+
+        with self._lock:
+            self.compact()
+            offsets = self._load_index()
+            hot_count = len(offsets)
+            cut = max(hot_count - max_messages, 0) if max_messages else 0
+
+            if max_age_days:
+                cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+                while cut < hot_count:
+                    chunk = self._read_hot(cut, min(cut + 256, hot_count))
+                    old = 0
+                    for message in chunk:
+                        if (message.get("timestamp") or "") >= cutoff:
+                            break
+                        old += 1
+                    cut += old
+                    if old < len(chunk):
+                        break
+
+            if cut == 0:
+                return 0
+
+            manifest = self._load_manifest()
+            position = manifest["archived_count"]
+            self.archive_dir.mkdir(exist_ok=True)
+            segments = []
+            by_day = groupby(self._read_hot(0, cut), key=lambda m: (m.get("timestamp") or "")[:10])
+            for day, group in by_day:
+                group = list(group)
+                name = f"{position:012d}-{day or 'undated'}.jsonl.gz"
+                atomic_write_bytes(self.archive_dir / name, gzip.compress(_encode(group)))
+                segments.append({"file": name, "start": position, "count": len(group), "day": day})
+                position += len(group)
+
+            # Record intent, trim the hot snapshot, then commit (see _load_manifest)
+            manifest["pending"] = {
+                "segments": segments,
+                "snapshot_inode": os.stat(self.snapshot_file).st_ino
+            }
+            self._save_manifest(manifest)
+            with open(self.snapshot_file, 'rb') as f:
+                f.seek(offsets[cut] if cut < hot_count else self._index_key[1])
+                remaining = f.read()
+            atomic_write_bytes(self.snapshot_file, remaining)
+            self._commit_pending(manifest)
+            return cut
+
+
+def _empty_manifest():
+    return {"archived_count": 0, "segments": []}
@@ -0,0 +1,186 @@
+"""
+Full-text search over conversation history.
+
+Messages are indexed in a SQLite FTS5 sidecar, ``<name>.history.fts.db``,
+keyed by their history position (the same cursor ``/api/history`` uses).
+The index records how many messages it has seen and catches up from the
+history journal before each search and after each background compaction,
+never inside an append, so it follows the journal across workers and
+after a crash without slowing chat turns or adding a separate write path. Archived
+messages keep their positions and stay searchable.
+
+Snippets come back HTML-escaped with matched terms wrapped in
+``<mark>…</mark>``, ready for a client to render.
+"""
+
+import html
+import sqlite3
+import threading
+
+from app.search import MIN_PREFIX_LENGTH, tokenize
+
+SYNC_BATCH_SIZE = 1000  # Messages read from the journal per catch-up step
+SNIPPET_TOKENS = 16
+_MARK_START, _MARK_END = "\x02", "\x03"
+
+
+def build_match_query(query):
+    """
+    Turn free text into an FTS5 query: every term must match, and terms
+    of MIN_PREFIX_LENGTH or more characters also match as word prefixes.
+
+    Returns:
+        str: The MATCH expression, or None if the query has no terms
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return None
+    return " ".join(
+        f'"{term}"*' if len(term) >= MIN_PREFIX_LENGTH else f'"{term}"' for term in terms
+    )
+
+
+def _render_snippet(snippet):
+    """Escape a raw FTS snippet and turn its markers into <mark> tags"""
+    return (html.escape(snippet)
+            .replace(_MARK_START, "<mark>")
+            .replace(_MARK_END, "</mark>"))
+
+
+class HistorySearchIndex:
+    """FTS5 index of history messages, rowid = history position"""
+
+    SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(
+            content, role UNINDEXED, timestamp UNINDEXED
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._local = threading.local()
+        self._initialized = False
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._initialized:
+                conn.executescript(self.SCHEMA)
+                self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    def indexed_count(self, conn=None):
+        """Return how many history positions have been indexed"""
+        row = (conn or self._connect()).execute(
+            "SELECT value FROM meta WHERE key = 'indexed_count'"
+        ).fetchone()
+        return int(row["value"]) if row else 0
+
+    def _set_indexed_count(self, conn, count):
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('indexed_count', ?)", (count,)
+        )
+
+    def reset(self):
+        """Drop every indexed message (history was cleared)"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM messages")
+            self._set_indexed_count(conn, 0)
+
+    def sync(self, journal):
+        """
+        Index messages appended to the journal since the last sync.
+
+        Callers must hold the journal's lock, so positions can't move
+        underneath a catch-up and lock order is always journal -> SQLite.
+
+        Args:
+            journal (HistoryJournal): The history being indexed
+
+        Returns:
+            int: Number of messages newly indexed
+        """
+        total = journal.count()
+        conn = self._connect()
+        start = self.indexed_count(conn)
+        if start > total:  # History shrank outside clear(); start over
+            self.reset()
+            start = 0
+        indexed = 0
+        while start < total:
+            stop = min(start + SYNC_BATCH_SIZE, total)
+            messages = journal.read_range(start, stop)
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO messages (rowid, content, role, timestamp)"
+                    " VALUES (?, ?, ?, ?)",
+                    [
+                        (position, str(message.get("content", "")),
+                         message.get("role"), message.get("timestamp"))
+                        for position, message in enumerate(messages, start)
+                        if isinstance(message, dict)
+                    ]
+                )
+                self._set_indexed_count(conn, stop)
+            indexed += stop - start
+            start = stop
+        return indexed
+
+    def search(self, query, limit, offset=0, role=None):
+        """
+        Find messages matching every term of a query, best match first.
+
+        Args:
+            query (str): Free text search terms
+            limit (int): Maximum number of hits
+            offset (int): Hits to skip (the pagination cursor)
+            role (str): Only match messages from this role
+
+        Returns:
+            dict: hits (position, role, timestamp, snippet, score), total,
+            next_cursor (None on the last page) and has_more
+        """
+        match = build_match_query(query)
+        if match is None:
+            return {"hits": [], "total": 0, "next_cursor": None, "has_more": False}
+        where, params = "messages MATCH ?", [match]
+        if role:
+            where += " AND role = ?"
+            params.append(role)
+
+        conn = self._connect()
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM messages WHERE {where}", params
+        ).fetchone()[0]
+        rows = conn.execute(
+            "SELECT rowid AS position, role, timestamp, -bm25(messages) AS score,"
+            f" snippet(messages, 0, ?, ?, '…', {SNIPPET_TOKENS}) AS snippet"
+            f" FROM messages WHERE {where}"
+            " ORDER BY score DESC, rowid DESC LIMIT ? OFFSET ?",
+            [_MARK_START, _MARK_END, *params, limit, offset]
+        ).fetchall()
+
+        hits = [{
+            "position": row["position"],
+            "role": row["role"],
+            "timestamp": row["timestamp"],
+            "snippet": _render_snippet(row["snippet"]),
+            "score": round(row["score"], 4)
+        } for row in rows]
+        next_cursor = offset + len(hits) if offset + len(hits) < total else None
+        return {
+            "hits": hits,
+            "total": total,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
+        }
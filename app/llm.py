@@ -0,0 +1,490 @@
+"""
+Shared HTTP client for OpenRouter chat completions.
+
+Every call used to go through a bare ``requests.post``, paying DNS, TCP
+and TLS setup to openrouter.ai on every chat turn. LLMClient keeps a
+``requests.Session`` whose connection pool holds up to
+REX_LLM_POOL_SIZE keep-alive connections per worker, so later turns
+reuse a warm connection.
+
+    from app import llm
+
+    llm.preconnect()                       # at startup, in the background
+    content, timing = llm.chat_completion(messages, timeout=30)
+    for text in llm.stream_chat_completion(messages):   # as tokens arrive
+        ...
+
+Each call returns its timing: connect_ms (TCP + TLS, 0 on a reused
+connection), ttfb_ms (request sent to response headers), ttft_ms for
+streamed calls (request sent to the first text) and total_ms.
+stats() aggregates them for /api/llm/stats.
+
+Clients are per process: a worker forked after import builds its own
+pool instead of sharing sockets with its parent, and repeats the
+pre-connect if one was requested. AsyncLLMClient offers the same calls
+as coroutines for the ASGI gateway (app/gateway.py); it needs httpx.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_MODEL = "deepseek/deepseek-chat"
+DEFAULT_POOL_SIZE = 10  # REX_LLM_POOL_SIZE; read at client creation, after load_dotenv()
+PRECONNECT_TIMEOUT = 5  # Seconds; a slow pre-connect must not hold up anything
+RECENT_CALLS = 100  # Per-call timings kept for stats()
+
+_connect_timing = threading.local()
+
+
+class _TimedConnect:
+    """Connection mixin that records how long connect() (TCP + TLS) took"""
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _connect_timing.ms = getattr(_connect_timing, 'ms', 0) + (
+            time.perf_counter() - started) * 1000
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = type("TimedHTTPConnection", (_TimedConnect, HTTPConnection), {})
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = type("TimedHTTPSConnection", (_TimedConnect, HTTPSConnection), {})
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools time connection setup"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool
+        }
+
+
+class LLMError(RuntimeError):
+    """The provider reported an error in the middle of a streamed reply"""
+
+
+def _stream_text(line):
+    """
+    Return the reply text carried by one upstream SSE line.
+
+    Args:
+        line (str): One line of the ``stream: true`` response
+
+    Returns:
+        str: The text delta ("" for comments, separators and [DONE])
+
+    Raises:
+        LLMError: If the provider reported an error mid-stream
+    """
+    if not line.startswith("data:"):
+        return ""  # Blank separators and ": keep-alive" comments
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return ""
+    event = json.loads(data)
+    if event.get("error"):
+        error = event["error"]
+        message = error.get("message", error) if isinstance(error, dict) else error
+        raise LLMError(f"Upstream error: {message}")
+    choices = event.get("choices") or [{}]
+    return (choices[0].get("delta") or {}).get("content") or ""
+
+
+class _BaseClient:
+    """Settings, per-call timing history and counters shared by both clients"""
+
+    def __init__(self, api_key, base_url, pool_size):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.pool_size = pool_size or int(os.getenv("REX_LLM_POOL_SIZE", DEFAULT_POOL_SIZE))
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.recent = deque(maxlen=RECENT_CALLS)
+
+    def _headers(self):
+        api_key = self.api_key or os.getenv("OPENROUTER_API_KEY")
+        return {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+    def _record(self, timing, failed):
+        with self._lock:
+            self.calls += 1
+            self.errors += failed
+            self.new_connections += timing.get("reused") is False
+            if "total_ms" in timing:
+                self.recent.append(timing)
+
+    def stats(self):
+        """Return call, connection-reuse and latency counters for monitoring"""
+        with self._lock:
+            recent = list(self.recent)
+
+        def average(key):
+            values = [t[key] for t in recent if key in t]
+            return round(sum(values) / len(values), 2) if values else 0
+        return {
+            "llm_calls": self.calls,
+            "llm_errors": self.errors,
+            "llm_new_connections": self.new_connections,
+            "llm_pool_size": self.pool_size,
+            "llm_reuse_rate": (
+                round(sum(t["reused"] for t in recent) / len(recent) * 100, 1) if recent else 0
+            ),
+            "llm_avg_connect_ms": average("connect_ms"),
+            "llm_avg_ttfb_ms": average("ttfb_ms"),
+            "llm_avg_ttft_ms": average("ttft_ms"),
+            "llm_avg_total_ms": average("total_ms"),
+            "llm_last_call": recent[-1] if recent else None
+        }
+
+
+class LLMClient(_BaseClient):
+    """Pooled keep-alive client for an OpenAI-compatible chat API"""
+
+    def __init__(self, api_key=None, base_url=OPENROUTER_BASE_URL, pool_size=None):
+        super().__init__(api_key, base_url, pool_size)
+        self.session = requests.Session()
+        # One host, so one pool; pool_size connections serve concurrent turns
+        adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+
+    def preconnect(self):
+        """
+        Open a pooled connection ahead of the first chat turn.
+
+        Returns:
+            float: Connection setup time in ms (0 if one was already open)
+        """
+        _connect_timing.ms = 0
+        self.session.head(self.base_url, timeout=PRECONNECT_TIMEOUT).close()
+        connect_ms = _connect_timing.ms
+        if connect_ms:
+            with self._lock:
+                self.new_connections += 1
+        return round(connect_ms, 2)
+
+    def _post(self, payload, timeout):
+        """POST a completion request; returns at the response headers"""
+        _connect_timing.ms = 0
+        return self.session.post(
+            f"{self.base_url}/chat/completions", headers=self._headers(),
+            json=payload, timeout=timeout, stream=True
+        )
+
+    def chat_completion(self, messages, model=DEFAULT_MODEL, timeout=30, **options):
+        """
+        Request a chat completion over a pooled connection.
+
+        Args:
+            messages (list): Chat messages ({"role", "content"})
+            model (str): Model name
+            timeout (float): Seconds to wait for the connection and each read
+            **options: Extra request fields (temperature, max_tokens, ...)
+
+        Returns:
+            tuple: (reply text, or None on a non-200 response; timing dict
+            with status, connect_ms, ttfb_ms, total_ms and reused)
+
+        Raises:
+            requests.RequestException: On network errors and timeouts
+        """
+        started = time.perf_counter()
+        try:
+            # stream=True returns at the headers, which is where TTFB ends
+            response = self._post({"model": model, "messages": messages, **options}, timeout)
+            ttfb_ms = (time.perf_counter() - started) * 1000
+            with response:
+                body = response.json() if response.status_code == 200 else None
+        except requests.RequestException:
+            self._record({}, failed=True)
+            raise
+        total_ms = (time.perf_counter() - started) * 1000
+
+        timing = {
+            "status": response.status_code,
+            "connect_ms": round(_connect_timing.ms, 2),
+            "ttfb_ms": round(ttfb_ms, 2),
+            "total_ms": round(total_ms, 2),
+            "reused": not _connect_timing.ms
+        }
+        self._record(timing, failed=response.status_code != 200)
+        content = body['choices'][0]['message']['content'] if body else None
+        return content, timing
+
+    def stream_chat_completion(self, messages, model=DEFAULT_MODEL, timeout=30, timing=None,
+                               **options):
+        """
+        Stream a chat completion, yielding the reply as it is generated.
+
+        Requests ``stream: true`` and reads the upstream Server-Sent Events
+        as they arrive, so the first words reach the caller long before
+        the completion finishes.
+
+        Args:
+            messages (list): Chat messages ({"role", "content"})
+            model (str): Model name
+            timeout (float): Seconds to wait for the connection and between chunks
+            timing (dict): Filled with status, connect_ms, ttfb_ms,
+                ttft_ms (first text), total_ms and reused
+            **options: Extra request fields (temperature, max_tokens, ...)
+
+        Yields:
+            str: Pieces of reply text, in order
+
+        Raises:
+            requests.RequestException: On network errors, timeouts and a
+            non-200 response
+            LLMError: On an error reported mid-stream
+        """
+        timing = {} if timing is None else timing
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = self._post(
+                {"model": model, "messages": messages, **options, "stream": True}, timeout
+            )
+            timing.update({
+                "status": response.status_code,
+                "connect_ms": round(_connect_timing.ms, 2),
+                "ttfb_ms": round((time.perf_counter() - started) * 1000, 2),
+                "reused": not _connect_timing.ms
+            })
+            with response:
+                response.raise_for_status()
+                # chunk_size=None hands over each chunk as soon as it arrives;
+                # reading on past [DONE] to the end lets the connection be pooled again
+                for line in response.iter_lines(chunk_size=None):
+                    text = _stream_text(line.decode('utf-8'))
+                    if text:
+                        if "ttft_ms" not in timing:
+                            timing["ttft_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                        yield text
+            failed = False
+        except GeneratorExit:
+            failed = False  # The consumer stopped reading; not an upstream failure
+            timing["cancelled"] = True
+            raise
+        finally:
+            if "status" in timing:
+                timing["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            self._record(timing, failed)
+
+
+def _require_httpx():
+    try:
+        import httpx
+    except ImportError:
+        raise RuntimeError("The async client requires httpx: pip install httpx") from None
+    return httpx
+
+
+class AsyncLLMClient(_BaseClient):
+    """
+    asyncio counterpart of LLMClient, on an httpx.AsyncClient.
+
+    A call waiting on the provider is a suspended coroutine rather than a
+    blocked thread, so one event loop can hold thousands of slow
+    completions. max_connections caps the sockets open to the provider;
+    callers bound concurrency above that (see app/gateway.py). Create it
+    inside the event loop that will use it.
+    """
+
+    def __init__(self, api_key=None, base_url=OPENROUTER_BASE_URL, pool_size=None,
+                 max_connections=100):
+        super().__init__(api_key, base_url, pool_size)
+        httpx = _require_httpx()
+        self.client = httpx.AsyncClient(
+            headers={"Content-Type": "application/json"},
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=self.pool_size
+            )
+        )
+
+    @staticmethod
+    def _tracer():
+        """Return an httpx trace hook and the connection-setup marks it records"""
+        marks = {}
+
+        async def trace(event, info):
+            if event == "connection.connect_tcp.started":
+                marks["started"] = time.perf_counter()
+            elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                marks["connected"] = time.perf_counter()
+        return trace, marks
+
+    @staticmethod
+    def _connect_ms(marks):
+        if "started" not in marks:
+            return 0
+        return round((marks.get("connected", marks["started"]) - marks["started"]) * 1000, 2)
+
+    async def preconnect(self):
+        """
+        Open a pooled connection ahead of the first chat turn.
+
+        Returns:
+            float: Connection setup time in ms (0 if one was already open)
+        """
+        trace, marks = self._tracer()
+        await self.client.head(
+            self.base_url, timeout=PRECONNECT_TIMEOUT, extensions={"trace": trace}
+        )
+        if marks:
+            with self._lock:
+                self.new_connections += 1
+        return self._connect_ms(marks)
+
+    async def chat_completion(self, messages, model=DEFAULT_MODEL, timeout=30, **options):
+        """
+        Request a chat completion (see LLMClient.chat_completion).
+
+        Raises:
+            httpx.HTTPError: On network errors and timeouts
+        """
+        httpx = _require_httpx()
+        trace, marks = self._tracer()
+        started = time.perf_counter()
+        try:
+            async with self.client.stream(
+                "POST", f"{self.base_url}/chat/completions", headers=self._headers(),
+                json={"model": model, "messages": messages, **options},
+                timeout=timeout, extensions={"trace": trace}
+            ) as response:
+                ttfb_ms = (time.perf_counter() - started) * 1000
+                body = json.loads(await response.aread()) if response.status_code == 200 else None
+        except httpx.HTTPError:
+            self._record({}, failed=True)
+            raise
+        timing = {
+            "status": response.status_code,
+            "connect_ms": self._connect_ms(marks),
+            "ttfb_ms": round(ttfb_ms, 2),
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+            "reused": not marks
+        }
+        self._record(timing, failed=response.status_code != 200)
+        content = body['choices'][0]['message']['content'] if body else None
+        return content, timing
+
+    async def stream_chat_completion(self, messages, model=DEFAULT_MODEL, timeout=30,
+                                     timing=None, **options):
+        """
+        Stream a chat completion (see LLMClient.stream_chat_completion).
+
+        Raises:
+            httpx.HTTPError: On network errors, timeouts and a non-200 response
+            LLMError: On an error reported mid-stream
+        """
+        timing = {} if timing is None else timing
+        trace, marks = self._tracer()
+        started = time.perf_counter()
+        failed = True
+        try:
+            async with self.client.stream(
+                "POST", f"{self.base_url}/chat/completions", headers=self._headers(),
+                json={"model": model, "messages": messages, **options, "stream": True},
+                timeout=timeout, extensions={"trace": trace}
+            ) as response:
+                timing.update({
+                    "status": response.status_code,
+                    "connect_ms": self._connect_ms(marks),
+                    "ttfb_ms": round((time.perf_counter() - started) * 1000, 2),
+                    "reused": not marks
+                })
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    text = _stream_text(line)
+                    if text:
+                        if "ttft_ms" not in timing:
+                            timing["ttft_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                        yield text
+            failed = False
+        except (GeneratorExit, asyncio.CancelledError):
+            failed = False  # The consumer stopped reading; not an upstream failure
+            timing["cancelled"] = True
+            raise
+        finally:
+            if "status" in timing:
+                timing["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            self._record(timing, failed)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_pid = None
+_preconnect_wanted = False
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return this process's shared LLMClient, creating it on first use"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client, _client_pid = LLMClient(), os.getpid()
+            if _preconnect_wanted:
+                _start_preconnect(_client)
+        return _client
+
+
+def _start_preconnect(client):
+    def run():
+        try:
+            connect_ms = client.preconnect()
+            print(f"🔌 Pre-connected to {client.base_url} in {connect_ms} ms")
+        except Exception as e:
+            print(f"Error pre-connecting to {client.base_url}: {e}")
+    threading.Thread(target=run, daemon=True).start()
+
+
+def preconnect():
+    """Warm a pooled connection in the background if OpenRouter is configured"""
+    global _preconnect_wanted
+    enabled = os.getenv("REX_LLM_PRECONNECT", "true").lower() in ("1", "true", "yes")
+    if not enabled or not os.getenv("OPENROUTER_API_KEY"):
+        return
+    with _client_lock:
+        _preconnect_wanted = True
+        client = _client if _client_pid == os.getpid() else None
+    if client is None:
+        get_client()  # Pre-connects as it creates the client
+    else:
+        _start_preconnect(client)
+
+
+def chat_completion(messages, model=DEFAULT_MODEL, timeout=30, **options):
+    """Request a chat completion through the shared client (see LLMClient)"""
+    return get_client().chat_completion(messages, model=model, timeout=timeout, **options)
+
+
+def stream_chat_completion(messages, model=DEFAULT_MODEL, timeout=30, timing=None, **options):
+    """Stream a chat completion through the shared client (see LLMClient)"""
+    return get_client().stream_chat_completion(
+        messages, model=model, timeout=timeout, timing=timing, **options
+    )
+
+
+def stats():
+    """Return the shared client's counters"""
+    return get_client().stats()
@@ -0,0 +1,152 @@
+"""
+In-process cache of AI replies to repeated prompts.
+
+Many chat turns are the same few prompts ("hi", "teach me java"), and
+each one otherwise costs a full OpenRouter round trip. ResponseCache
+keeps recent replies keyed by the normalized prompt, the model and a hash
+of the system prompt, so changing either one never serves an old reply.
+
+Entries expire after REX_RESPONSE_CACHE_TTL seconds (0 disables the
+cache). The least recently used entries are evicted once the cache holds
+more than REX_RESPONSE_CACHE_MAX_KB of replies or
+REX_RESPONSE_CACHE_MAX_ENTRIES entries. Callers pass a ``state`` token
+for prompts whose answer depends on stored data (see
+main.response_cache_key), so a save to that data retires the old entry
+instead of serving it. Only provider replies are cached: the rule-based
+fallback is cheap and some of it has side effects.
+
+The cache lives in one process; each gunicorn worker warms its own.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 3600  # Seconds
+DEFAULT_MAX_KB = 8192
+DEFAULT_MAX_ENTRIES = 1000
+ENTRY_OVERHEAD_BYTES = 200  # Key, timestamps and dict slot, roughly
+
+
+def normalize_prompt(prompt):
+    """Fold case and whitespace and drop trailing punctuation: "Hi!" == "hi" """
+    return " ".join(prompt.casefold().split()).rstrip(".!?")
+
+
+def make_key(prompt, model, system_prompt, state=None):
+    """
+    Build the cache key for one prompt.
+
+    Args:
+        prompt (str): The user's message
+        model (str): Model name
+        system_prompt (str): System prompt sent with the message
+        state: JSON-serializable version of the data the reply depends on
+
+    Returns:
+        str: Hex digest
+    """
+    system_hash = hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()
+    material = json.dumps([normalize_prompt(prompt), model, system_hash, state])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of replies with a TTL and a byte budget"""
+
+    def __init__(self, ttl=None, max_bytes=None, max_entries=None):
+        self.ttl = ttl if ttl is not None else float(
+            os.getenv("REX_RESPONSE_CACHE_TTL", DEFAULT_TTL))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv("REX_RESPONSE_CACHE_MAX_KB", DEFAULT_MAX_KB)) * 1024
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv("REX_RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self._entries = OrderedDict()  # key -> (expires_at, reply, size)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_bytes > 0 and self.max_entries > 0
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key):
+        """Return the cached reply for key, or None on a miss"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._drop(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += entry[2] - ENTRY_OVERHEAD_BYTES
+            return entry[1]
+
+    def put(self, key, reply):
+        """Store a reply, evicting least recently used entries to fit"""
+        if not self.enabled or not reply:
+            return
+        size = len(reply.encode('utf-8')) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, reply, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Return hit ratio, size and eviction counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "response_cache_enabled": self.enabled,
+                "response_cache_entries": len(self._entries),
+                "response_cache_bytes": self.bytes,
+                "response_cache_max_bytes": self.max_bytes,
+                "response_cache_ttl": self.ttl,
+                "response_cache_hits": self.hits,
+                "response_cache_misses": self.misses,
+                "response_cache_hit_ratio": round(self.hits / lookups, 3) if lookups else 0,
+                "response_cache_expired": self.expired,
+                "response_cache_evictions": self.evictions,
+                "response_cache_bytes_saved": self.bytes_saved
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache, created on first use (after load_dotenv())"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,214 @@
+"""
+Versioned document schema and migrations.
+
+storage.json and todolist.json carry a ``schema_version`` header. Documents
+written before versioning count as version 0. Every read through the
+storage engine runs upgrade_document(), which applies the registered
+migrations in order, so old files are upgraded lazily. The upgraded
+document is cached and persisted by the next ordinary save, with no
+separate migration step at startup.
+
+Migrations are plain functions registered per source version:
+
+    @migration(1)
+    def _rename_something(document):
+        ...
+        return document
+
+Records are fixed-shape: every todo has exactly TODO_FIELDS (plus any
+unknown keys preserved from older data) and every message has
+MESSAGE_FIELDS. Hot code can index them directly instead of probing with
+.get() chains. JSONL files (conversation history) are upgraded record by
+record with upgrade_jsonl(), which streams instead of loading the file.
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+SCHEMA_VERSION = 1
+SCHEMA_KEY = "schema_version"
+
+PRIORITIES = ("high", "medium", "low")
+TODO_FIELDS = ("id", "task", "priority", "due_date", "created_at", "completed", "completed_at")
+MESSAGE_FIELDS = ("role", "content", "timestamp")
+ANALYTICS_DEFAULTS = {
+    "total_tasks_created": 0,
+    "total_tasks_completed": 0,
+    "total_conversations": 0,
+    "most_productive_day": None,
+    "average_tasks_per_day": 0,
+    "completion_rate": 0,
+    "last_activity": None
+}
+
+# Todo list key -> key of its id sequence (todolist.json, storage.json)
+TODO_SEQUENCE_KEYS = {"todos": "next_id", "todo_list": "next_todo_id"}
+
+_MIGRATIONS = {}  # source version -> function(document) -> document
+
+
+def migration(from_version):
+    """Register a function upgrading documents from from_version to from_version + 1"""
+    def register(func):
+        if from_version in _MIGRATIONS:
+            raise ValueError(f"Duplicate migration from schema version {from_version}")
+        _MIGRATIONS[from_version] = func
+        return func
+    return register
+
+
+def make_todo(todo_id, task, priority="medium", due_date=None, created_at=None,
+              completed=False, completed_at=None):
+    """Build a todo record in the fixed TODO_FIELDS shape"""
+    return {
+        "id": todo_id,
+        "task": task,
+        "priority": priority,
+        "due_date": due_date,
+        "created_at": created_at or datetime.now().isoformat(),
+        "completed": completed,
+        "completed_at": completed_at
+    }
+
+
+def normalize_todo(todo):
+    """
+    Coerce a todo from any older shape into the fixed shape.
+
+    Handles bare strings from the earliest versions, missing fields and
+    unknown priorities. Unknown keys are kept after the fixed fields.
+    """
+    if not isinstance(todo, dict):
+        todo = {"task": str(todo)}
+    record = make_todo(
+        todo.get("id") if isinstance(todo.get("id"), int) else None,
+        str(todo.get("task", "")),
+        todo.get("priority") if todo.get("priority") in PRIORITIES else "medium",
+        todo.get("due_date"),
+        todo.get("created_at"),
+        bool(todo.get("completed", False)),
+        todo.get("completed_at")
+    )
+    record.update((key, value) for key, value in todo.items() if key not in record)
+    return record
+
+
+def normalize_message(message):
+    """Coerce a chat message into the fixed MESSAGE_FIELDS shape"""
+    if not isinstance(message, dict):
+        message = {"content": str(message)}
+    record = {
+        "role": message.get("role") or "user",
+        "content": message.get("content") or "",
+        "timestamp": message.get("timestamp")
+    }
+    record.update((key, value) for key, value in message.items() if key not in record)
+    return record
+
+
+def ensure_todo_ids(data, list_key, sequence_key):
+    """
+    Give every todo a unique integer id and start the id sequence.
+
+    Older versions assigned ``len(list) + 1``, which repeats ids after a
+    removal. The first time a document is seen without ``sequence_key``,
+    todos with a missing or duplicate id are renumbered past the current
+    maximum. Later calls are O(1).
+
+    Returns:
+        bool: True if the document was changed
+    """
+    if sequence_key in data:
+        return False
+    todos = data.setdefault(list_key, [])
+    next_id = max((t["id"] for t in todos if isinstance(t["id"], int)), default=0) + 1
+    seen = set()
+    for todo in todos:
+        if not isinstance(todo["id"], int) or todo["id"] in seen:
+            todo["id"] = next_id
+            next_id += 1
+        seen.add(todo["id"])
+    data[sequence_key] = next_id
+    return True
+
+
+def upgrade_document(document):
+    """
+    Bring a decoded storage document up to SCHEMA_VERSION.
+
+    Documents from a newer version are returned untouched rather than
+    guessed at. Empty documents (missing files) are left for the caller's
+    defaults.
+
+    Returns:
+        dict: The same document, upgraded in place
+    """
+    if not isinstance(document, dict) or not document:
+        return document
+    version = document.get(SCHEMA_KEY, 0)
+    while version < SCHEMA_VERSION:
+        document = _MIGRATIONS[version](document)
+        version += 1
+        document[SCHEMA_KEY] = version
+    return document
+
+
+def upgrade_jsonl(file_path, normalize=normalize_message):
+    """
+    Stream-upgrade a JSONL file one record at a time.
+
+    Memory use is one line regardless of file size. The result replaces
+    the file atomically, and only when a record actually changed.
+
+    Args:
+        file_path (Path): File with one JSON record per line
+        normalize (callable): Record upgrade function
+
+    Returns:
+        tuple: (records read, records changed)
+    """
+    file_path = Path(file_path)
+    tmp_file = file_path.with_name(f".{file_path.name}.{os.getpid()}.tmp")
+    records = changed = 0
+    try:
+        with open(file_path, 'rb') as src, open(tmp_file, 'wb') as dst:
+            for line in src:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Torn trailing record; readers drop it too
+                upgraded = normalize(record)
+                records += 1
+                if upgraded != record or list(upgraded) != list(record):
+                    changed += 1
+                dst.write(json.dumps(upgraded, ensure_ascii=False).encode('utf-8') + b'\n')
+            dst.flush()
+            os.fsync(dst.fileno())
+        if changed:
+            os.replace(tmp_file, file_path)
+    finally:
+        if tmp_file.exists():
+            tmp_file.unlink()
+    return records, changed
+
+
+@migration(0)
+def _fixed_shape_records(document):
+    """v0 -> v1: fixed-shape todos, messages and analytics"""
+    for list_key in ("todos", "todo_list"):
+        if isinstance(document.get(list_key), list):
+            document[list_key] = [normalize_todo(todo) for todo in document[list_key]]
+            ensure_todo_ids(document, list_key, TODO_SEQUENCE_KEYS[list_key])
+            document.pop("todo_stats", None)  # Recounted from the normalized list
+    if isinstance(document.get("conversation_history"), list):
+        document["conversation_history"] = [
+            normalize_message(message) for message in document["conversation_history"]
+        ]
+    if "analytics" in document:
+        document["analytics"] = {**ANALYTICS_DEFAULTS, **(document["analytics"] or {})}
+    document.setdefault("user_name", None)
+    return document
@@ -0,0 +1,212 @@
+"""
+Inverted-index full-text search over todo text.
+
+Task text is split into case-folded word tokens. Each token maps to the
+ids of the todos containing it (with a term count), and a sorted
+vocabulary makes prefix lookups a bisect instead of a scan. The index is
+updated per todo on add/remove/edit, so queries never re-read the list:
+
+    index = TodoSearchIndex()
+    index.add(1, "Buy milk and bread")
+    index.search("bre mil")   # -> [(1, 2.37)]
+
+Queries are multi-term AND: every term must match. A term matches a
+token exactly, or as a prefix when it is at least MIN_PREFIX_LENGTH
+characters long. Results are ranked by summed IDF (rarer terms weigh
+more), with prefix matches discounted by PREFIX_WEIGHT and newer todos
+first on ties.
+
+TrigramIndex is the typo-tolerant counterpart for resolving a loose
+description ("the grocery thing") to a todo. Each word other than
+filler such as "the" or "thing" is padded and cut into three-character
+grams, as in PostgreSQL's pg_trgm, and todos are ranked by the Jaccard
+similarity of their gram set to the query's.
+"""
+
+import heapq
+import math
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MIN_PREFIX_LENGTH = 2
+PREFIX_WEIGHT = 0.5
+DEFAULT_LIMIT = 20
+MIN_SIMILARITY = 0.1  # Trigram matches below this are noise
+# Filler words in task descriptions ("the grocery thing") that would
+# otherwise match unrelated todos
+FUZZY_STOPWORDS = frozenset({
+    "a", "an", "and", "for", "in", "my", "of", "on", "or", "task", "that",
+    "the", "thing", "this", "to", "todo", "with"
+})
+
+
+def tokenize(text):
+    """Split text into case-folded word tokens"""
+    return TOKEN_PATTERN.findall(str(text).casefold())
+
+
+def trigrams(text):
+    """Return the set of padded word trigrams in text, ignoring filler words"""
+    tokens = tokenize(text)
+    grams = set()
+    for token in [t for t in tokens if t not in FUZZY_STOPWORDS] or tokens:
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TodoSearchIndex:
+    """Token -> {todo id: term count} postings with a sorted vocabulary"""
+
+    def __init__(self, todos=()):
+        self.postings = {}
+        self.vocabulary = []  # Sorted keys of postings, for prefix ranges
+        self.documents = {}  # id -> tokens, so remove() needs no text
+        for todo in todos:
+            if isinstance(todo, dict) and "id" in todo:
+                self.add(todo["id"], todo.get("task", ""))
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, todo_id, text):
+        """Index one todo's text, replacing any earlier version"""
+        if todo_id in self.documents:
+            self.remove(todo_id)
+        tokens = tokenize(text)
+        self.documents[todo_id] = tokens
+        for token in tokens:
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                insort(self.vocabulary, token)
+            postings[todo_id] = postings.get(todo_id, 0) + 1
+
+    def remove(self, todo_id):
+        """Drop one todo from the index; unknown ids are ignored"""
+        for token in set(self.documents.pop(todo_id, ())):
+            postings = self.postings[token]
+            del postings[todo_id]
+            if not postings:
+                del self.postings[token]
+                del self.vocabulary[bisect_left(self.vocabulary, token)]
+
+    def _expand(self, term, prefix):
+        """Return the vocabulary tokens a query term matches"""
+        if not prefix or len(term) < MIN_PREFIX_LENGTH:
+            return [term] if term in self.postings else []
+        start = bisect_left(self.vocabulary, term)
+        end = bisect_left(self.vocabulary, term + "\uffff", start)
+        return self.vocabulary[start:end]
+
+    def search(self, query, limit=DEFAULT_LIMIT, prefix=True):
+        """
+        Find todos matching every term of a query.
+
+        Args:
+            query (str): Free text; split into terms like the indexed text
+            limit (int): Maximum number of results
+            prefix (bool): Let terms match as token prefixes
+
+        Returns:
+            list: (todo id, score) pairs, best first
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or limit <= 0:
+            return []
+        expansions = []
+        for term in terms:
+            tokens = self._expand(term, prefix)
+            if not tokens:
+                return []
+            size = sum(len(self.postings[token]) for token in tokens)
+            expansions.append((size, term, tokens))
+        expansions.sort()  # Most selective term first keeps candidate sets small
+
+        total = len(self.documents)
+        scores = None
+        for _, term, tokens in expansions:
+            best = {}
+            for token in tokens:
+                postings = self.postings[token]
+                weight = math.log(1 + total / len(postings))
+                if token != term:
+                    weight *= PREFIX_WEIGHT
+                if scores is None or len(postings) < len(scores):
+                    matches = postings.items()
+                else:
+                    matches = ((i, postings[i]) for i in scores if i in postings)
+                for todo_id, count in matches:
+                    score = weight * count
+                    if score > best.get(todo_id, 0):
+                        best[todo_id] = score
+            if scores is None:
+                scores = best
+            else:
+                scores = {i: scores[i] + s for i, s in best.items() if i in scores}
+            if not scores:
+                return []
+
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return [(todo_id, round(score, 4)) for todo_id, score in ranked]
+
+
+class TrigramIndex:
+    """Trigram -> todo ids postings for fuzzy, typo-tolerant lookup"""
+
+    def __init__(self, todos=()):
+        self.postings = {}
+        self.documents = {}  # id -> trigram set
+        for todo in todos:
+            if isinstance(todo, dict) and "id" in todo:
+                self.add(todo["id"], todo.get("task", ""))
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, todo_id, text):
+        """Index one todo's text, replacing any earlier version"""
+        if todo_id in self.documents:
+            self.remove(todo_id)
+        grams = trigrams(text)
+        self.documents[todo_id] = grams
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(todo_id)
+
+    def remove(self, todo_id):
+        """Drop one todo from the index; unknown ids are ignored"""
+        for gram in self.documents.pop(todo_id, ()):
+            ids = self.postings[gram]
+            ids.discard(todo_id)
+            if not ids:
+                del self.postings[gram]
+
+    def search(self, query, limit=5, min_similarity=MIN_SIMILARITY):
+        """
+        Find the todos whose text is most similar to a query.
+
+        Args:
+            query (str): Loose description, typos allowed
+            limit (int): Maximum number of results
+            min_similarity (float): Drop matches scoring below this
+
+        Returns:
+            list: (todo id, similarity in 0..1) pairs, best first
+        """
+        grams = trigrams(query)
+        if not grams or limit <= 0:
+            return []
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        scored = []
+        for todo_id, count in shared.items():
+            similarity = count / (len(grams) + len(self.documents[todo_id]) - count)
+            if similarity >= min_similarity:
+                scored.append((similarity, todo_id))
+        return [
+            (todo_id, round(similarity, 4))
+            for similarity, todo_id in heapq.nlargest(limit, scored)
+        ]
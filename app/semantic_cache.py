@@ -0,0 +1,382 @@
+"""
+Similarity cache of AI replies, for paraphrased prompts.
+
+The exact-match ResponseCache (app/response_cache.py) misses "hello
+there" after "hi there". SemanticCache matches prompts by meaning-ish
+instead of bytes, without an embedding model: each prompt is reduced to
+its content words (filler such as "please", "can you", "the" dropped,
+greetings and plurals folded), which become a hashed TF-IDF vector over
+the words and their padded trigrams (the same grams as
+app.search.trigrams). A lookup returns the reply cached for the most
+similar prompt if the cosine similarity reaches
+REX_SEMANTIC_CACHE_THRESHOLD and the two prompts agree exactly, in
+order, on their numbers, question words and rare words.
+
+Similarity alone can't tell "is 15 a prime number" from "is 17 a prime
+number", or "reverse a list" from "reverse a string": the one word that
+differs is most of the question. So every number, question word and
+negation (PINNED_WORDS), and every content word found in fewer than
+COMMON_MIN_PROMPTS cached prompts (or COMMON_FRACTION of them, in a
+large cache), must be the same in both prompts, in the same order ("5
+miles to km" is not "5 km to miles"). Only words common across the
+cache are left to the threshold, which is set high: every paraphrase
+that passes these checks scores 1.0 or close to it, while prompts that
+differ only in a common word scored up to 0.91 in testing. Reordered
+paraphrases ("explain javascript closures") miss.
+
+Vectors are rows of one float32 NumPy matrix (DIM columns), L2-normalized
+with the IDF as of insertion, so similarity is a dot product. Scanning
+every row costs milliseconds at 100k entries, so a lookup first gathers
+candidates from an inverted index of words, rarest query word first,
+capped at MAX_CANDIDATES rows, then scores them in one batched
+matrix-vector product. A paraphrase close enough to pass the threshold
+shares most of its words with the cached prompt, so it is found among
+the candidates.
+
+The cache holds at most REX_SEMANTIC_CACHE_MAX_ENTRIES prompts (the
+matrix grows by doubling up to that many rows, DIM * 4 bytes each);
+when full, the least recently used entry is replaced. Entries expire
+with the exact cache's REX_RESPONSE_CACHE_TTL. Only stateless prompts
+belong here: callers must not store replies that depend on user data.
+Entries are namespaced by the model and a hash of the system prompt, as
+in the exact cache, so a reply is only served for the same pair.
+
+NumPy is optional. Without it, or with a threshold of 0, the cache is
+disabled and every lookup misses.
+"""
+
+import hashlib
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+
+from app.response_cache import DEFAULT_TTL
+from app.search import tokenize
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DIM = 512  # Vector columns; more means fewer hash collisions
+IDF_BUCKETS = 1 << 18  # Document-frequency counters, hashed like DIM but finer
+MAX_CANDIDATES = 512  # Rows scored per lookup
+INITIAL_ROWS = 1024
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_MAX_ENTRIES = 10000
+COMMON_MIN_PROMPTS = 50  # Words in fewer cached prompts must match exactly
+COMMON_FRACTION = 0.1  # ... or in fewer than this share of a large cache
+
+# Words that don't change what a prompt asks for
+FILLER_WORDS = frozenset({
+    "a", "about", "am", "an", "and", "any", "are", "at", "be", "by", "can",
+    "could", "did", "do", "does", "for", "give", "help", "i", "im", "in", "is",
+    "it", "its", "just", "kindly", "know", "let", "like", "me", "my", "need",
+    "of", "on", "or", "please", "pls", "plz", "s", "show", "so", "some",
+    "tell", "that", "the", "there", "this", "to", "u", "us", "want", "was",
+    "we", "will", "with", "would", "you", "your"
+})
+# Words that always change the answer, however common: they must match
+# like numbers do ("why" vs "how", "is" vs "isn't")
+PINNED_WORDS = frozenset({
+    "how", "never", "no", "not", "t", "what", "when", "where", "which", "who",
+    "why", "without"
+})
+CANONICAL_WORDS = {
+    "hello": "hi", "hey": "hi", "hiya": "hi", "howdy": "hi", "greetings": "hi",
+    "thanks": "thank", "thx": "thank"
+}
+
+
+def namespace_key(model, system_prompt):
+    """Fold the model and system prompt into one int64, like make_key does"""
+    system_hash = hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()
+    digest = hashlib.sha256(f"{model}\0{system_hash}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+def stem(word):
+    """Strip a plural "s": "lists" -> "list", "class" and "status" are kept"""
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def content_words(prompt):
+    """
+    Reduce a prompt to the words that carry its meaning, in order.
+
+    Filler words are dropped, greetings and thanks folded to one word and
+    plural "s" stripped. A prompt made only of filler keeps all its words.
+    """
+    words = [CANONICAL_WORDS.get(word, word) for word in tokenize(prompt)]
+    content = [stem(word) for word in words if word not in FILLER_WORDS]
+    return content or words
+
+
+def prompt_features(prompt):
+    """
+    Split a prompt into weighted features.
+
+    Returns:
+        tuple: (Counter of feature hash -> count, list of content word
+            hashes in order, frozenset of the hashes of words that must
+            always match: numbers and PINNED_WORDS)
+    """
+    words = content_words(prompt)
+    features = Counter()
+    for word in words:
+        features[f"w:{word}"] += 1
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            features[padded[i:i + 3]] += 1
+    hashed = Counter()
+    for feature, count in features.items():
+        hashed[zlib.crc32(feature.encode('utf-8'))] += count
+    word_hashes = {word: zlib.crc32(f"w:{word}".encode('utf-8')) for word in words}
+    pinned = frozenset(
+        h for word, h in word_hashes.items()
+        if word in PINNED_WORDS or any(c.isdigit() for c in word)
+    )
+    return hashed, list(word_hashes.values()), pinned
+
+
+class SemanticCache:
+    """Bounded nearest-prompt cache over hashed TF-IDF vectors"""
+
+    def __init__(self, threshold=None, max_entries=None, ttl=None):
+        self.threshold = threshold if threshold is not None else float(
+            os.getenv("REX_SEMANTIC_CACHE_THRESHOLD", DEFAULT_THRESHOLD))
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv("REX_SEMANTIC_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self.ttl = ttl if ttl is not None else float(
+            os.getenv("REX_RESPONSE_CACHE_TTL", DEFAULT_TTL))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.rejected = 0  # Similar enough, but a number or rare word differed
+        self.bytes_saved = 0
+        self.lookup_ms_total = 0.0
+        if not self.enabled:
+            return
+
+        rows = min(INITIAL_ROWS, self.max_entries)
+        self._matrix = np.zeros((rows, DIM), dtype=np.float32)
+        self._expires = np.zeros(rows)  # 0 = free slot
+        self._last_used = np.zeros(rows)
+        self._namespaces = np.zeros(rows, dtype=np.int64)
+        self._replies = [None] * rows
+        self._slot_features = [None] * rows  # IDF buckets, to undo df on eviction
+        self._slot_words = [None] * rows  # Word hashes, for postings and the guard
+        self._slot_pinned = [None] * rows
+        self._free = list(range(rows - 1, -1, -1))
+        self._df = np.zeros(IDF_BUCKETS, dtype=np.int32)
+        self._postings = {}  # word hash -> slots, oldest first (may be stale)
+        self._posted = 0  # Postings, stale ones included
+        self._live_posted = 0
+        self.entries = 0
+
+    @property
+    def enabled(self):
+        return np is not None and self.threshold > 0 and self.max_entries > 0 and self.ttl > 0
+
+    def _vector(self, features):
+        """Build the L2-normalized TF-IDF vector for hashed features"""
+        # Square-rooted IDF: a differing common word must still cost more
+        # similarity than the threshold allows
+        hashes = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+        counts = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+        idf = np.sqrt(np.log((1 + self.entries) / (1 + self._df[hashes % IDF_BUCKETS])) + 1)
+        vector = np.zeros(DIM, dtype=np.float32)
+        np.add.at(vector, hashes % DIM, (1 + np.log(counts)) * idf)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _candidates(self, word_hashes):
+        """Collect slots sharing a word with the query, rarest words first"""
+        postings = [self._postings[h] for h in word_hashes if h in self._postings]
+        postings.sort(key=len)
+        candidates = set()
+        for slots in postings:
+            candidates.update(slots[-(MAX_CANDIDATES - len(candidates)):])
+            if len(candidates) >= MAX_CANDIDATES:
+                break
+        return np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+
+    def _guard(self, word_hashes, pinned):
+        """Return the words that must match for a hit: pinned and rare ones, in order"""
+        common = max(COMMON_MIN_PROMPTS, COMMON_FRACTION * self.entries)
+        return tuple(
+            h for h in word_hashes if h in pinned or self._df[h % IDF_BUCKETS] < common
+        )
+
+    def get(self, prompt, model, system_prompt):
+        """
+        Return the reply cached for the most similar prompt, or None.
+
+        Args:
+            prompt (str): The user's message
+            model (str): Model name
+            system_prompt (str): System prompt sent with the message
+        """
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        features, word_hashes, pinned = prompt_features(prompt)
+        namespace = namespace_key(model, system_prompt)
+        with self._lock:
+            reply = None
+            if features and self.entries:
+                reply = self._lookup(features, word_hashes, pinned, namespace)
+            if reply is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.bytes_saved += len(reply.encode('utf-8'))
+            self.lookup_ms_total += (time.perf_counter() - started) * 1000
+        return reply
+
+    def _lookup(self, features, word_hashes, pinned, namespace):
+        slots = self._candidates(word_hashes)
+        if not len(slots):
+            return None
+        now = time.monotonic()
+        stale = slots[(self._expires[slots] <= now) & (self._expires[slots] > 0)]
+        for slot in stale:
+            self._evict(int(slot))
+            self.expired += 1
+        slots = slots[(self._expires[slots] > now) & (self._namespaces[slots] == namespace)]
+        if not len(slots):
+            return None
+        scores = self._matrix[slots] @ self._vector(features)
+        guard = None
+        for best in np.argsort(-scores):
+            if scores[best] < self.threshold:
+                break
+            slot = int(slots[best])
+            if guard is None:
+                guard = self._guard(word_hashes, pinned)
+            if self._guard(self._slot_words[slot], self._slot_pinned[slot]) != guard:
+                self.rejected += 1
+                continue
+            self._last_used[slot] = now
+            return self._replies[slot]
+        return None
+
+    def put(self, prompt, reply, model, system_prompt):
+        """Cache a reply to a stateless prompt (arguments as for get)"""
+        if not self.enabled or not reply:
+            return
+        features, word_hashes, pinned = prompt_features(prompt)
+        if not word_hashes:
+            return
+        idf_buckets = np.unique(
+            np.fromiter(features.keys(), dtype=np.int64, count=len(features)) % IDF_BUCKETS
+        )
+        with self._lock:
+            slot = self._allocate()
+            self._df[idf_buckets] += 1
+            self.entries += 1
+            now = time.monotonic()
+            self._matrix[slot] = self._vector(features)
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._namespaces[slot] = namespace_key(model, system_prompt)
+            self._replies[slot] = reply
+            self._slot_features[slot] = idf_buckets
+            self._slot_words[slot] = word_hashes
+            self._slot_pinned[slot] = pinned
+            for word in word_hashes:
+                self._postings.setdefault(word, []).append(slot)
+            self._posted += len(word_hashes)
+            self._live_posted += len(word_hashes)
+            if self._posted > 2 * self._live_posted + INITIAL_ROWS:
+                self._rebuild_postings()
+
+    def _allocate(self):
+        """Return a free slot, growing the matrix or evicting the LRU entry"""
+        if not self._free:
+            rows = len(self._replies)
+            if rows < self.max_entries:
+                self._grow(min(rows * 2, self.max_entries))
+            else:
+                live = np.where(self._expires > 0, self._last_used, np.inf)
+                self._evict(int(np.argmin(live)))
+                self.evictions += 1
+        return self._free.pop()
+
+    def _grow(self, rows):
+        old = len(self._replies)
+        self._matrix = np.vstack([self._matrix, np.zeros((rows - old, DIM), dtype=np.float32)])
+        self._expires = np.concatenate([self._expires, np.zeros(rows - old)])
+        self._last_used = np.concatenate([self._last_used, np.zeros(rows - old)])
+        self._namespaces = np.concatenate([self._namespaces, np.zeros(rows - old, dtype=np.int64)])
+        self._replies.extend([None] * (rows - old))
+        self._slot_features.extend([None] * (rows - old))
+        self._slot_words.extend([None] * (rows - old))
+        self._slot_pinned.extend([None] * (rows - old))
+        self._free.extend(range(rows - 1, old - 1, -1))
+
+    def _evict(self, slot):
+        # Postings still name the slot; candidates are rescored, so a
+        # stale posting only costs a wasted row until the next rebuild
+        self._df[self._slot_features[slot]] -= 1
+        self._live_posted -= len(self._slot_words[slot])
+        self.entries -= 1
+        self._matrix[slot] = 0
+        self._expires[slot] = 0
+        self._replies[slot] = None
+        self._slot_features[slot] = None
+        self._slot_words[slot] = None
+        self._slot_pinned[slot] = None
+        self._free.append(slot)
+
+    def _rebuild_postings(self):
+        """Drop stale postings left behind by evictions"""
+        postings = {}
+        order = np.argsort(self._last_used)  # Oldest first, as when appended
+        for slot in order[self._expires[order] > 0]:
+            slot = int(slot)
+            for word in self._slot_words[slot]:
+                postings.setdefault(word, []).append(slot)
+        self._postings = postings
+        self._posted = self._live_posted
+
+    def stats(self):
+        """Return hit ratio, size and lookup-time counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "semantic_cache_enabled": self.enabled,
+                "semantic_cache_numpy": np is not None,
+                "semantic_cache_entries": self.entries if self.enabled else 0,
+                "semantic_cache_max_entries": self.max_entries,
+                "semantic_cache_threshold": self.threshold,
+                "semantic_cache_hits": self.hits,
+                "semantic_cache_misses": self.misses,
+                "semantic_cache_hit_ratio": round(self.hits / lookups, 3) if lookups else 0,
+                "semantic_cache_expired": self.expired,
+                "semantic_cache_evictions": self.evictions,
+                "semantic_cache_rejected": self.rejected,
+                "semantic_cache_bytes_saved": self.bytes_saved,
+                "semantic_cache_avg_lookup_ms": (
+                    round(self.lookup_ms_total / lookups, 3) if lookups else 0
+                )
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache, created on first use (after load_dotenv())"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache()
+        return _cache
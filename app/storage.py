@@ -0,0 +1,1870 @@
+"""
+Storage engine for Rex AI Assistant.
+
+Every JSON document the app persists (storage.json, todolist.json) is read
+and written through a StorageEngine. The Flask routes in main.py and the
+LangChain tools in app/tools.py share the module-level ``engine``, so
+locking, caching and serialization are implemented once here and both
+code paths see the same view of each file.
+
+Mutations made inside ``transaction()`` share one in-memory snapshot per
+file and are written once when the transaction commits, so a request that
+touches the same file several times only pays for one write.
+
+Parsed documents are cached per path and revalidated against the file's
+(st_mtime_ns, st_size) on every load, so unchanged files are never parsed
+twice. Documents returned by ``load_data`` are shared with the cache:
+treat them as read-only unless you save them back.
+
+New writes use the format selected by REX_STORAGE_FORMAT (pretty JSON,
+compact JSON or msgpack); reads detect the format of each file, and
+``python -m app.storage convert`` rewrites existing files in place.
+
+Every document read is passed through app.schema.upgrade_document, so
+files from older schema versions are migrated lazily and saved in the
+current shape the next time they are written. ``python -m app.storage
+migrate`` upgrades files eagerly instead; naming a history file upgrades
+the whole history, archived segments included, under the history lock.
+
+Writes go to a temp file that is fsynced and renamed over the target, so
+readers only ever see a complete document. Transactions additionally hold
+an exclusive lock on a sidecar lock file for the duration of their
+read-modify-write, which makes it safe to run several gunicorn workers
+against the same storage directory.
+
+REX_STORAGE_DURABILITY picks when saves reach disk:
+
+- ``sync`` (default): every save is written and fsynced before returning
+- ``batched``: saves update memory immediately; a background flusher
+  coalesces dirty documents and writes them (fsynced) at most every
+  REX_STORAGE_FLUSH_MS milliseconds
+- ``relaxed``: like batched, but flushes skip fsync
+
+Pending writes are always flushed and fsynced at interpreter exit. The
+write-behind modes keep unflushed state in one process, so only use them
+with a single worker (or where other workers may briefly read stale data).
+
+With REX_STORAGE_BACKEND=wal, saves append a checksummed record of just
+the changes to ``<file>.wal`` instead of rewriting the file, and the file
+itself becomes a periodic snapshot (see WalBackend).
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from app.schema import (
+    PRIORITIES, SCHEMA_KEY, SCHEMA_VERSION, ensure_todo_ids, make_todo, upgrade_document,
+    upgrade_jsonl
+)
+from app.search import (
+    DEFAULT_LIMIT as DEFAULT_SEARCH_LIMIT, MIN_PREFIX_LENGTH, TodoSearchIndex, TrigramIndex,
+    tokenize
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+STORAGE_FILE = Path(__file__).parent.parent / "storage.json"
+TODO_FILE = Path(__file__).parent.parent / "todolist.json"
+SQLITE_FILE = Path(__file__).parent.parent / "storage.db"
+LOCK_FILE = Path(__file__).parent.parent / ".storage.lock"
+
+# On-disk format for new writes: json, json-compact or msgpack
+STORAGE_FORMAT = os.getenv("REX_STORAGE_FORMAT", "json")
+REX_FORMAT_MAGIC = b"\x00REX:"
+
+DURABILITY = os.getenv("REX_STORAGE_DURABILITY", "sync")
+FLUSH_INTERVAL_MS = int(os.getenv("REX_STORAGE_FLUSH_MS", "200"))
+
+# Document backend: "file" (rewrite per save) or "wal" (snapshot + log)
+STORAGE_BACKEND = os.getenv("REX_STORAGE_BACKEND", "file")
+WAL_CHECKPOINT_BYTES = int(os.getenv("REX_STORAGE_WAL_CHECKPOINT_KB", "1024")) * 1024
+
+# Backend for StorageManager: "json" (storage.json) or "sqlite" (storage.db)
+TODO_BACKEND = os.getenv("REX_TODO_BACKEND", "json")
+
+
+class FileLock:
+    """
+    Re-entrant lock shared by threads in this process and by other processes.
+
+    Threads serialize on an RLock; the outermost acquire additionally takes
+    an exclusive OS lock on ``path`` so other workers block too. Time spent
+    waiting is recorded for the storage stats.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.local = threading.RLock()  # In-process only, for lock-free readers
+        self._depth = 0
+        self._fd = None
+        self.acquisitions = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def acquire(self):
+        started = time.perf_counter()
+        self.local.acquire()
+        try:
+            if self._depth == 0:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_EX)
+                    else:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                self._fd = fd
+                waited = time.perf_counter() - started
+                self.acquisitions += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            self._depth += 1
+        except BaseException:
+            self.local.release()
+            raise
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(fd)
+        self.local.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def stats(self):
+        """Return lock-wait counters for monitoring"""
+        return {
+            "lock_acquisitions": self.acquisitions,
+            "lock_wait_ms_total": round(self.wait_seconds_total * 1000, 3),
+            "lock_wait_ms_max": round(self.wait_seconds_max * 1000, 3)
+        }
+
+
+class JSONSerializer:
+    """Pretty-printed JSON, the historical storage.json format."""
+
+    name = "json"
+    binary = False
+
+    def encode(self, data):
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+    def decode(self, raw):
+        return _json_loads(raw)
+
+
+class CompactJSONSerializer(JSONSerializer):
+    """JSON without whitespace, encoded with orjson when it is installed."""
+
+    name = "json-compact"
+
+    def encode(self, data):
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class MsgpackSerializer:
+    """Binary MessagePack (requires the optional msgpack package)."""
+
+    name = "msgpack"
+    binary = True
+
+    def encode(self, data):
+        return _require_msgpack().packb(data, use_bin_type=True)
+
+    def decode(self, raw):
+        return _require_msgpack().unpackb(raw, raw=False)
+
+
+SERIALIZERS = {
+    serializer.name: serializer
+    for serializer in (JSONSerializer(), CompactJSONSerializer(), MsgpackSerializer())
+}
+
+
+def _json_loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode('utf-8'))
+
+
+def _require_msgpack():
+    if msgpack is None:
+        raise RuntimeError("The msgpack storage format requires 'pip install msgpack'")
+    return msgpack
+
+
+def get_serializer(name):
+    """Return the serializer registered under name"""
+    try:
+        return SERIALIZERS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown storage format {name!r}; expected one of {', '.join(SERIALIZERS)}"
+        ) from None
+
+
+def encode_document(data, serializer):
+    """Encode data, prefixing binary formats with a header naming the format"""
+    payload = serializer.encode(data)
+    if serializer.binary:
+        return REX_FORMAT_MAGIC + serializer.name.encode('ascii') + b'\n' + payload
+    return payload
+
+
+def detect_format(raw):
+    """Return the serializer name a stored document was written with"""
+    if raw.startswith(REX_FORMAT_MAGIC):
+        header_end = raw.index(b'\n')
+        return raw[len(REX_FORMAT_MAGIC):header_end].decode('ascii')
+    # JSON variants share a decoder; compact output has no newlines
+    return "json" if b'\n' in raw.strip() else "json-compact"
+
+
+def decode_document(raw):
+    """Decode a stored document in any supported format"""
+    if raw.startswith(REX_FORMAT_MAGIC):
+        header_end = raw.index(b'\n')
+        name = raw[len(REX_FORMAT_MAGIC):header_end].decode('ascii')
+        return get_serializer(name).decode(raw[header_end + 1:])
+    if not raw.strip():
+        return {}
+    return _json_loads(raw)
+
+
+def atomic_write_bytes(file_path, payload, fsync=True):
+    """
+    Replace file_path with payload without ever exposing a partial file.
+
+    The bytes are written (and optionally fsynced) to a temp file in the
+    same directory, then renamed over the target.
+    """
+    file_path = Path(file_path)
+    tmp_file = file_path.with_name(
+        f".{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    try:
+        with open(tmp_file, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_file, file_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_file)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class StorageBackend:
+    """
+    Interface for where JSON documents are persisted.
+
+    Backends only move whole documents in and out of durable storage;
+    the engine handles snapshots, transactions and locking on top.
+    """
+
+    def read(self, file_path):
+        """Return the document at file_path, or {} if it doesn't exist"""
+        raise NotImplementedError
+
+    def serialize(self, data):
+        """Encode a document to the bytes stored on disk"""
+        raise NotImplementedError
+
+    def prepare(self, file_path, data):
+        """
+        Encode a save of data for write_prepared().
+
+        Called with the engine lock held, so the document can't change
+        while it is encoded; the write itself may happen after release.
+        """
+        return self.serialize(data)
+
+    def write_prepared(self, file_path, payload, fsync=True):
+        """Persist a payload returned by prepare()"""
+        self.write_bytes(file_path, payload, fsync=fsync)
+
+    def write(self, file_path, data, fsync=True):
+        """Persist data as the document at file_path"""
+        self.write_prepared(file_path, self.prepare(file_path, data), fsync=fsync)
+
+    def write_bytes(self, file_path, payload, fsync=True):
+        """Persist already-serialized bytes as the document at file_path"""
+        atomic_write_bytes(file_path, payload, fsync=fsync)
+
+    def stats(self):
+        """Return backend-specific counters for the storage stats"""
+        return {}
+
+    def signature(self, file_path):
+        """
+        Return a cheap fingerprint of the stored document.
+
+        The engine's read cache reuses a parsed document for as long as its
+        signature is unchanged. Returns None if the document doesn't exist.
+        """
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+class FileBackend(StorageBackend):
+    """
+    Stores each document as a file in the configured on-disk format.
+
+    Reads auto-detect the format: binary formats start with a
+    ``REX_FORMAT_MAGIC`` header naming the serializer, anything else is
+    parsed as JSON. Switching REX_STORAGE_FORMAT therefore never breaks
+    existing files; they are rewritten in the new format on next save.
+    """
+
+    def __init__(self, serializer=None):
+        self.serializer = serializer if serializer is not None else get_serializer(STORAGE_FORMAT)
+
+    def read(self, file_path):
+        """
+        Load and parse a document from file with error handling.
+
+        A file that can't be decoded is quarantined (see _quarantine)
+        rather than reported as empty in place, so callers that recreate
+        a missing document can't overwrite the only copy of its data.
+
+        Args:
+            file_path (Path): Path to the file to load
+
+        Returns:
+            dict: Parsed data, or empty dict if the file doesn't exist,
+            can't be read or was quarantined
+        """
+        try:
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+                inode = os.fstat(f.fileno()).st_ino
+        except FileNotFoundError:
+            return {}
+        except OSError as e:
+            print(f"Error loading data from {file_path}: {e}")
+            return {}
+        try:
+            return decode_document(raw)
+        except Exception as e:
+            self._quarantine(file_path, inode, e)
+            return {}
+
+    def _quarantine(self, file_path, inode, error):
+        """
+        Move an undecodable document aside as ``<name>.<timestamp>.corrupt``.
+
+        Nothing is moved if the file was replaced since it was read (its
+        inode changed): a save landed in between and the new file is fine.
+
+        Args:
+            file_path (Path): The document that failed to decode
+            inode (int): Inode of the file that was read
+            error (Exception): The decode error, for the log
+
+        Returns:
+            Path: Where the file was moved, or None if it was left alone
+        """
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        target = file_path.with_name(f"{file_path.name}.{stamp}.corrupt")
+        try:
+            if os.stat(file_path).st_ino != inode:
+                return None
+            os.replace(file_path, target)
+        except FileNotFoundError:
+            return None  # Another worker quarantined it first
+        print(f"Error loading data from {file_path}: {error}; "
+              f"moved it to {target.name} and starting from an empty document")
+        return target
+
+    def serialize(self, data):
+        return encode_document(data, self.serializer)
+
+    def write(self, file_path, data, fsync=True):
+        """Save data to file atomically (temp file + rename)"""
+        try:
+            self.write_prepared(file_path, self.prepare(file_path, data), fsync=fsync)
+        except Exception as e:
+            print(f"Error saving data to {file_path}: {e}")
+
+
+WAL_HEADER = struct.Struct(">4sIQ")  # magic, crc32 and size of the snapshot
+WAL_MAGIC = b"RWAL"
+WAL_FRAME = struct.Struct(">II")  # payload length, crc32 of the payload
+
+
+def _digest(value):
+    encoded = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=16).digest()
+
+
+def _record_digest(record):
+    """Cheap change detector for one record; only compared within a process"""
+    try:
+        return hash(tuple(record.items()))  # Flat records (todos) hash in C
+    except TypeError:
+        return _digest(record)
+
+
+def _fingerprint(document):
+    """
+    Digest each top-level value of a document.
+
+    Lists of records with unique ``id`` keys (todos) are digested per
+    record as (ids in order, {id: digest}), so a save that touches one
+    todo logs one todo rather than the whole list.
+    """
+    fingerprints = {}
+    for key, value in document.items():
+        if (isinstance(value, list) and value
+                and all(isinstance(item, dict) and "id" in item for item in value)):
+            items = {item["id"]: _record_digest(item) for item in value}
+            if len(items) == len(value):
+                fingerprints[key] = ([item["id"] for item in value], items)
+                continue
+        fingerprints[key] = _digest(value)
+    return fingerprints
+
+
+def _diff_documents(previous, current, document):
+    """Return the WAL ops turning the previous fingerprints into document"""
+    ops = []
+    for key, fingerprint in current.items():
+        before = previous.get(key)
+        if before == fingerprint:
+            continue
+        if isinstance(fingerprint, tuple) and isinstance(before, tuple):
+            order, items = fingerprint
+            old_order, old_items = before
+            survivors = [todo_id for todo_id in old_order if todo_id in items]
+            # A merge can express in-place edits, deletes and appends only
+            if survivors + [todo_id for todo_id in order if todo_id not in old_items] == order:
+                ops.append({
+                    "op": "merge",
+                    "key": key,
+                    "upsert": [
+                        item for item in document[key]
+                        if old_items.get(item["id"]) != items[item["id"]]
+                    ],
+                    "delete": [todo_id for todo_id in old_order if todo_id not in items]
+                })
+                continue
+        ops.append({"op": "set", "key": key, "value": document[key]})
+    for key in previous.keys() - current.keys():
+        ops.append({"op": "del", "key": key})
+    return ops
+
+
+def _apply_wal_ops(document, ops, positions):
+    """
+    Replay one WAL record onto a document in place.
+
+    ``positions`` caches {key: {id: list index}} across the records of one
+    replay, so a run of merges doesn't re-index the list for each record.
+    """
+    for op in ops:
+        key = op["key"]
+        if op["op"] == "set":
+            document[key] = op["value"]
+            positions.pop(key, None)
+        elif op["op"] == "del":
+            document.pop(key, None)
+            positions.pop(key, None)
+        elif op["op"] == "merge":
+            items = document.setdefault(key, [])
+            if op["delete"]:
+                deleted = set(op["delete"])
+                items = document[key] = [item for item in items if item["id"] not in deleted]
+                positions.pop(key, None)
+            if key not in positions:
+                positions[key] = {item["id"]: i for i, item in enumerate(items)}
+            index = positions[key]
+            for item in op["upsert"]:
+                if item["id"] in index:
+                    items[index[item["id"]]] = item
+                else:
+                    index[item["id"]] = len(items)
+                    items.append(item)
+
+
+def wal_path(file_path):
+    """Return the write-ahead log that belongs to a document"""
+    return file_path.with_name(f"{file_path.name}.wal")
+
+
+def replay_wal(file_path, document, snapshot_raw):
+    """
+    Apply a document's write-ahead log to its decoded snapshot.
+
+    Records are replayed in order until the end of the log or the first
+    record that is truncated or fails its checksum (a torn final append).
+    A log whose header names a different snapshot is stale, left behind
+    by a crash during a checkpoint, and is ignored.
+
+    Args:
+        file_path (Path): The document (not the log)
+        document (dict): The decoded snapshot, updated in place
+        snapshot_raw (bytes): The snapshot bytes the log must extend
+
+    Returns:
+        dict: records replayed, valid log bytes, torn_tail, stale_log
+    """
+    try:
+        with open(wal_path(file_path), 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        raw = b''
+    report = {"records": 0, "log_bytes": 0, "torn_tail": False, "stale_log": False}
+    if not raw:
+        return report
+    expected = WAL_HEADER.pack(WAL_MAGIC, zlib.crc32(snapshot_raw), len(snapshot_raw))
+    if raw[:WAL_HEADER.size] != expected:
+        report["stale_log"] = True
+        return report
+
+    offset = WAL_HEADER.size
+    positions = {}
+    while offset < len(raw):
+        start = offset + WAL_FRAME.size
+        if start > len(raw):
+            report["torn_tail"] = True
+            break
+        length, checksum = WAL_FRAME.unpack_from(raw, offset)
+        payload = raw[start:start + length]
+        if len(payload) != length or zlib.crc32(payload) != checksum:
+            report["torn_tail"] = True
+            break
+        _apply_wal_ops(document, json.loads(payload), positions)
+        report["records"] += 1
+        offset = start + length
+    report["log_bytes"] = offset
+    return report
+
+
+class WalBackend(FileBackend):
+    """
+    Snapshot plus checksummed write-ahead log for each document.
+
+    A save appends one record to ``<name>.wal`` holding only what changed:
+    top-level keys that differ from the last durable state, and for lists
+    of records with ids (todos) just the added, edited and deleted
+    records. Once the log reaches ``checkpoint_bytes`` the next save
+    writes a fresh snapshot (atomically, like FileBackend) and starts a
+    new log, so replay on startup is bounded by the checkpoint size.
+
+    A process also checkpoints on its first save of a document and
+    whenever another worker has appended since, so each log only ever
+    extends state this process has fingerprinted.
+    """
+
+    def __init__(self, serializer=None, checkpoint_bytes=WAL_CHECKPOINT_BYTES):
+        super().__init__(serializer)
+        self.checkpoint_bytes = checkpoint_bytes
+        self._fingerprints = {}  # path -> fingerprints of the durable document
+        self._log_sizes = {}  # path -> log size after this process's last write
+        self.recoveries = {}  # path name -> last replay report
+        self.appends = 0
+        self.checkpoints = 0
+        self.appended_bytes = 0
+
+    def signature(self, file_path):
+        snapshot = super().signature(file_path)
+        if snapshot is None:
+            return None
+        try:
+            log = os.stat(wal_path(file_path))
+        except FileNotFoundError:
+            return snapshot
+        return snapshot + (log.st_mtime_ns, log.st_size)
+
+    def read(self, file_path):
+        """Load the snapshot and replay the log tail written since it"""
+        for _ in range(3):
+            # Reads take no cross-process lock; retry if a save lands mid-read
+            signature = self.signature(file_path)
+            started = time.perf_counter()
+            try:
+                with open(file_path, 'rb') as f:
+                    snapshot_raw = f.read()
+                    inode = os.fstat(f.fileno()).st_ino
+            except FileNotFoundError:
+                return {}
+            except OSError as e:
+                print(f"Error loading data from {file_path}: {e}")
+                return {}
+            try:
+                document = decode_document(snapshot_raw)
+            except Exception as e:
+                self._quarantine(file_path, inode, e)
+                return {}
+            report = replay_wal(file_path, document, snapshot_raw)
+            if self.signature(file_path) == signature:
+                break
+        report["ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+        first_read = file_path.name not in self.recoveries
+        self.recoveries[file_path.name] = report
+        if report["torn_tail"] or (first_read and report["records"]):
+            print(f"Recovered {file_path.name}: replayed {report['records']} log records "
+                  f"in {report['ms']} ms"
+                  + (" (dropped a torn final record)" if report["torn_tail"] else ""))
+
+        self._fingerprints[file_path] = _fingerprint(document)
+        # A torn or stale log never matches, forcing a checkpoint on next save
+        self._log_sizes[file_path] = report["log_bytes"] if not report["stale_log"] else -1
+        return document
+
+    def _quarantine(self, file_path, inode, error):
+        """Quarantine the snapshot and move its log aside with it"""
+        target = super()._quarantine(file_path, inode, error)
+        if target is not None:
+            try:
+                os.replace(wal_path(file_path), target.with_suffix(".wal.corrupt"))
+            except FileNotFoundError:
+                pass
+        return target
+
+    def _log_size(self, file_path):
+        try:
+            return os.path.getsize(wal_path(file_path))
+        except FileNotFoundError:
+            return None
+
+    def prepare(self, file_path, data):
+        fingerprints = _fingerprint(data)
+        previous = self._fingerprints.get(file_path)
+        log_size = self._log_size(file_path)
+        self._fingerprints[file_path] = fingerprints
+        if (previous is None or log_size is None or log_size >= self.checkpoint_bytes
+                or log_size != self._log_sizes.get(file_path)):
+            return ("snapshot", self.serialize(data))
+        ops = _diff_documents(previous, fingerprints, data)
+        if not ops:
+            return ("noop", None)
+        body = json.dumps(ops, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return ("append", WAL_FRAME.pack(len(body), zlib.crc32(body)) + body)
+
+    def write_prepared(self, file_path, payload, fsync=True):
+        kind, body = payload
+        try:
+            if kind == "snapshot":
+                atomic_write_bytes(file_path, body, fsync=fsync)
+                # A new log names the new snapshot; until it replaces the
+                # old one, the old log is stale and is ignored on replay
+                header = WAL_HEADER.pack(WAL_MAGIC, zlib.crc32(body), len(body))
+                atomic_write_bytes(wal_path(file_path), header, fsync=fsync)
+                self._log_sizes[file_path] = len(header)
+                self.checkpoints += 1
+            elif kind == "append":
+                with open(wal_path(file_path), 'ab') as f:
+                    f.write(body)
+                    f.flush()
+                    if fsync:
+                        os.fsync(f.fileno())
+                self._log_sizes[file_path] += len(body)
+                self.appends += 1
+                self.appended_bytes += len(body)
+        except BaseException:
+            # Unknown on-disk state: the next save checkpoints
+            self._fingerprints.pop(file_path, None)
+            raise
+
+    def stats(self):
+        return {
+            "backend": "wal",
+            "wal_appends": self.appends,
+            "wal_appended_bytes": self.appended_bytes,
+            "wal_checkpoints": self.checkpoints,
+            "wal_recovery": dict(self.recoveries)
+        }
+
+
+def create_backend():
+    """Return the document backend selected by REX_STORAGE_BACKEND"""
+    if STORAGE_BACKEND == "wal":
+        return WalBackend()
+    return FileBackend()
+
+
+def copy_document(value):
+    """Deep-copy a decoded JSON document (dicts, lists and scalars)"""
+    if isinstance(value, dict):
+        return {key: copy_document(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_document(item) for item in value]
+    return value
+
+
+class UnitOfWork:
+    """Collects loads and saves for one request and writes each file once."""
+
+    def __init__(self, engine):
+        self._engine = engine
+        self._snapshots = {}
+        self._dirty = set()
+        self._locked = False
+
+    def _acquire(self):
+        # Held from the first storage access until commit so that the
+        # read-modify-write of the whole transaction is atomic in-process
+        if not self._locked:
+            self._engine._lock.acquire()
+            self._locked = True
+
+    def load(self, file_path):
+        """Return the shared snapshot for a file, reading it on first use"""
+        file_path = Path(file_path)
+        self._acquire()
+        if file_path not in self._snapshots:
+            data = self._engine._read(file_path)
+            if file_path in self._engine._pending:
+                # The flusher will write the pending document as is, so
+                # in-place edits must go to a copy until commit, or a
+                # rollback would leave them in memory and on disk
+                data = copy_document(data)
+            self._snapshots[file_path] = data
+        return self._snapshots[file_path]
+
+    def save(self, file_path, data):
+        """Stage data to be written on commit"""
+        file_path = Path(file_path)
+        self._acquire()
+        self._snapshots[file_path] = data
+        self._dirty.add(file_path)
+
+    def commit(self):
+        """Write every file saved during the unit of work exactly once"""
+        for file_path in sorted(self._dirty):
+            self._engine._write(file_path, self._snapshots[file_path])
+        self._dirty.clear()
+
+    def rollback(self):
+        """Forget snapshots that may have been mutated in place (pending ones are copies)"""
+        for file_path in self._snapshots:
+            self._engine.invalidate(file_path)
+        self._snapshots.clear()
+        self._dirty.clear()
+
+    def release(self):
+        if self._locked:
+            self._locked = False
+            self._engine._lock.release()
+
+
+class StorageEngine:
+    """Shared entry point for loading, saving and transacting on documents."""
+
+    def __init__(self, backend=None, lock_file=LOCK_FILE, durability=DURABILITY,
+                 flush_interval_ms=FLUSH_INTERVAL_MS):
+        self.backend = backend if backend is not None else create_backend()
+        self.durability = durability
+        self.flush_interval_ms = flush_interval_ms
+        self._lock = FileLock(lock_file)
+        self._local = threading.local()
+        self._cache = {}  # path -> (signature, document)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._writes = {}  # path -> saves by this process, for version()
+
+        # Write-behind state (batched/relaxed durability)
+        self._pending = {}  # path -> document not yet on disk
+        self._flush_wanted = threading.Event()
+        self._flush_mutex = threading.Lock()
+        self._flusher = None
+        self.flushes = 0
+        self.coalesced_writes = 0
+
+    def _read(self, file_path):
+        """Read through the cache; callers must hold self._lock.local"""
+        if file_path in self._pending:
+            self.cache_hits += 1
+            return self._pending[file_path]
+        signature = self.backend.signature(file_path)
+        if signature is None:
+            self._cache.pop(file_path, None)
+            return {}
+        cached = self._cache.get(file_path)
+        if cached is not None and cached[0] == signature:
+            self.cache_hits += 1
+            return cached[1]
+        self.cache_misses += 1
+        data = upgrade_document(self.backend.read(file_path))
+        self._cache[file_path] = (signature, data)
+        return data
+
+    def _write(self, file_path, data):
+        """Write through the cache; callers must hold self._lock"""
+        self._writes[file_path] = self._writes.get(file_path, 0) + 1
+        if self.durability != "sync":
+            if file_path in self._pending:
+                self.coalesced_writes += 1
+            self._pending[file_path] = data
+            self._start_flusher()
+            self._flush_wanted.set()
+            return
+        self.backend.write(file_path, data)
+        signature = self.backend.signature(file_path)
+        if signature is None:
+            self._cache.pop(file_path, None)
+        else:
+            self._cache[file_path] = (signature, data)
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush, fsync=True)
+
+    def _flush_loop(self):
+        while True:
+            self._flush_wanted.wait()
+            # Let the rest of the burst land before writing
+            time.sleep(self.flush_interval_ms / 1000)
+            self._flush_wanted.clear()
+            self.flush(fsync=self.durability == "batched")
+
+    def flush(self, fsync=True):
+        """
+        Write every pending document to disk.
+
+        Args:
+            fsync (bool): fsync each file before renaming it into place
+        """
+        with self._flush_mutex:
+            # Serialize under the lock so in-flight transactions can't
+            # mutate a document halfway through encoding it
+            with self._lock.local:
+                pending, self._pending = self._pending, {}
+                payloads = {
+                    file_path: self.backend.prepare(file_path, data)
+                    for file_path, data in pending.items()
+                }
+            if not payloads:
+                return
+
+            for file_path, payload in payloads.items():
+                try:
+                    self.backend.write_prepared(file_path, payload, fsync=fsync)
+                except Exception as e:
+                    print(f"Error flushing {file_path}: {e}")
+                    with self._lock.local:
+                        self._pending.setdefault(file_path, pending[file_path])
+                    self._flush_wanted.set()  # Retry on the next interval
+                    continue
+                with self._lock.local:
+                    if file_path not in self._pending:
+                        self._cache[file_path] = (
+                            self.backend.signature(file_path), pending[file_path]
+                        )
+            self.flushes += 1
+
+    def invalidate(self, file_path=None):
+        """Drop one cached document, or all of them"""
+        with self._lock.local:
+            if file_path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(Path(file_path), None)
+
+    def version(self, file_path):
+        """
+        Return a token that changes whenever a document changes.
+
+        Combines this process's save count (which covers write-behind
+        saves not yet on disk) with the backend signature (which covers
+        saves by other workers). Compare tokens for equality only.
+        """
+        file_path = Path(file_path)
+        return (self._writes.get(file_path, 0), self.backend.signature(file_path))
+
+    def stats(self):
+        """Return read-cache and lock-wait counters for monitoring"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": round(self.cache_hits / lookups * 100, 1) if lookups else 0,
+            "cached_documents": len(self._cache),
+            "durability": self.durability,
+            "pending_writes": len(self._pending),
+            "flushes": self.flushes,
+            "coalesced_writes": self.coalesced_writes,
+            **self.backend.stats(),
+            **self._lock.stats()
+        }
+
+    def current_unit_of_work(self):
+        """Return the unit of work active on this thread, if any"""
+        return getattr(self._local, 'unit_of_work', None)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group all storage mutations in the block into one commit.
+
+        Nested transactions join the outermost one. If the block raises,
+        staged writes are discarded and nothing reaches disk.
+
+        Yields:
+            UnitOfWork: The active unit of work
+        """
+        outer = self.current_unit_of_work()
+        if outer is not None:
+            yield outer
+            return
+
+        unit_of_work = UnitOfWork(self)
+        self._local.unit_of_work = unit_of_work
+        try:
+            yield unit_of_work
+            unit_of_work.commit()
+        except BaseException:
+            unit_of_work.rollback()
+            raise
+        finally:
+            self._local.unit_of_work = None
+            unit_of_work.release()
+
+    def load(self, file_path):
+        """Load a document, sharing the snapshot of an active transaction"""
+        unit_of_work = self.current_unit_of_work()
+        if unit_of_work is not None:
+            return unit_of_work.load(file_path)
+        # Writes are atomic renames, so plain reads need no cross-process lock
+        with self._lock.local:
+            return self._read(Path(file_path))
+
+    def save(self, file_path, data):
+        """Save a document, deferring to the active transaction's commit"""
+        unit_of_work = self.current_unit_of_work()
+        if unit_of_work is not None:
+            unit_of_work.save(file_path, data)
+            return
+        with self._lock:
+            self._write(Path(file_path), data)
+
+
+# Global engine shared by main.py and app/tools.py
+engine = StorageEngine()
+
+
+def load_data(file_path):
+    """Load a JSON document through the shared engine"""
+    return engine.load(file_path)
+
+
+def save_data(file_path, data):
+    """Save a JSON document through the shared engine"""
+    engine.save(file_path, data)
+
+
+def transaction():
+    """Open a transaction on the shared engine"""
+    return engine.transaction()
+
+
+# Bump when the shape of the materialized todo counters changes
+TODO_STATS_VERSION = 1
+DEFAULT_FUZZY_LIMIT = 5  # Candidates returned by a fuzzy todo lookup
+
+
+def build_todo_stats(todos):
+    """Count todos from scratch: total, completed and per-priority"""
+    stats = {
+        "version": TODO_STATS_VERSION,
+        "total": 0,
+        "completed": 0,
+        "priority": {priority: 0 for priority in PRIORITIES}
+    }
+    for todo in todos:
+        _count_todo(stats, todo, 1)
+    return stats
+
+
+def _count_todo(stats, todo, delta):
+    """Add (delta=1) or remove (delta=-1) one todo's contribution to stats"""
+    stats["total"] += delta
+    if todo["completed"]:
+        stats["completed"] += delta
+    if todo["priority"] in stats["priority"]:
+        stats["priority"][todo["priority"]] += delta
+
+
+def analytics_from_stats(stats):
+    """Format todo counters the way get_analytics reports them"""
+    total, completed = stats["total"], stats["completed"]
+    return {
+        "total": total,
+        "completed": completed,
+        "pending": total - completed,
+        "completion_rate": round((completed / total * 100) if total > 0 else 0, 1),
+        "priority_breakdown": dict(stats["priority"])
+    }
+
+
+def allocate_todo_id(data, list_key, sequence_key):
+    """Return the next id from the document's monotonic sequence"""
+    ensure_todo_ids(data, list_key, sequence_key)
+    todo_id = data[sequence_key]
+    data[sequence_key] = todo_id + 1
+    return todo_id
+
+
+class TodoIndex:
+    """
+    id -> todo lookup over one todo list.
+
+    Indexes are cached per document and list key and reused for as long as
+    the engine hands out the same list object, so lookups by id are O(1)
+    instead of a scan. Code that mutates an indexed list must go through
+    add()/remove()/reindex() to keep it in step; a length mismatch forces
+    a rebuild.
+
+    The full-text and trigram search indexes are built on first use and
+    then updated per todo alongside the id map.
+    """
+
+    def __init__(self, todos):
+        self.todos = todos
+        self.by_id = {todo["id"]: todo for todo in todos}
+        self.size = len(todos)
+        self._search = None
+        self._trigrams = None
+
+    @property
+    def search(self):
+        """The TodoSearchIndex over this list's task text"""
+        if self._search is None:
+            self._search = TodoSearchIndex(self.todos)
+        return self._search
+
+    @property
+    def trigrams(self):
+        """The TrigramIndex over this list's task text"""
+        if self._trigrams is None:
+            self._trigrams = TrigramIndex(self.todos)
+        return self._trigrams
+
+    def _text_indexes(self):
+        return [index for index in (self._search, self._trigrams) if index is not None]
+
+    def get(self, todo_id):
+        return self.by_id.get(todo_id)
+
+    def add(self, todo):
+        self.todos.append(todo)
+        self.by_id[todo["id"]] = todo
+        self.size += 1
+        for index in self._text_indexes():
+            index.add(todo["id"], todo["task"])
+
+    def remove(self, todo_id):
+        """Remove and return the todo with todo_id, or None"""
+        todo = self.by_id.pop(todo_id, None)
+        if todo is not None:
+            self.todos.remove(todo)  # Identity hit in C; no per-item Python work
+            self.size -= 1
+            for index in self._text_indexes():
+                index.remove(todo_id)
+        return todo
+
+    def reindex(self, todo):
+        """Refresh the search indexes after a todo's task text changed"""
+        for index in self._text_indexes():
+            index.add(todo["id"], todo["task"])
+
+    def find(self, query, limit=DEFAULT_SEARCH_LIMIT, prefix=True):
+        """Return (todo, score) pairs for a full-text query, best first"""
+        return [
+            (self.by_id[todo_id], score)
+            for todo_id, score in self.search.search(query, limit, prefix)
+        ]
+
+    def find_similar(self, query, limit=DEFAULT_FUZZY_LIMIT):
+        """Return (todo, similarity) pairs for a fuzzy query, best first"""
+        return [
+            (self.by_id[todo_id], score)
+            for todo_id, score in self.trigrams.search(query, limit)
+        ]
+
+
+_todo_indexes = {}  # (path, list key) -> TodoIndex
+
+
+def todo_index(file_path, data, list_key, sequence_key):
+    """Return the cached TodoIndex for data[list_key], rebuilding if stale"""
+    renumbered = ensure_todo_ids(data, list_key, sequence_key)
+    todos = data[list_key]
+    key = (Path(file_path), list_key)
+    index = _todo_indexes.get(key)
+    if (renumbered or index is None or index.todos is not todos
+            or index.size != len(todos)):
+        index = TodoIndex(todos)
+        _todo_indexes[key] = index
+    return index
+
+
+def merge_legacy_todo_list(storage_file=STORAGE_FILE, todo_file=TODO_FILE, engine=engine):
+    """
+    Move todos the agent tools kept in storage.json into todolist.json.
+
+    Older versions gave the LangChain tools their own ``todo_list`` in
+    storage.json, next to the web API's list in todolist.json. Its todos
+    are appended to todolist.json once and the old keys are dropped, so
+    both paths see one list. Todos keep their ids unless todolist.json
+    already uses them, and the id sequence continues past both.
+
+    Args:
+        storage_file (Path): storage.json that may hold a legacy todo_list
+        todo_file (Path): todolist.json, the single todo store
+        engine (StorageEngine): Engine both documents are read through
+
+    Returns:
+        int: Number of todos moved (0 if there was nothing to merge)
+    """
+    with engine.transaction():
+        data = engine.load(storage_file)
+        if "todo_list" not in data:
+            return 0
+        legacy = data["todo_list"]
+        target = engine.load(todo_file) or {"todos": [], "user_name": None,
+                                            SCHEMA_KEY: SCHEMA_VERSION}
+        index = todo_index(todo_file, target, "todos", "next_id")
+        target["next_id"] = max(target["next_id"], data.get("next_todo_id") or 0)
+        for todo in legacy:
+            todo = dict(todo)
+            if todo["id"] in index.by_id or todo["id"] >= target["next_id"]:
+                todo["id"] = allocate_todo_id(target, "todos", "next_id")
+            index.add(todo)
+        for key in ("todo_list", "next_todo_id", "todo_stats"):
+            data.pop(key, None)
+        target.pop("todo_stats", None)  # Recounted by StorageManager on next use
+        engine.save(todo_file, target)
+        engine.save(storage_file, data)
+        return len(legacy)
+
+
+class StorageManager:
+    """
+    Todo list and user name storage used by the LangChain tools.
+
+    Todos live in todolist.json under ``todos``, the same list the web API
+    in main.py reads and writes, so a todo added by either shows up in
+    both. The user name stays in storage.json, where main.py's greeting
+    reads it.
+
+    Todo counters are materialized under ``todo_stats`` and updated in O(1)
+    by every mutation, so analytics never walk the list. They are rebuilt
+    from the list only when missing, from an older TODO_STATS_VERSION, or
+    out of step with the list length (e.g. edited by an older version).
+
+    Todos get ids from the ``next_id`` sequence and are addressed by
+    id in O(1) through a TodoIndex. Methods taking a 0-based ``index``
+    address the list position shown by list_todos.
+    """
+
+    def __init__(self, storage_file=STORAGE_FILE, todo_file=TODO_FILE, engine=engine):
+        self.storage_file = storage_file
+        self.todo_file = todo_file
+        self.engine = engine
+        self._ensure_storage_exists()
+
+    def _ensure_storage_exists(self):
+        """Ensure the todo file exists and holds any legacy storage.json todos"""
+        # Checked under the storage lock so a worker starting late can't
+        # overwrite todos another worker already saved
+        with self.engine.transaction():
+            if not self.engine.load(self.todo_file):
+                self._save_data({"todos": [], "user_name": None, SCHEMA_KEY: SCHEMA_VERSION})
+            merge_legacy_todo_list(self.storage_file, self.todo_file, self.engine)
+
+    def _load_data(self):
+        """Load the todo document"""
+        data = self.engine.load(self.todo_file)
+        if not data:
+            data = {"todos": [], "user_name": None, SCHEMA_KEY: SCHEMA_VERSION}
+        data.setdefault("todos", [])
+        return data
+
+    def _save_data(self, data):
+        """Save the todo document"""
+        self.engine.save(self.todo_file, data)
+
+    def _index(self, data):
+        return todo_index(self.todo_file, data, "todos", "next_id")
+
+    def _stats(self, data):
+        """Return the materialized todo counters, rebuilding them if stale"""
+        stats = data.get("todo_stats")
+        if (not isinstance(stats, dict)
+                or stats.get("version") != TODO_STATS_VERSION
+                or stats.get("total") != len(data["todos"])):
+            stats = build_todo_stats(data["todos"])
+            data["todo_stats"] = stats
+        return stats
+
+    def _id_at(self, data, index):
+        """Return the id of the todo at a 0-based list position, or None"""
+        todo_list = self._index(data).todos
+        if 0 <= index < len(todo_list):
+            return todo_list[index]["id"]
+        return None
+
+    def get_todos(self):
+        """Get all todos"""
+        return self._index(self._load_data()).todos
+
+    def get_todo(self, todo_id):
+        """Get one todo by id, or None"""
+        return self._index(self._load_data()).get(todo_id)
+
+    def add_todo(self, todo, priority="medium", due_date=None):
+        """Add a todo with optional priority and due date"""
+        with self.engine.transaction():
+            data = self._load_data()
+            todo_item = make_todo(
+                allocate_todo_id(data, "todos", "next_id"), todo, priority, due_date
+            )
+            stats = self._stats(data)
+            self._index(data).add(todo_item)
+            _count_todo(stats, todo_item, 1)
+            self._save_data(data)
+            return todo_item
+
+    def remove_todo_by_id(self, todo_id):
+        """Remove a todo by id"""
+        with self.engine.transaction():
+            data = self._load_data()
+            stats = self._stats(data)
+            removed = self._index(data).remove(todo_id)
+            if removed is None:
+                return None
+            _count_todo(stats, removed, -1)
+            self._save_data(data)
+            return removed
+
+    def complete_todo_by_id(self, todo_id):
+        """Mark a todo as completed by id"""
+        return self.update_todo(todo_id, completed=True)
+
+    def update_todo(self, todo_id, **changes):
+        """
+        Update fields of a todo by id.
+
+        Args:
+            todo_id (int): Id of the todo
+            **changes: New values for task, priority, due_date or completed
+
+        Returns:
+            dict: The updated todo, or None if no todo has that id
+        """
+        unknown = set(changes) - {"task", "priority", "due_date", "completed"}
+        if unknown:
+            raise ValueError(f"Cannot update todo fields: {', '.join(sorted(unknown))}")
+        with self.engine.transaction():
+            data = self._load_data()
+            stats = self._stats(data)
+            todo_item = self._index(data).get(todo_id)
+            if todo_item is None:
+                return None
+            _count_todo(stats, todo_item, -1)
+            if changes.get("completed") and not todo_item["completed"]:
+                todo_item["completed_at"] = datetime.now().isoformat()
+            elif changes.get("completed") is False:
+                todo_item["completed_at"] = None
+            todo_item.update(changes)
+            _count_todo(stats, todo_item, 1)
+            if "task" in changes:
+                self._index(data).reindex(todo_item)
+            self._save_data(data)
+            return todo_item
+
+    def search_todos(self, query, limit=DEFAULT_SEARCH_LIMIT, prefix=True):
+        """
+        Full-text search over todo text.
+
+        Args:
+            query (str): Terms that must all match (AND)
+            limit (int): Maximum number of results
+            prefix (bool): Let terms match as word prefixes
+
+        Returns:
+            list: (todo, score) pairs, best first
+        """
+        return self._index(self._load_data()).find(query, limit, prefix)
+
+    def find_todos(self, query, limit=DEFAULT_FUZZY_LIMIT):
+        """
+        Typo-tolerant lookup of todos by a loose description.
+
+        Args:
+            query (str): Description of the task, e.g. "the grocery thing"
+            limit (int): Maximum number of candidates
+
+        Returns:
+            list: (todo, similarity) pairs, best first
+        """
+        return self._index(self._load_data()).find_similar(query, limit)
+
+    def remove_todo(self, index):
+        """Remove a todo by index"""
+        with self.engine.transaction():
+            data = self._load_data()
+            todo_id = self._id_at(data, index)
+            return None if todo_id is None else self.remove_todo_by_id(todo_id)
+
+    def complete_todo(self, index):
+        """Mark a todo as completed"""
+        with self.engine.transaction():
+            data = self._load_data()
+            todo_id = self._id_at(data, index)
+            return None if todo_id is None else self.complete_todo_by_id(todo_id)
+
+    def clear_todos(self):
+        """Remove every todo"""
+        with self.engine.transaction():
+            data = self._load_data()
+            ensure_todo_ids(data, "todos", "next_id")  # Ids are never reused
+            data["todos"] = []
+            data["todo_stats"] = build_todo_stats([])
+            self._save_data(data)
+
+    def save_user_name(self, name):
+        """Save user name"""
+        with self.engine.transaction():
+            data = self.engine.load(self.storage_file)
+            data["user_name"] = name
+            self.engine.save(self.storage_file, data)
+
+    def get_user_name(self):
+        """Get user name"""
+        return self.engine.load(self.storage_file).get("user_name")
+
+    def get_analytics(self):
+        """Get todo analytics from the materialized counters"""
+        with self.engine.transaction():
+            data = self._load_data()
+            had_stats = data.get("todo_stats")
+            stats = self._stats(data)
+            if stats is not had_stats:
+                self._save_data(data)  # Persist the rebuilt counters
+            return analytics_from_stats(stats)
+
+
+class SQLiteStorageManager:
+    """
+    StorageManager with the same method surface, backed by SQLite.
+
+    Runs in WAL mode so readers never block the writer, and indexes the
+    columns analytics and filters group by. Each todo operation touches a
+    handful of rows instead of re-serializing the whole list.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS todos (
+            id INTEGER PRIMARY KEY,
+            task TEXT NOT NULL,
+            priority TEXT NOT NULL DEFAULT 'medium',
+            due_date TEXT,
+            created_at TEXT NOT NULL,
+            completed INTEGER NOT NULL DEFAULT 0,
+            completed_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_todos_completed ON todos(completed);
+        CREATE INDEX IF NOT EXISTS idx_todos_priority ON todos(priority);
+        CREATE INDEX IF NOT EXISTS idx_todos_due_date ON todos(due_date);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+
+        -- Materialized counters kept current by triggers, so analytics
+        -- read a few rows no matter how many todos exist
+        CREATE TABLE IF NOT EXISTS todo_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TRIGGER IF NOT EXISTS todo_stats_insert AFTER INSERT ON todos BEGIN
+            UPDATE todo_stats SET value = value + 1
+                WHERE name IN ('total', 'priority:' || NEW.priority);
+            UPDATE todo_stats SET value = value + NEW.completed WHERE name = 'completed';
+        END;
+        CREATE TRIGGER IF NOT EXISTS todo_stats_delete AFTER DELETE ON todos BEGIN
+            UPDATE todo_stats SET value = value - 1
+                WHERE name IN ('total', 'priority:' || OLD.priority);
+            UPDATE todo_stats SET value = value - OLD.completed WHERE name = 'completed';
+        END;
+        CREATE TRIGGER IF NOT EXISTS todo_stats_update
+        AFTER UPDATE OF completed, priority ON todos BEGIN
+            UPDATE todo_stats SET value = value - 1 WHERE name = 'priority:' || OLD.priority;
+            UPDATE todo_stats SET value = value + 1 WHERE name = 'priority:' || NEW.priority;
+            UPDATE todo_stats SET value = value + NEW.completed - OLD.completed
+                WHERE name = 'completed';
+        END;
+
+        -- Full-text index over task text, also kept current by triggers
+        CREATE VIRTUAL TABLE IF NOT EXISTS todo_fts USING fts5(
+            task, content='todos', content_rowid='id'
+        );
+        CREATE TRIGGER IF NOT EXISTS todo_fts_insert AFTER INSERT ON todos BEGIN
+            INSERT INTO todo_fts (rowid, task) VALUES (NEW.id, NEW.task);
+        END;
+        CREATE TRIGGER IF NOT EXISTS todo_fts_delete AFTER DELETE ON todos BEGIN
+            INSERT INTO todo_fts (todo_fts, rowid, task) VALUES ('delete', OLD.id, OLD.task);
+        END;
+        CREATE TRIGGER IF NOT EXISTS todo_fts_update AFTER UPDATE OF task ON todos BEGIN
+            INSERT INTO todo_fts (todo_fts, rowid, task) VALUES ('delete', OLD.id, OLD.task);
+            INSERT INTO todo_fts (rowid, task) VALUES (NEW.id, NEW.task);
+        END;
+    """
+    FTS_VERSION = 1
+
+    def __init__(self, db_file=SQLITE_FILE, json_file=TODO_FILE, storage_file=STORAGE_FILE):
+        self.db_file = Path(db_file)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+        if self.get_meta("stats_version") != str(TODO_STATS_VERSION):
+            self._rebuild_stats()
+        if self.get_meta("fts_version") != str(self.FTS_VERSION):
+            with self._connect() as conn:  # Index todos written before todo_fts existed
+                conn.execute("INSERT INTO todo_fts (todo_fts) VALUES ('rebuild')")
+            self.set_meta("fts_version", str(self.FTS_VERSION))
+        if json_file is not None:
+            migrate_json_to_sqlite(json_file, self, storage_file)
+
+    def _rebuild_stats(self):
+        """Recount todo_stats from the todos table"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM todo_stats")
+            total, completed = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(completed), 0) FROM todos"
+            ).fetchone()
+            counts = {f"priority:{priority}": 0 for priority in PRIORITIES}
+            for row in conn.execute("SELECT priority, COUNT(*) AS n FROM todos GROUP BY priority"):
+                if f"priority:{row['priority']}" in counts:
+                    counts[f"priority:{row['priority']}"] = row["n"]
+            counts.update(total=total, completed=completed)
+            conn.executemany(
+                "INSERT INTO todo_stats (name, value) VALUES (?, ?)", counts.items()
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('stats_version', ?)",
+                (str(TODO_STATS_VERSION),)
+            )
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        """Convert a row to the dict shape the JSON backend returns"""
+        return make_todo(
+            row["id"], row["task"], row["priority"], row["due_date"], row["created_at"],
+            bool(row["completed"]), row["completed_at"]
+        )
+
+    def _row_at(self, conn, index):
+        """Return the todo row at a 0-based list position, or None"""
+        if index < 0:
+            return None
+        return conn.execute(
+            "SELECT * FROM todos ORDER BY id LIMIT 1 OFFSET ?", (index,)
+        ).fetchone()
+
+    def get_meta(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key, value):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def get_todos(self):
+        """Get all todos"""
+        rows = self._connect().execute("SELECT * FROM todos ORDER BY id").fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def _allocate_id(self, conn):
+        """
+        Return the next id from the monotonic sequence in meta.
+
+        Unlike plain rowids, ids are never reused after the newest todo is
+        deleted. The UPDATE takes the write lock first, so concurrent
+        writers can't be handed the same id.
+        """
+        updated = conn.execute(
+            "UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'next_todo_id'"
+        ).rowcount
+        if not updated:
+            conn.execute(
+                "INSERT INTO meta (key, value)"
+                " SELECT 'next_todo_id', COALESCE(MAX(id), 0) + 2 FROM todos"
+            )
+        return int(conn.execute(
+            "SELECT value FROM meta WHERE key = 'next_todo_id'"
+        ).fetchone()["value"]) - 1
+
+    def get_todo(self, todo_id):
+        """Get one todo by id, or None"""
+        row = self._connect().execute("SELECT * FROM todos WHERE id = ?", (todo_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def add_todo(self, todo, priority="medium", due_date=None):
+        """Add a todo with optional priority and due date"""
+        with self._connect() as conn:
+            todo_id = self._allocate_id(conn)
+            conn.execute(
+                "INSERT INTO todos (id, task, priority, due_date, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (todo_id, todo, priority, due_date, datetime.now().isoformat())
+            )
+            row = conn.execute("SELECT * FROM todos WHERE id = ?", (todo_id,)).fetchone()
+        return self._to_dict(row)
+
+    def remove_todo_by_id(self, todo_id):
+        """Remove a todo by id"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM todos WHERE id = ?", (todo_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM todos WHERE id = ?", (todo_id,))
+        return self._to_dict(row)
+
+    def complete_todo_by_id(self, todo_id):
+        """Mark a todo as completed by id"""
+        return self.update_todo(todo_id, completed=True)
+
+    def update_todo(self, todo_id, **changes):
+        """Update task, priority, due_date or completed of a todo by id"""
+        unknown = set(changes) - {"task", "priority", "due_date", "completed"}
+        if unknown:
+            raise ValueError(f"Cannot update todo fields: {', '.join(sorted(unknown))}")
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM todos WHERE id = ?", (todo_id,)).fetchone()
+            if row is None:
+                return None
+            values = dict(changes)
+            if "completed" in values:
+                values["completed"] = 1 if values["completed"] else 0
+                if values["completed"] and not row["completed"]:
+                    values["completed_at"] = datetime.now().isoformat()
+                elif not values["completed"]:
+                    values["completed_at"] = None
+            if values:
+                assignments = ", ".join(f"{column} = ?" for column in values)
+                conn.execute(
+                    f"UPDATE todos SET {assignments} WHERE id = ?", (*values.values(), todo_id)
+                )
+            row = conn.execute("SELECT * FROM todos WHERE id = ?", (todo_id,)).fetchone()
+        return self._to_dict(row)
+
+    def search_todos(self, query, limit=DEFAULT_SEARCH_LIMIT, prefix=True):
+        """Full-text search over todo text via todo_fts, ranked by BM25"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or limit <= 0:
+            return []
+        match = " ".join(
+            f'"{term}"*' if prefix and len(term) >= MIN_PREFIX_LENGTH else f'"{term}"'
+            for term in terms
+        )
+        rows = self._connect().execute(
+            "SELECT todos.*, -bm25(todo_fts) AS score FROM todo_fts"
+            " JOIN todos ON todos.id = todo_fts.rowid"
+            " WHERE todo_fts MATCH ? ORDER BY score DESC, todos.id DESC LIMIT ?",
+            (match, limit)
+        ).fetchall()
+        return [(self._to_dict(row), round(row["score"], 4)) for row in rows]
+
+    def find_todos(self, query, limit=DEFAULT_FUZZY_LIMIT):
+        """
+        Typo-tolerant lookup of todos by a loose description.
+
+        Trigram similarity isn't something SQLite can rank, so an in-memory
+        TrigramIndex is built from the table and reused until the database
+        changes (this connection's total_changes or, for commits from
+        other connections, PRAGMA data_version).
+        """
+        conn = self._connect()
+        version = (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+        cached = getattr(self._local, 'trigrams', None)
+        if cached is None or cached[0] != version:
+            rows = conn.execute("SELECT id, task FROM todos").fetchall()
+            cached = (version, TrigramIndex({"id": row["id"], "task": row["task"]} for row in rows))
+            self._local.trigrams = cached
+        matches = cached[1].search(query, limit)
+        todos = []
+        for todo_id, score in matches:
+            todo = self.get_todo(todo_id)
+            if todo is not None:
+                todos.append((todo, score))
+        return todos
+
+    def remove_todo(self, index):
+        """Remove a todo by index"""
+        row = self._row_at(self._connect(), index)
+        return None if row is None else self.remove_todo_by_id(row["id"])
+
+    def complete_todo(self, index):
+        """Mark a todo as completed"""
+        row = self._row_at(self._connect(), index)
+        return None if row is None else self.complete_todo_by_id(row["id"])
+
+    def clear_todos(self):
+        """Remove every todo"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM todos")
+
+    def save_user_name(self, name):
+        """Save user name"""
+        self.set_meta("user_name", name)
+
+    def get_user_name(self):
+        """Get user name"""
+        return self.get_meta("user_name")
+
+    def get_analytics(self):
+        """Get todo analytics from the trigger-maintained counters"""
+        counts = dict(self._connect().execute("SELECT name, value FROM todo_stats").fetchall())
+        return analytics_from_stats({
+            "total": counts.get("total", 0),
+            "completed": counts.get("completed", 0),
+            "priority": {
+                priority: counts.get(f"priority:{priority}", 0) for priority in PRIORITIES
+            }
+        })
+
+
+def migrate_json_to_sqlite(json_file, manager, storage_file=STORAGE_FILE):
+    """
+    One-shot import of todolist.json's todos and storage.json's user name into SQLite.
+
+    Todos keep their JSON ids, so /api/todos/<id> links and ids handed out
+    by the tools stay valid, and the id sequence continues past both the
+    largest id and the JSON ``next_id``. A todo whose id is already
+    taken in the database gets a fresh one.
+
+    Args:
+        json_file (Path): todolist.json shared by main.py and the JSON StorageManager
+        manager (SQLiteStorageManager): Destination database
+        storage_file (Path): storage.json holding the user name, or None
+
+    Returns:
+        int: Number of todos imported (0 if already migrated)
+    """
+    if manager.get_meta("migrated_from_json"):
+        return 0
+
+    data = upgrade_document(FileBackend().read(Path(json_file)))
+    todos = data.get("todos", [])
+    user_name = data.get("user_name")
+    if storage_file is not None:
+        user_name = upgrade_document(FileBackend().read(Path(storage_file))).get("user_name")
+    with manager._connect() as conn:
+        taken = {row["id"] for row in conn.execute("SELECT id FROM todos")}
+        conn.executemany(
+            "INSERT INTO todos (id, task, priority, due_date, created_at, completed, completed_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    todo["id"] if todo["id"] not in taken else None,
+                    todo["task"],
+                    todo["priority"],
+                    todo["due_date"],
+                    todo["created_at"],
+                    1 if todo["completed"] else 0,
+                    todo["completed_at"]
+                )
+                for todo in todos
+            ]
+        )
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM todos").fetchone()[0]
+        sequence = conn.execute(
+            "SELECT value FROM meta WHERE key = 'next_todo_id'"
+        ).fetchone()
+        next_id = max(
+            max_id + 1,
+            int(data.get("next_id") or 0),
+            int(sequence["value"]) if sequence else 0
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('next_todo_id', ?)", (str(next_id),)
+        )
+        if user_name and manager.get_meta("user_name") is None:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('user_name', ?)", (user_name,)
+            )
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+            (datetime.now().isoformat(),)
+        )
+    return len(todos)
+
+
+def create_storage_manager():
+    """Return the StorageManager for the configured REX_TODO_BACKEND"""
+    if TODO_BACKEND == "sqlite":
+        merge_legacy_todo_list()  # So the one-shot import sees every JSON todo
+        return SQLiteStorageManager()
+    return StorageManager()
+
+
+def _read_with_wal(file_path):
+    """Return a document's snapshot bytes and its contents with any WAL replayed"""
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    document = decode_document(raw)
+    replay_wal(file_path, document, raw)
+    return raw, document
+
+
+def _replace_document(file_path, payload):
+    """Write a complete document, folding away its WAL"""
+    atomic_write_bytes(file_path, payload)
+    try:
+        os.unlink(wal_path(file_path))  # Already applied to payload
+    except FileNotFoundError:
+        pass
+    engine.invalidate(file_path)
+
+
+def convert_file(file_path, format_name):
+    """
+    Rewrite a storage file in another on-disk format.
+
+    Args:
+        file_path (Path): storage.json, todolist.json or another document
+        format_name (str): Target serializer name
+
+    Returns:
+        tuple: (old format, old size in bytes, new size in bytes)
+    """
+    file_path = Path(file_path)
+    with FileLock(LOCK_FILE):
+        raw, document = _read_with_wal(file_path)
+        payload = encode_document(document, get_serializer(format_name))
+        _replace_document(file_path, payload)
+    return detect_format(raw), len(raw), len(payload)
+
+
+def migrate_file(file_path):
+    """
+    Upgrade a storage file to the current schema now instead of on next use.
+
+    Documents (storage.json, todolist.json) are upgraded and rewritten in
+    their existing format. A history file (``<name>.history.jsonl`` or
+    ``.history.journal``) upgrades its whole history, archived segments
+    included, through HistoryJournal.upgrade() under the history lock;
+    records are streamed, so the hot files are never loaded whole. Other
+    .jsonl files are streamed under the storage lock.
+
+    Args:
+        file_path (Path): File to upgrade
+
+    Returns:
+        str: A one-line description of what changed
+    """
+    file_path = Path(file_path)
+    for suffix in (".history.jsonl", ".history.journal"):
+        if file_path.name.endswith(suffix):
+            from app.history import HistoryJournal  # app.history imports this module
+            storage_file = file_path.with_name(file_path.name[:-len(suffix)] + ".json")
+            records, changed = HistoryJournal(storage_file).upgrade()
+            return f"{changed} of {records} records upgraded"
+    with FileLock(LOCK_FILE):
+        if file_path.suffix in (".jsonl", ".journal"):
+            records, changed = upgrade_jsonl(file_path)
+            return f"{changed} of {records} records upgraded"
+        raw, document = _read_with_wal(file_path)
+        version = document.get(SCHEMA_KEY, 0) if document else SCHEMA_VERSION
+        if version >= SCHEMA_VERSION:
+            return f"already at schema version {version}"
+        payload = encode_document(upgrade_document(document), get_serializer(detect_format(raw)))
+        _replace_document(file_path, payload)
+        return f"schema version {version} -> {SCHEMA_VERSION}"
+
+
+def main(argv=None):
+    """Command line entry point: python -m app.storage convert|migrate ..."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m app.storage")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    convert = subcommands.add_parser("convert", help="rewrite storage files in another format")
+    convert.add_argument("--to", required=True, choices=sorted(SERIALIZERS), dest="format_name")
+    convert.add_argument("files", nargs="+", type=Path)
+    migrate = subcommands.add_parser("migrate", help="upgrade storage files to the current schema")
+    migrate.add_argument("files", nargs="+", type=Path)
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        for file_path in args.files:
+            print(f"{file_path}: {migrate_file(file_path)}")
+        return
+
+    for file_path in args.files:
+        old_format, old_size, new_size = convert_file(file_path, args.format_name)
+        print(f"{file_path}: {old_format} ({old_size} bytes) -> "
+              f"{args.format_name} ({new_size} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,119 +5,10 @@ import os
 from pathlib import Path
 from datetime import datetime, timedelta
 import re
-
-# File-based storage for persistence
-STORAGE_FILE = Path(__file__).parent.parent / "storage.json"
-
-class StorageManager:
-    def __init__(self):
-        self.storage_file = STORAGE_FILE
-        self._ensure_storage_exists()
-    
-    def _ensure_storage_exists(self):
-        """Ensure storage file exists with default structure"""
-        if not self.storage_file.exists():
-            default_data = {
-                "conversation_history": [],
-                "todo_list": [],
-                "user_name": None
-            }
-            self._save_data(default_data)
-    
-    def _load_data(self):
-        """Load data from storage file"""
-        try:
-            with open(self.storage_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"Error loading storage: {e}")
-            return {"conversation_history": [], "todo_list": [], "user_name": None}
-    
-    def _save_data(self, data):
-        """Save data to storage file"""
-        try:
-            with open(self.storage_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error saving storage: {e}")
-    
-    def get_todos(self):
-        """Get all todos"""
-        data = self._load_data()
-        return data.get("todo_list", [])
-    
-    def add_todo(self, todo, priority="medium", due_date=None):
-        """Add a todo with optional priority and due date"""
-        data = self._load_data()
-        todo_item = {
-            "task": todo,
-            "priority": priority,
-            "due_date": due_date,
-            "created_at": datetime.now().isoformat(),
-            "completed": False,
-            "id": len(data["todo_list"]) + 1
-        }
-        data["todo_list"].append(todo_item)
-        self._save_data(data)
-        return todo_item
-    
-    def remove_todo(self, index):
-        """Remove a todo by index"""
-        data = self._load_data()
-        todo_list = data.get("todo_list", [])
-        if 0 <= index < len(todo_list):
-            removed = todo_list.pop(index)
-            self._save_data(data)
-            return removed
-        return None
-    
-    def complete_todo(self, index):
-        """Mark a todo as completed"""
-        data = self._load_data()
-        todo_list = data.get("todo_list", [])
-        if 0 <= index < len(todo_list):
-            todo_list[index]["completed"] = True
-            todo_list[index]["completed_at"] = datetime.now().isoformat()
-            self._save_data(data)
-            return todo_list[index]
-        return None
-    
-    def save_user_name(self, name):
-        """Save user name"""
-        data = self._load_data()
-        data["user_name"] = name
-        self._save_data(data)
-    
-    def get_user_name(self):
-        """Get user name"""
-        data = self._load_data()
-        return data.get("user_name")
-    
-    def get_analytics(self):
-        """Get todo analytics"""
-        data = self._load_data()
-        todos = data.get("todo_list", [])
-        total = len(todos)
-        completed = len([t for t in todos if t.get("completed", False)])
-        pending = total - completed
-        
-        # Priority breakdown
-        priority_counts = {"high": 0, "medium": 0, "low": 0}
-        for todo in todos:
-            priority = todo.get("priority", "medium")
-            if priority in priority_counts:
-                priority_counts[priority] += 1
-        
-        return {
-            "total": total,
-            "completed": completed,
-            "pending": pending,
-            "completion_rate": round((completed / total * 100) if total > 0 else 0, 1),
-            "priority_breakdown": priority_counts
-        }
+from app.storage import create_storage_manager
 
 # Global storage manager instance
-storage = StorageManager()
+storage = create_storage_manager()
 
 @tool
 def add_todo(todo: str, priority: str = "medium"):
@@ -146,19 +37,24 @@ def add_todo(todo: str, priority: str = "medium"):
         return f"❌ Error adding todo: {str(e)}"
 
 @tool
-def remove_todo(todo_index: int):
+def remove_todo(todo_index: int = 0, todo_id: int = None):
     """
-    Removes an item from the to-do list by its index.
+    Removes an item from the to-do list by its index or its id.
     Args:
-        todo_index: The 1-based index of the task to remove.
+        todo_index: The 1-based index of the task to remove, as shown by list_todos.
+        todo_id: The task's id (the #number shown by list_todos or find_todo). Takes precedence over todo_index.
     """
     try:
+        if todo_id is not None:
+            removed_todo = storage.remove_todo_by_id(todo_id)
+            if removed_todo is None:
+                return f"❌ Error: No task with id #{todo_id}."
+            return f"🗑️ Successfully removed '{removed_todo['task']}' from your to-do list."
         todos = storage.get_todos()
         if 1 <= todo_index <= len(todos):
             removed_todo = storage.remove_todo(todo_index - 1)
             if removed_todo:
-                task_name = removed_todo.get("task", removed_todo) if isinstance(removed_todo, dict) else removed_todo
-                return f"🗑️ Successfully removed '{task_name}' from your to-do list."
+                return f"🗑️ Successfully removed '{removed_todo['task']}' from your to-do list."
             else:
                 return "❌ Error: Could not remove the todo item."
         else:
@@ -167,19 +63,24 @@ def remove_todo(todo_index: int):
         return f"❌ Error removing todo: {str(e)}"
 
 @tool
-def complete_todo(todo_index: int):
+def complete_todo(todo_index: int = 0, todo_id: int = None):
     """
     Marks a todo item as completed.
     Args:
-        todo_index: The 1-based index of the task to complete.
+        todo_index: The 1-based index of the task to complete, as shown by list_todos.
+        todo_id: The task's id (the #number shown by list_todos or find_todo). Takes precedence over todo_index.
     """
     try:
+        if todo_id is not None:
+            completed_todo = storage.complete_todo_by_id(todo_id)
+            if completed_todo is None:
+                return f"❌ Error: No task with id #{todo_id}."
+            return f"🎉 Congratulations! You completed '{completed_todo['task']}'!"
         todos = storage.get_todos()
         if 1 <= todo_index <= len(todos):
             completed_todo = storage.complete_todo(todo_index - 1)
             if completed_todo:
-                task_name = completed_todo.get("task", "task")
-                return f"🎉 Congratulations! You completed '{task_name}'!"
+                return f"🎉 Congratulations! You completed '{completed_todo['task']}'!"
             else:
                 return "❌ Error: Could not mark the todo as completed."
         else:
@@ -197,27 +98,17 @@ def list_todos():
         if not todo_list:
             return "📝 Your to-do list is empty. Ready to add some tasks?"
         
+        # Priority and status emojis
+        priority_emoji = {"high": "🔥", "medium": "⚡", "low": "📝"}
         formatted_items = []
         for i, todo in enumerate(todo_list):
-            if isinstance(todo, dict):
-                task = todo.get("task", "Unknown task")
-                priority = todo.get("priority", "medium")
-                completed = todo.get("completed", False)
-                due_date = todo.get("due_date")
-                
-                # Priority and status emojis
-                priority_emoji = {"high": "🔥", "medium": "⚡", "low": "📝"}
-                status_emoji = "✅" if completed else "⏳"
-                
-                item_text = f"{status_emoji} {i+1}. {task} {priority_emoji.get(priority, '⚡')}"
-                if due_date:
-                    item_text += f" (Due: {due_date})"
-                if completed:
-                    item_text += " ✨"
-                    
-                formatted_items.append(item_text)
-            else:
-                formatted_items.append(f"⏳ {i+1}. {todo}")
+            status_emoji = "✅" if todo["completed"] else "⏳"
+            item_text = f"{status_emoji} {i+1}. {todo['task']} {priority_emoji.get(todo['priority'], '⚡')} #{todo['id']}"
+            if todo["due_date"]:
+                item_text += f" (Due: {todo['due_date']})"
+            if todo["completed"]:
+                item_text += " ✨"
+            formatted_items.append(item_text)
         
         return f"📋 **Your To-Do List:**\n\n" + "\n".join(formatted_items)
     except Exception as e:
@@ -263,27 +154,47 @@ def get_analytics():
 @tool
 def search_todos(keyword: str):
     """
-    Searches for todos containing a specific keyword.
+    Searches for todos containing all of the given words (word prefixes also match).
     Args:
-        keyword: The keyword to search for in tasks.
+        keyword: One or more words to search for in tasks.
     """
     try:
-        todos = storage.get_todos()
-        matching_todos = []
-        
-        for i, todo in enumerate(todos):
-            task_text = todo.get("task", todo) if isinstance(todo, dict) else todo
-            if keyword.lower() in task_text.lower():
-                status = "✅" if isinstance(todo, dict) and todo.get("completed") else "⏳"
-                matching_todos.append(f"{status} {i+1}. {task_text}")
-        
-        if not matching_todos:
+        results = storage.search_todos(keyword)
+        if not results:
             return f"🔍 No tasks found containing '{keyword}'"
         
+        matching_todos = []
+        for todo, score in results:
+            status = "✅" if todo["completed"] else "⏳"
+            matching_todos.append(f"{status} #{todo['id']} {todo['task']}")
+        
         return f"🔍 **Search Results for '{keyword}':**\n\n" + "\n".join(matching_todos)
     except Exception as e:
         return f"❌ Error searching todos: {str(e)}"
 
+@tool
+def find_todo(query: str, limit: int = 5):
+    """
+    Finds the todos that best match a loose description, tolerating typos
+    (e.g. "the grocery thing"). Use the returned id with complete_todo or
+    remove_todo instead of listing every todo.
+    Args:
+        query: A short description of the task.
+        limit: Maximum number of candidates to return.
+    """
+    try:
+        matches = storage.find_todos(query, max(1, min(limit, 20)))
+        if not matches:
+            return f"🔍 No tasks resemble '{query}'"
+        
+        lines = []
+        for todo, score in matches:
+            status = "✅" if todo["completed"] else "⏳"
+            lines.append(f"{status} #{todo['id']} {todo['task']} (match {score:.2f})")
+        return "🔍 Best matches (id, task, similarity):\n" + "\n".join(lines)
+    except Exception as e:
+        return f"❌ Error finding todo: {str(e)}"
+
 @tool
 def get_motivational_quote():
     """
@@ -350,9 +261,7 @@ def clear_todos():
     Clears all items from the to-do list.
     """
     try:
-        data = storage._load_data()
-        data["todo_list"] = []
-        storage._save_data(data)
+        storage.clear_todos()
         return "🧹 Successfully cleared all items from your to-do list. Fresh start!"
     except Exception as e:
         return f"❌ Error clearing todos: {str(e)}"
@@ -363,10 +272,10 @@ def count_todos():
     Returns detailed count information about the to-do list.
     """
     try:
-        todos = storage.get_todos()
-        total = len(todos)
-        completed = len([t for t in todos if isinstance(t, dict) and t.get("completed", False)])
-        pending = total - completed
+        analytics = storage.get_analytics()
+        total = analytics["total"]
+        completed = analytics["completed"]
+        pending = analytics["pending"]
         
         if total == 0:
             return "📝 Your to-do list is empty. Ready to add some tasks?"
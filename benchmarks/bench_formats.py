@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Compare on-disk storage formats by size and encode/decode time.
+
+Usage:
+    python benchmarks/bench_formats.py                    # synthetic data
+    python benchmarks/bench_formats.py storage.json ...   # real files
+    python benchmarks/bench_formats.py --messages 50000 --json
+
+Formats whose optional package isn't installed (msgpack) are skipped.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.storage import SERIALIZERS, decode_document, encode_document  # noqa: E402
+
+
+def synthetic_storage(messages, todos):
+    """Build a storage.json-shaped document with the given sizes"""
+    start = datetime(2025, 1, 1)
+    return {
+        "conversation_history": [
+            {
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": f"Message {i}: help me plan my day and add a todo for item {i}",
+                "timestamp": (start + timedelta(seconds=i * 30)).isoformat()
+            }
+            for i in range(messages)
+        ],
+        "todo_list": [
+            {
+                "task": f"Task {i} - review the quarterly report",
+                "priority": ("high", "medium", "low")[i % 3],
+                "due_date": None,
+                "created_at": (start + timedelta(minutes=i)).isoformat(),
+                "completed": i % 4 == 0,
+                "id": i + 1
+            }
+            for i in range(todos)
+        ],
+        "user_name": "Benchmark",
+        "analytics": {"total_tasks_created": todos, "total_conversations": messages // 2}
+    }
+
+
+def time_ms(fn, repeat):
+    """Median wall time of fn() in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def bench_document(label, data, repeat):
+    results = []
+    baseline = None
+    for name, serializer in SERIALIZERS.items():
+        try:
+            payload = encode_document(data, serializer)
+        except RuntimeError as e:
+            print(f"  skipping {name}: {e}", file=sys.stderr)
+            continue
+        result = {
+            "document": label,
+            "format": name,
+            "bytes": len(payload),
+            "encode_ms": round(time_ms(lambda: encode_document(data, serializer), repeat), 3),
+            "decode_ms": round(time_ms(lambda: decode_document(payload), repeat), 3)
+        }
+        if baseline is None:
+            baseline = result["bytes"]
+        result["size_vs_json"] = round(result["bytes"] / baseline, 3)
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="*", type=Path, help="storage files to measure")
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--todos", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    if args.files:
+        documents = [(str(f), decode_document(f.read_bytes())) for f in args.files]
+    else:
+        label = f"synthetic ({args.messages} messages, {args.todos} todos)"
+        documents = [(label, synthetic_storage(args.messages, args.todos))]
+
+    results = []
+    for label, data in documents:
+        results.extend(bench_document(label, data, args.repeat))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for label, _ in documents:
+        print(f"\n{label}")
+        print(f"  {'format':<14}{'bytes':>12}{'vs json':>10}{'encode ms':>12}{'decode ms':>12}")
+        for r in (r for r in results if r["document"] == label):
+            print(f"  {r['format']:<14}{r['bytes']:>12}{r['size_vs_json']:>10}"
+                  f"{r['encode_ms']:>12}{r['decode_ms']:>12}")
+
+
+if __name__ == '__main__':
+    main()
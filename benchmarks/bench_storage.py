@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Time the storage paths the app exercises, across history and todo sizes.
+
+Each size N seeds a throwaway directory with a storage.json and a
+todolist.json holding N todos, and a conversation history of N messages
+(archived and FTS-indexed like a long-running install). Every backend
+runs in its own interpreter so caches, indexes and background compaction
+from one run can't leak into the next.
+
+Measured per size and backend:
+
+- main.py: load_data (cold and cached), save_data, the todo helpers
+- routes: POST /api/chat, GET /api/stats, /api/history (full and one
+  page), /api/history/search, /api/todos and /api/todos/search
+- StorageManager: every public method (the sqlite backend runs only
+  SQLiteStorageManager; main.py doesn't go through REX_TODO_BACKEND)
+
+Usage:
+    python benchmarks/bench_storage.py                         # 1k, 10k, 100k
+    python benchmarks/bench_storage.py --sizes 1000,1000000 --backends wal
+    python benchmarks/bench_storage.py --output results.json
+    python benchmarks/bench_storage.py --compare results.json  # exit 1 on regressions
+
+Chat runs against the rule-based responder (OPENROUTER_API_KEY is
+cleared), so only storage time is measured. REX_STORAGE_DURABILITY and
+the REX_HISTORY_* settings are taken from the environment as usual.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+BACKENDS = ("file", "wal", "sqlite")
+REGRESSION_THRESHOLD = 1.25  # Median slower than baseline by this factor
+NOISE_FLOOR_MS = 0.5  # Smaller slowdowns are timer noise, not regressions
+
+TASK_WORDS = ("review", "quarterly", "report", "buy", "groceries", "call", "dentist",
+              "plan", "sprint", "fix", "bike", "email", "landlord", "book", "flights")
+
+
+# --- Synthetic data ------------------------------------------------------
+
+def synthetic_todos(count):
+    """Build count fixed-shape todos with ids 1..count"""
+    from app.schema import make_todo, PRIORITIES
+    start = datetime.now() - timedelta(minutes=count)
+    todos = []
+    for i in range(count):
+        words = [TASK_WORDS[(i * k) % len(TASK_WORDS)] for k in (1, 3, 7)]
+        todos.append(make_todo(
+            i + 1,
+            f"{' '.join(words)} {i}",
+            PRIORITIES[i % 3],
+            created_at=(start + timedelta(minutes=i)).isoformat(),
+            completed=i % 4 == 0
+        ))
+    return todos
+
+
+def write_history(path, count):
+    """Stream count messages, 30 s apart and ending now, into a history snapshot"""
+    start = datetime.now() - timedelta(seconds=30 * count)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            f.write(json.dumps({
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": f"Message {i}: help me plan my day and add a todo for item {i}",
+                "timestamp": (start + timedelta(seconds=30 * i)).isoformat()
+            }) + "\n")
+
+
+def seed(main, storage, size):
+    """Write size-N documents and history through the app's own engine"""
+    from app.schema import ANALYTICS_DEFAULTS, SCHEMA_VERSION
+    storage.save_data(main.STORAGE_FILE, {
+        "schema_version": SCHEMA_VERSION,
+        "conversation_history": [],
+        "user_name": "Benchmark",
+        "analytics": {
+            **ANALYTICS_DEFAULTS,
+            "total_tasks_created": size,
+            "total_conversations": size // 2
+        },
+        "analytics_rollups": {}
+    })
+    storage.save_data(main.TODO_FILE, {
+        "schema_version": SCHEMA_VERSION,
+        "todos": synthetic_todos(size),
+        "next_id": size + 1,
+        "user_name": "Benchmark"
+    })
+    write_history(main.history.snapshot_file, size)
+    main.history.archive()
+    main.history.search("warmup", 1)  # Builds the FTS sidecar
+
+
+# --- Timing --------------------------------------------------------------
+
+def measure(fn, repeat, setup=None):
+    """
+    Time fn over repeat samples.
+
+    Args:
+        fn (callable): Called with setup(i) if given, else the sample index i
+        repeat (int): Number of samples
+        setup (callable): Untimed per-sample preparation
+
+    Returns:
+        dict: median/p95/min/max milliseconds and the sample count
+    """
+    samples = []
+    for i in range(repeat):
+        arg = setup(i) if setup else i
+        started = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "min_ms": round(samples[0], 3),
+        "max_ms": round(samples[-1], 3),
+        "samples": len(samples)
+    }
+
+
+def check(response):
+    """Fail the run on an error response instead of timing the error path"""
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.path} returned {response.status_code}")
+    return response
+
+
+def bench_main(main, storage, repeat):
+    """Time main.py's storage helpers"""
+    engine = storage.engine
+    results = {}
+    for name, path in (("storage", main.STORAGE_FILE), ("todolist", main.TODO_FILE)):
+        results[f"load_data({name}) cold"] = measure(
+            lambda _: main.load_data(path), repeat, setup=lambda _: engine.invalidate(path)
+        )
+        results[f"load_data({name}) cached"] = measure(lambda _: main.load_data(path), repeat)
+        results[f"save_data({name})"] = measure(
+            lambda data: main.save_data(path, data), repeat,
+            setup=lambda _: main.load_data(path)
+        )
+
+    size = len(main.get_todos())
+    added = []
+    results["add_todo_to_storage"] = measure(
+        lambda i: added.append(main.add_todo_to_storage(f"benchmark task {i}")["id"]), repeat
+    )
+    results["get_todo"] = measure(lambda _: main.get_todo(size // 2), repeat)
+    results["get_todos"] = measure(lambda _: main.get_todos(), repeat)
+    results["search_todos"] = measure(lambda _: main.search_todos("quarterly rep"), repeat)
+    results["update_todo_in_storage"] = measure(
+        lambda i: main.update_todo_in_storage(added[i], completed=True), repeat
+    )
+    results["remove_todo_from_storage"] = measure(
+        lambda i: main.remove_todo_from_storage(added[i]), repeat
+    )
+    results["get_analytics"] = measure(lambda _: main.get_analytics(), repeat)
+    return results
+
+
+def bench_routes(main, repeat):
+    """Time the HTTP routes that read or write storage"""
+    client = main.app.test_client()
+    post, get = client.post, client.get
+    return {
+        "POST /api/chat": measure(
+            lambda _: check(post('/api/chat', json={"message": "hello"})), repeat
+        ),
+        "POST /api/chat (adds todo)": measure(
+            lambda i: check(post('/api/chat', json={"message": f"add todo: benchmark {i}"})),
+            repeat
+        ),
+        "GET /api/stats": measure(lambda _: check(get('/api/stats')), repeat),
+        "GET /api/history": measure(lambda _: check(get('/api/history')), repeat),
+        "GET /api/history?limit=50": measure(
+            lambda _: check(get('/api/history?limit=50')), repeat
+        ),
+        "GET /api/history/search": measure(
+            lambda _: check(get('/api/history/search?q=plan+item')), repeat
+        ),
+        "GET /api/todos": measure(lambda _: check(get('/api/todos')), repeat),
+        "GET /api/todos/search": measure(
+            lambda _: check(get('/api/todos/search?q=groceries')), repeat
+        ),
+    }
+
+
+def bench_manager(manager, repeat):
+    """Time every public StorageManager / SQLiteStorageManager method"""
+    size = len(manager.get_todos())
+    results = {}
+    added = []
+    results["add_todo"] = measure(
+        lambda i: added.append(manager.add_todo(f"benchmark task {i}")["id"]), repeat
+    )
+    results["get_todos"] = measure(lambda _: manager.get_todos(), repeat)
+    results["get_todo"] = measure(lambda _: manager.get_todo(size // 2), repeat)
+    results["update_todo"] = measure(
+        lambda i: manager.update_todo(added[i], task=f"renamed benchmark task {i}"), repeat
+    )
+    results["complete_todo_by_id"] = measure(
+        lambda i: manager.complete_todo_by_id(added[i]), repeat
+    )
+    results["search_todos"] = measure(lambda _: manager.search_todos("quarterly rep"), repeat)
+    results["find_todos"] = measure(lambda _: manager.find_todos("quartrly reprot"), repeat)
+    results["remove_todo_by_id"] = measure(
+        lambda i: manager.remove_todo_by_id(added[i]), repeat
+    )
+    results["complete_todo"] = measure(lambda _: manager.complete_todo(0), repeat)
+
+    def add_last(i):
+        manager.add_todo(f"positional benchmark task {i}")
+        return len(manager.get_todos()) - 1
+    results["remove_todo"] = measure(lambda index: manager.remove_todo(index), repeat,
+                                     setup=add_last)
+    results["save_user_name"] = measure(lambda i: manager.save_user_name(f"Bench {i}"), repeat)
+    results["get_user_name"] = measure(lambda _: manager.get_user_name(), repeat)
+    results["get_analytics"] = measure(lambda _: manager.get_analytics(), repeat)
+    # Destructive, so a single sample taken last
+    results["clear_todos"] = measure(lambda _: manager.clear_todos(), 1)
+    return results
+
+
+# --- Worker (one backend and size per interpreter) -----------------------
+
+def run_worker(backend, size, repeat, output):
+    """Seed a scratch directory, run every group and write rows to output"""
+    os.environ["OPENROUTER_API_KEY"] = ""  # load_dotenv() won't override it
+    os.environ["REX_STORAGE_BACKEND"] = "wal" if backend == "wal" else "file"
+    workdir = Path(tempfile.mkdtemp(prefix="rex-bench-"))
+    try:
+        import main
+        from app import storage
+        from app.history import HistoryJournal
+
+        storage.engine = storage.StorageEngine(lock_file=workdir / ".storage.lock")
+        main.STORAGE_FILE = workdir / "storage.json"
+        main.TODO_FILE = workdir / "todolist.json"
+        main.history = HistoryJournal(main.STORAGE_FILE)
+
+        started = time.perf_counter()
+        seed(main, storage, size)
+        seed_ms = (time.perf_counter() - started) * 1000
+
+        groups = {}
+        if backend == "sqlite":
+            started = time.perf_counter()
+            manager = storage.SQLiteStorageManager(
+                workdir / "storage.db", main.TODO_FILE, main.STORAGE_FILE
+            )
+            migrate_ms = (time.perf_counter() - started) * 1000
+            groups["SQLiteStorageManager"] = {
+                "migrate_json_to_sqlite": {
+                    "median_ms": round(migrate_ms, 3), "p95_ms": round(migrate_ms, 3),
+                    "min_ms": round(migrate_ms, 3), "max_ms": round(migrate_ms, 3),
+                    "samples": 1
+                },
+                **bench_manager(manager, repeat)
+            }
+        else:
+            groups["main"] = bench_main(main, storage, repeat)
+            groups["routes"] = bench_routes(main, repeat)
+            groups["StorageManager"] = bench_manager(
+                storage.StorageManager(main.STORAGE_FILE, main.TODO_FILE, storage.engine), repeat
+            )
+        storage.engine.flush()
+
+        rows = [
+            {"size": size, "backend": backend, "group": group, "operation": operation, **timing}
+            for group, timings in groups.items()
+            for operation, timing in timings.items()
+        ]
+        rows.append({
+            "size": size, "backend": backend, "group": "setup", "operation": "seed",
+            "median_ms": round(seed_ms, 3), "p95_ms": round(seed_ms, 3),
+            "min_ms": round(seed_ms, 3), "max_ms": round(seed_ms, 3), "samples": 1,
+            "bytes": {path.name: path.stat().st_size
+                      for path in sorted(workdir.iterdir()) if path.is_file()}
+        })
+        Path(output).write_text(json.dumps(rows))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# --- Driver --------------------------------------------------------------
+
+def run_suite(sizes, backends, repeat):
+    """Run one worker interpreter per (size, backend); returns all rows"""
+    rows = []
+    for size in sizes:
+        for backend in backends:
+            print(f"  {backend:<7} {size:>9,} ...", file=sys.stderr, flush=True)
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+                output = f.name
+            try:
+                subprocess.run(
+                    [sys.executable, __file__, "--worker", backend, str(size),
+                     "--repeat", str(repeat), "--worker-output", output],
+                    cwd=ROOT, check=True, stdout=subprocess.DEVNULL
+                )
+                rows.extend(json.loads(Path(output).read_text()))
+            finally:
+                os.unlink(output)
+    return rows
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare median timings against an earlier run.
+
+    Returns:
+        list: (row, baseline median, ratio) for every regressed operation
+    """
+    key = lambda r: (r["size"], r["backend"], r["group"], r["operation"])  # noqa: E731
+    previous = {key(r): r["median_ms"] for r in baseline["results"]}
+    regressions = []
+    for row in results["results"]:
+        before = previous.get(key(row))
+        if before is None or row["group"] == "setup":
+            continue
+        if row["median_ms"] > before * threshold and row["median_ms"] - before > NOISE_FLOOR_MS:
+            regressions.append((row, before, round(row["median_ms"] / max(before, 1e-6), 2)))
+    return regressions
+
+
+def print_table(results):
+    rows = results["results"]
+    for size in dict.fromkeys(r["size"] for r in rows):
+        for backend in dict.fromkeys(r["backend"] for r in rows if r["size"] == size):
+            print(f"\n{size:,} messages / todos, {backend} backend")
+            print(f"  {'group':<22}{'operation':<32}{'median ms':>12}{'p95 ms':>12}")
+            for r in rows:
+                if r["size"] == size and r["backend"] == backend:
+                    print(f"  {r['group']:<22}{r['operation']:<32}"
+                          f"{r['median_ms']:>12}{r['p95_ms']:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated message/todo counts (default: %(default)s)")
+    parser.add_argument("--backends", default=",".join(BACKENDS),
+                        help="comma-separated subset of %(default)s")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="write machine-readable results here")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--compare", type=Path, help="results file from an earlier run")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="slowdown factor reported as a regression (default: %(default)s)")
+    parser.add_argument("--worker", nargs=2, metavar=("BACKEND", "SIZE"), help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker[0], int(args.worker[1]), args.repeat, args.worker_output)
+        return 0
+
+    try:
+        sizes = [int(size) for size in args.sizes.split(",")]
+        backends = args.backends.split(",")
+        if any(size < 1 for size in sizes) or not set(backends) <= set(BACKENDS):
+            raise ValueError
+    except ValueError:
+        parser.error(f"--sizes takes positive integers, --backends a subset of {BACKENDS}")
+
+    results = {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "durability": os.getenv("REX_STORAGE_DURABILITY", "sync"),
+            "repeat": args.repeat,
+            "sizes": sizes,
+            "backends": backends
+        },
+        "results": run_suite(sizes, backends, args.repeat)
+    }
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        for row, before, ratio in regressions:
+            print(f"REGRESSION {row['backend']} {row['size']:,} {row['group']} "
+                  f"{row['operation']}: {before} -> {row['median_ms']} ms ({ratio}x)")
+        if regressions:
+            return 1
+        print(f"\nNo regressions against {args.compare}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
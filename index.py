@@ -2,19 +2,27 @@ import json
 import os
 from flask import Flask, render_template, request, jsonify, send_from_directory
 from datetime import datetime
+from app import llm
 
 app = Flask(__name__)
+_preconnected = False
 
 # Simple in-memory storage for demos (resets on each deploy)
 todo_list = []
 chat_history = []
 user_name = None
 
+@app.before_request
+def preconnect_llm():
+    """On a cold start, open the OpenRouter connection while the first request runs"""
+    global _preconnected
+    if not _preconnected:
+        _preconnected = True
+        llm.preconnect()
+
 def get_ai_response(user_input):
     """Get AI response using OpenRouter API directly"""
     try:
-        import requests
-        
         api_key = os.getenv("OPENROUTER_API_KEY")
         if not api_key:
             return "❌ Please configure your OPENROUTER_API_KEY environment variable in Vercel dashboard."
@@ -71,11 +79,6 @@ def get_ai_response(user_input):
             return f"🗑️ Cleared {count} tasks from your list. Fresh start!"
         
         # For other inputs, use AI
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
         system_prompt = """You are Rex AI, a friendly personal assistant that helps with todo list management. 
 
 You can help users:
@@ -86,26 +89,19 @@ You can help users:
 
 Keep responses helpful, encouraging, and concise. Use emojis to make it friendly."""
         
-        data = {
-            "model": "deepseek/deepseek-chat",
-            "messages": [
+        # Warm instances reuse the pooled connection (app/llm.py)
+        content, _ = llm.chat_completion(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_input}
             ],
-            "temperature": 0.7,
-            "max_tokens": 300
-        }
-        
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions", 
-            headers=headers, 
-            json=data, 
-            timeout=10
+            timeout=10,
+            temperature=0.7,
+            max_tokens=300
         )
         
-        if response.status_code == 200:
-            result = response.json()
-            return result['choices'][0]['message']['content']
+        if content is not None:
+            return content
         else:
             return "I can help you manage your todos! Try: 'add buy groceries' or 'show my list'"
             
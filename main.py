@@ -16,13 +16,20 @@ Python: 3.9+
 
 import json
 import os
-from flask import Flask, render_template, request, jsonify, send_from_directory
+import threading
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory
 from pathlib import Path
 import traceback
-import requests
-from datetime import datetime
+from datetime import datetime, timedelta
 import time
 from dotenv import load_dotenv
+from app import analytics as rollups
+from app import llm
+from app import response_cache
+from app import schema
+from app import semantic_cache
+from app import storage
+from app.history import HistoryJournal
 
 # Load environment variables from .env file
 load_dotenv()
@@ -34,6 +41,16 @@ app = Flask(__name__)
 STORAGE_FILE = Path(__file__).parent / "storage.json"  # Chat history and analytics
 TODO_FILE = Path(__file__).parent / "todolist.json"    # Task management data
 
+# Conversation history is journaled next to storage.json (see app/history.py)
+history = HistoryJournal(STORAGE_FILE)
+HISTORY_PAGE_SIZE = 50       # Default /api/history page when paginating
+HISTORY_MAX_PAGE_SIZE = 500
+HISTORY_SEARCH_LIMIT = 20     # Default /api/history/search hits per page
+HISTORY_SEARCH_MAX_LIMIT = 100
+TODO_SEARCH_LIMIT = 20        # Default /api/todos/search result count
+TODO_SEARCH_MAX_LIMIT = 200
+TODO_BATCH_MAX_OPERATIONS = 500  # Per POST /api/todos/batch
+
 def init_storage():
     """
     Initialize JSON storage files with default data structures.
@@ -42,26 +59,78 @@ def init_storage():
     and todolist.json for task management if they don't exist.
     This ensures the application starts with proper data structures.
     """
-    # Initialize conversation history and analytics storage
-    if not STORAGE_FILE.exists():
-        initial_data = {
-            "conversation_history": [],  # Array of chat messages
-            "user_name": None,           # User's preferred name
-            "analytics": {
-                "total_tasks_created": 0,      # Lifetime task count
-                "total_tasks_completed": 0,    # Completed task count  
-                "total_conversations": 0,      # Chat session count
-                "most_productive_day": None,   # Peak productivity date
-                "average_tasks_per_day": 0,    # Daily task average
-                "completion_rate": 0,          # Task completion percentage
-                "last_activity": None         # Last interaction timestamp
+    # Checked under the storage lock so concurrently starting workers
+    # can't overwrite data another worker already saved
+    with storage.transaction():
+        # Initialize conversation history and analytics storage
+        if not load_data(STORAGE_FILE):
+            initial_data = {
+                "schema_version": schema.SCHEMA_VERSION,  # Document shape (app/schema.py)
+                "conversation_history": [],  # Array of chat messages
+                "user_name": None,           # User's preferred name
+                "analytics": {
+                    "total_tasks_created": 0,      # Lifetime task count
+                    "total_tasks_completed": 0,    # Completed task count  
+                    "total_conversations": 0,      # Chat session count
+                    "most_productive_day": None,   # Peak productivity date
+                    "average_tasks_per_day": 0,    # Daily task average
+                    "completion_rate": 0,          # Task completion percentage
+                    "last_activity": None         # Last interaction timestamp
+                }
             }
-        }
-        save_data(STORAGE_FILE, initial_data)
+            save_data(STORAGE_FILE, initial_data)
     
-    # Initialize todo list storage
-    if not TODO_FILE.exists():
-        save_data(TODO_FILE, {"todos": [], "user_name": None})
+        # Initialize todo list storage
+        if not load_data(TODO_FILE):
+            save_data(TODO_FILE, {
+                "schema_version": schema.SCHEMA_VERSION,
+                "todos": [],
+                "user_name": None
+            })
+
+_started = False
+_start_lock = threading.Lock()
+
+def start_app(preconnect=True):
+    """
+    One-time process startup, run before the first request, never at import.
+    
+    Creates missing storage documents, moves the agent's old storage.json
+    todos into todolist.json, imports inline history left behind by older
+    versions and, if preconnect is set, opens the OpenRouter connection so
+    the first chat turn skips TCP/TLS setup. Importing main touches no
+    files and opens no connections.
+    
+    Args:
+        preconnect (bool): Warm the sync OpenRouter client (the ASGI
+            gateway talks to OpenRouter through its own async client)
+    """
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        init_storage()
+        storage.merge_legacy_todo_list(STORAGE_FILE, TODO_FILE)
+        migrate_legacy_history()
+        if preconnect:
+            llm.preconnect()
+        _started = True
+
+def migrate_legacy_history():
+    """
+    Move conversation_history out of storage.json into the history journal.
+
+    Older deployments kept every chat message inline in storage.json.
+    The messages are copied into the journal snapshot once, and the inline
+    copy is dropped so analytics writes no longer rewrite the whole history.
+    """
+    with storage.transaction():
+        data = load_data(STORAGE_FILE)
+        legacy_history = data.get("conversation_history")
+        if legacy_history:
+            history.import_legacy(legacy_history)
+            data["conversation_history"] = []
+            save_data(STORAGE_FILE, data)
 
 def load_data(file_path):
     """
@@ -73,24 +142,89 @@ def load_data(file_path):
     Returns:
         dict: Parsed JSON data or empty dict if file doesn't exist/error
         
-    Handles file not found and JSON parsing errors gracefully.
+    Handles file not found and JSON parsing errors gracefully. Inside a
+    storage.transaction() the same snapshot is returned on every call.
     """
-    try:
-        if file_path.exists():
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
-    except Exception as e:
-        print(f"Error loading data from {file_path}: {e}")
-        return {}
+    return storage.load_data(file_path)
 
 def save_data(file_path, data):
-    """Save data to JSON file"""
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error saving data to {file_path}: {e}")
+    """Save data to JSON file (once, at commit, inside a transaction)"""
+    storage.save_data(file_path, data)
+
+AI_SYSTEM_PROMPT = "You are Rex, an intelligent AI assistant. You help users with conversations, tasks, creativity, coding, and productivity. Be helpful, friendly, and concise. You can also manage todos - when users mention adding tasks, help them organize their work."
+
+def build_ai_messages(user_input):
+    """Build the OpenRouter message list for one chat turn"""
+    return [
+        {
+            "role": "system",
+            "content": AI_SYSTEM_PROMPT
+        },
+        {
+            "role": "user", 
+            "content": user_input
+        }
+    ]
+
+# Prompts whose replies are about stored data (see response_cache_key)
+TODO_PROMPT_WORDS = ('todo', 'task')
+ANALYTICS_PROMPT_WORDS = ('productive', 'productivity', 'organize', 'plan',
+                          'analytics', 'stats', 'statistics', 'progress')
+STATE_CHANGING_WORDS = ('add', 'create', 'remove', 'delete', 'complete', 'clear')
+
+def response_cache_key(user_input):
+    """
+    Return the response cache key for a prompt, or None to bypass the cache.
+    
+    Requests to change todos ("add todo: ...") are never cached. Questions
+    about todos or analytics are keyed by the version of the document they
+    read, so the next save to it retires the cached reply. storage.json
+    is saved on every chat turn, so analytics replies rarely hit.
+    """
+    user_lower = user_input.lower()
+    state = None
+    if any(word in user_lower for word in TODO_PROMPT_WORDS):
+        if any(word in user_lower for word in STATE_CHANGING_WORDS):
+            return None
+        state = storage.engine.version(TODO_FILE)
+    elif any(word in user_lower for word in ANALYTICS_PROMPT_WORDS):
+        state = storage.engine.version(STORAGE_FILE)
+    return response_cache.make_key(user_input, llm.DEFAULT_MODEL, AI_SYSTEM_PROMPT, state)
+
+def is_stateless_prompt(user_input):
+    """True if the reply to user_input can't depend on todos or analytics"""
+    user_lower = user_input.lower()
+    return not any(word in user_lower for word in TODO_PROMPT_WORDS + ANALYTICS_PROMPT_WORDS)
+
+def get_cached_response(user_input):
+    """
+    Look up a cached AI reply to user_input.
+    
+    Tries the exact-match cache first, then, for stateless prompts, the
+    semantic cache (paraphrases of earlier prompts).
+    
+    Returns:
+        tuple: (cached reply or None, response cache key or None)
+    """
+    cache_key = response_cache_key(user_input)
+    if cache_key is None:
+        return None, None
+    cache = response_cache.get_cache()
+    cached = cache.get(cache_key)
+    if cached is None and is_stateless_prompt(user_input):
+        cached = semantic_cache.get_cache().get(user_input, llm.DEFAULT_MODEL, AI_SYSTEM_PROMPT)
+        if cached is not None:
+            cache.put(cache_key, cached)  # Exact repeats skip the similarity search
+    return cached, cache_key
+
+def cache_ai_response(user_input, cache_key, ai_response):
+    """Remember a provider reply for get_cached_response"""
+    if cache_key is None:
+        return
+    response_cache.get_cache().put(cache_key, ai_response)
+    if is_stateless_prompt(user_input):
+        semantic_cache.get_cache().put(user_input, ai_response, llm.DEFAULT_MODEL,
+                                       AI_SYSTEM_PROMPT)
 
 def get_ai_response(user_input):
     """Get AI response using OpenRouter API or fallback to intelligent responses"""
@@ -98,35 +232,15 @@ def get_ai_response(user_input):
         # Try OpenRouter API first
         api_key = os.getenv("OPENROUTER_API_KEY")
         if api_key:
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "model": "deepseek/deepseek-chat",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are Rex, an intelligent AI assistant. You help users with conversations, tasks, creativity, coding, and productivity. Be helpful, friendly, and concise. You can also manage todos - when users mention adding tasks, help them organize their work."
-                    },
-                    {
-                        "role": "user", 
-                        "content": user_input
-                    }
-                ]
-            }
+            cached, cache_key = get_cached_response(user_input)
+            if cached is not None:
+                return cached
             
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result['choices'][0]['message']['content']
+            # Pooled keep-alive connection (app/llm.py)
+            content, _ = llm.chat_completion(build_ai_messages(user_input), timeout=30)
+            if content is not None:
+                cache_ai_response(user_input, cache_key, content)
+                return content
         
         # Fallback to intelligent rule-based responses
         return get_intelligent_response(user_input)
@@ -135,6 +249,57 @@ def get_ai_response(user_input):
         print(f"Error getting AI response: {e}")
         return get_intelligent_response(user_input)
 
+def stream_ai_response(user_input):
+    """
+    Stream an AI response piece by piece as OpenRouter generates it.
+    
+    Falls back to the rule-based response, as a single piece, when no
+    API key is configured or the request fails before any text arrives.
+    A cached reply is also sent as a single piece.
+    
+    Yields:
+        str: Pieces of the reply, in order
+    """
+    if os.getenv("OPENROUTER_API_KEY"):
+        cached, cache_key = get_cached_response(user_input)
+        if cached is not None:
+            yield cached
+            return
+        
+        pieces = []
+        try:
+            for text in llm.stream_chat_completion(build_ai_messages(user_input), timeout=30):
+                pieces.append(text)
+                yield text
+            if pieces:
+                cache_ai_response(user_input, cache_key, "".join(pieces))
+                return
+        except Exception as e:
+            if pieces:
+                raise  # Part of the reply was already sent
+            print(f"Error streaming AI response: {e}")
+    yield get_intelligent_response(user_input)
+
+def save_chat_turn(user_entry, ai_response):
+    """
+    Persist one chat turn: both messages to history, one analytics event.
+    
+    Args:
+        user_entry (dict): The user's message, timestamped when it arrived
+        ai_response (str): The assistant's full reply
+    """
+    with storage.transaction():
+        history.append(user_entry, {
+            "role": "assistant", 
+            "content": ai_response,
+            "timestamp": datetime.now().isoformat()
+        })
+        update_analytics("conversation")
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 def get_intelligent_response(user_input):
     """Intelligent rule-based responses for core functionality"""
     user_lower = user_input.lower()
@@ -235,8 +400,7 @@ Would you like me to continue this story or help you create your own magical wor
     # Analytics request
     if any(word in user_lower for word in ['analytics', 'stats', 'statistics', 'progress']):
         analytics = get_analytics()
-        completion_rate = analytics.get('completion_rate', 0)
-        return f"📈 **Your Analytics:**\n• Tasks Created: {analytics['total_tasks_created']}\n• Tasks Completed: {analytics['total_tasks_completed']}\n• Completion Rate: {completion_rate:.1f}%\n• Total Conversations: {analytics['total_conversations']}\n• Last Activity: {analytics.get('last_activity', 'N/A')}"
+        return f"📈 **Your Analytics:**\n• Tasks Created: {analytics['total_tasks_created']}\n• Tasks Completed: {analytics['total_tasks_completed']}\n• Completion Rate: {analytics['completion_rate']:.1f}%\n• Total Conversations: {analytics['total_conversations']}\n• Last Activity: {analytics['last_activity'] or 'N/A'}"
     
     # Default helpful response
     responses = [
@@ -250,55 +414,279 @@ Would you like me to continue this story or help you create your own magical wor
     return random.choice(responses)
 
 # Todo management functions
-def add_todo_to_storage(task):
-    """Add todo to storage"""
-    data = load_data(TODO_FILE)
-    todo_item = {
-        "id": len(data.get("todos", [])) + 1,
-        "task": task,
-        "completed": False,
-        "created_at": datetime.now().isoformat()
-    }
-    data.setdefault("todos", []).append(todo_item)
+def _todo_index(data):
+    """id -> todo index over todolist.json (ids come from its next_id sequence)"""
+    return storage.todo_index(TODO_FILE, data, "todos", "next_id")
+
+def _save_todos(data):
+    """Save todolist.json; StorageManager recounts its todo_stats after web edits"""
+    data.pop("todo_stats", None)  # Not maintained here, so never left stale
     save_data(TODO_FILE, data)
+
+def add_todo_to_storage(task):
+    """Add todo to storage (todolist.json and analytics commit together)"""
+    with storage.transaction():
+        data = load_data(TODO_FILE)
+        todo_item = schema.make_todo(storage.allocate_todo_id(data, "todos", "next_id"), task)
+        _todo_index(data).add(todo_item)
+        _save_todos(data)
+        
+        # Update analytics
+        update_analytics("task_created")
+        return todo_item
+
+def update_todo_in_storage(todo_id, task=None, completed=None):
+    """
+    Update a todo by id in O(1).
+    
+    Args:
+        todo_id (int): Id of the todo
+        task (str): New task text, if changing
+        completed (bool): New completion state, if changing
+        
+    Returns:
+        dict: The updated todo, or None if no todo has that id
+    """
+    with storage.transaction():
+        data = load_data(TODO_FILE)
+        index = _todo_index(data)
+        todo_item = index.get(todo_id)
+        if todo_item is None:
+            return None
+        if task is not None:
+            todo_item["task"] = task
+            index.reindex(todo_item)
+        if completed is not None:
+            was_completed = todo_item["completed"]
+            todo_item["completed"] = completed
+            if completed and not was_completed:
+                todo_item["completed_at"] = datetime.now().isoformat()
+                update_analytics("task_completed")
+            elif not completed:
+                if was_completed:
+                    # Un-completing takes the completion back out of the counters
+                    retract_completion(todo_item["completed_at"])
+                todo_item["completed_at"] = None
+        _save_todos(data)
+        return todo_item
+
+def remove_todo_from_storage(todo_id):
+    """Remove a todo by id; returns the removed todo or None"""
+    with storage.transaction():
+        data = load_data(TODO_FILE)
+        removed = _todo_index(data).remove(todo_id)
+        if removed is not None:
+            _save_todos(data)
+        return removed
+
+def validate_todo_batch(operations):
+    """
+    Check a batch of todo operations before anything is applied.
+    
+    Args:
+        operations (list): Items like {"op": "add", "task": "..."},
+            {"op": "update", "id": 3, "task": "...", "completed": false},
+            {"op": "complete", "id": 3} or {"op": "delete", "id": 3}
+            
+    Returns:
+        str: A description of the first invalid item, or None if all are valid
+    """
+    if not isinstance(operations, list) or not operations:
+        return "operations must be a non-empty list"
+    if len(operations) > TODO_BATCH_MAX_OPERATIONS:
+        return f"At most {TODO_BATCH_MAX_OPERATIONS} operations per batch"
+    for position, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            return f"Operation {position} must be an object"
+        op = operation.get("op")
+        if op == "add":
+            task = operation.get("task")
+            if not isinstance(task, str) or not task.strip():
+                return f"Operation {position}: task is required"
+        elif op in ("update", "complete", "delete"):
+            todo_id = operation.get("id")
+            if not isinstance(todo_id, int) or isinstance(todo_id, bool):
+                return f"Operation {position}: id must be an integer"
+            if op == "update":
+                if "task" not in operation and "completed" not in operation:
+                    return f"Operation {position}: update needs task or completed"
+                task = operation.get("task")
+                if "task" in operation and (not isinstance(task, str) or not task.strip()):
+                    return f"Operation {position}: task cannot be empty"
+                if "completed" in operation and not isinstance(operation["completed"], bool):
+                    return f"Operation {position}: completed must be true or false"
+        else:
+            return f"Operation {position}: op must be add, update, complete or delete"
+    return None
+
+def apply_todo_batch(operations):
+    """
+    Apply validated todo operations with one write per file.
+    
+    Operations run in order against one snapshot of todolist.json, so an
+    item can act on a todo added earlier in the same batch. The todo list
+    and a single analytics update commit together; an id that doesn't
+    exist yields a not_found result instead of failing the batch.
+    Un-completing a todo takes its completion back out of the analytics,
+    or out of this batch's count if the batch completed it.
     
-    # Update analytics
-    update_analytics("task_created")
+    Args:
+        operations (list): Operations accepted by validate_todo_batch
+        
+    Returns:
+        list: One result per operation, in order
+    """
+    results = []
+    counts = {"task_created": 0, "task_completed": 0}
+    completed_here = set()  # Ids completed by this batch, not yet recorded
+    with storage.transaction():
+        data = load_data(TODO_FILE)
+        index = _todo_index(data)
+        now = datetime.now().isoformat()
+        
+        for operation in operations:
+            op = operation["op"]
+            if op == "add":
+                todo_item = schema.make_todo(
+                    storage.allocate_todo_id(data, "todos", "next_id"),
+                    operation["task"].strip(),
+                    created_at=now
+                )
+                index.add(todo_item)
+                counts["task_created"] += 1
+                results.append({"op": op, "status": "created", "todo": todo_item})
+                continue
+            
+            todo_id = operation["id"]
+            if op == "delete":
+                todo_item = index.remove(todo_id)
+            else:
+                todo_item = index.get(todo_id)
+            if todo_item is None:
+                results.append({"op": op, "id": todo_id, "status": "not_found"})
+                continue
+            
+            if op == "update" and "task" in operation:
+                todo_item["task"] = operation["task"].strip()
+                index.reindex(todo_item)
+            completed = True if op == "complete" else operation.get("completed")
+            if completed and not todo_item["completed"]:
+                todo_item["completed"] = True
+                todo_item["completed_at"] = now
+                counts["task_completed"] += 1
+                completed_here.add(todo_id)
+            elif completed is False and todo_item["completed"]:
+                if todo_id in completed_here:
+                    counts["task_completed"] -= 1
+                    completed_here.discard(todo_id)
+                else:
+                    retract_completion(todo_item["completed_at"])
+                todo_item["completed"] = False
+                todo_item["completed_at"] = None
+            status = {"update": "updated", "complete": "completed", "delete": "deleted"}[op]
+            results.append({"op": op, "id": todo_id, "status": status, "todo": todo_item})
+        
+        if any(result["status"] != "not_found" for result in results):
+            _save_todos(data)
+        if any(counts.values()):
+            record_analytics(counts)
+    return results
 
 def get_todos():
     """Get all todos"""
     data = load_data(TODO_FILE)
-    return data.get("todos", [])
+    return _todo_index(data).todos
+
+def get_todo(todo_id):
+    """Get one todo by id, or None"""
+    return _todo_index(load_data(TODO_FILE)).get(todo_id)
+
+def search_todos(query, limit=TODO_SEARCH_LIMIT, prefix=True):
+    """
+    Full-text search over todo text via the incrementally maintained index.
+    
+    Args:
+        query (str): Terms that must all match (AND)
+        limit (int): Maximum number of results
+        prefix (bool): Let terms match as word prefixes
+        
+    Returns:
+        list: (todo, score) pairs, best first
+    """
+    return _todo_index(load_data(TODO_FILE)).find(query, limit, prefix)
 
 def get_todo_count():
     """Get todo count"""
     return len(get_todos())
 
+ANALYTICS_TOTALS = {
+    "task_created": "total_tasks_created",
+    "task_completed": "total_tasks_completed",
+    "conversation": "total_conversations"
+}
+
 def update_analytics(action):
     """Update analytics"""
+    record_analytics({action: 1})
+
+def record_analytics(counts):
+    """
+    Apply several analytics events in one storage.json update.
+    
+    Args:
+        counts (dict): Event name (task_created, task_completed or
+            conversation) -> number of events
+    """
     data = load_data(STORAGE_FILE)
-    analytics = data.get("analytics", {})
-    
-    if action == "task_created":
-        analytics["total_tasks_created"] = analytics.get("total_tasks_created", 0) + 1
-    elif action == "task_completed":
-        analytics["total_tasks_completed"] = analytics.get("total_tasks_completed", 0) + 1
-    elif action == "conversation":
-        analytics["total_conversations"] = analytics.get("total_conversations", 0) + 1
-    
-    # Calculate completion rate
-    created = analytics.get("total_tasks_created", 0)
-    completed = analytics.get("total_tasks_completed", 0)
-    analytics["completion_rate"] = (completed / created * 100) if created > 0 else 0
-    analytics["last_activity"] = datetime.now().isoformat()
+    analytics = data.setdefault("analytics", dict(schema.ANALYTICS_DEFAULTS))
+    analytics_rollups = data.setdefault("analytics_rollups", {})
+    
+    for action, count in counts.items():
+        total_key = ANALYTICS_TOTALS.get(action)
+        if total_key is None or count <= 0:
+            continue
+        analytics[total_key] += count
+        # Per-day/per-hour counters feed the productivity fields and timeseries
+        rollups.record_event(analytics_rollups, action, count=count)
+    
+    _refresh_analytics(analytics, analytics_rollups)
+    save_data(STORAGE_FILE, data)
+
+def retract_completion(completed_at):
+    """
+    Take one completion back out of the analytics, for a todo marked not done.
+    
+    Args:
+        completed_at (str): ISO timestamp the completion was recorded at,
+            whose day and hour buckets are decremented (None if unknown)
+    """
+    data = load_data(STORAGE_FILE)
+    analytics = data.setdefault("analytics", dict(schema.ANALYTICS_DEFAULTS))
+    analytics_rollups = data.setdefault("analytics_rollups", {})
     
-    data["analytics"] = analytics
+    analytics["total_tasks_completed"] = max(analytics["total_tasks_completed"] - 1, 0)
+    if completed_at:
+        try:
+            rollups.retract_event(analytics_rollups, "task_completed",
+                                  datetime.fromisoformat(completed_at))
+        except ValueError:
+            pass  # Unparseable legacy timestamp: only the total is corrected
+    
+    _refresh_analytics(analytics, analytics_rollups)
     save_data(STORAGE_FILE, data)
 
+def _refresh_analytics(analytics, analytics_rollups):
+    """Recompute the derived analytics fields after the counters changed"""
+    created = analytics["total_tasks_created"]
+    completed = analytics["total_tasks_completed"]
+    analytics["completion_rate"] = (completed / created * 100) if created > 0 else 0
+    analytics["last_activity"] = datetime.now().isoformat()
+    analytics.update(rollups.productivity_summary(analytics_rollups))
+
 def get_analytics():
     """Get analytics data"""
     data = load_data(STORAGE_FILE)
-    return data.get("analytics", {})
+    return data.get("analytics") or dict(schema.ANALYTICS_DEFAULTS)
 
 # Routes
 @app.route('/')
@@ -332,33 +720,17 @@ def chat():
         if not user_message:
             return jsonify({"error": "Message is required"}), 400
         
-        # Load chat history
-        storage_data = load_data(STORAGE_FILE)
-        chat_history = storage_data.get("conversation_history", [])
-        
-        # Add user message to history
-        chat_history.append({
+        user_entry = {
             "role": "user",
             "content": user_message,
             "timestamp": datetime.now().isoformat()
-        })
+        }
         
-        # Get AI response
+        # Get AI response (no storage lock held while the provider answers)
         ai_response = get_ai_response(user_message)
         
-        # Add AI response to history
-        chat_history.append({
-            "role": "assistant", 
-            "content": ai_response,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # Update storage
-        storage_data["conversation_history"] = chat_history
-        save_data(STORAGE_FILE, storage_data)
-        
-        # Update analytics
-        update_analytics("conversation")
+        # Append both messages to the history journal, update analytics
+        save_chat_turn(user_entry, ai_response)
         
         return jsonify({
             "response": ai_response,
@@ -373,6 +745,55 @@ def chat():
             "status": "error"
         }), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Stream a chat reply as Server-Sent Events.
+    
+    Sends a ``token`` event ({"text": ...}) for each piece of the reply as
+    the model generates it, then a ``done`` event ({"response": full
+    reply}) once the turn is saved. History and analytics are written
+    once, after the last token; a failed or abandoned stream saves
+    nothing. Failures after the response has started arrive as an
+    ``error`` event.
+    """
+    data = request.get_json(silent=True) or {}
+    user_message = str(data.get('message', '')).strip()
+    
+    if not user_message:
+        return jsonify({"error": "Message is required"}), 400
+    
+    user_entry = {
+        "role": "user",
+        "content": user_message,
+        "timestamp": datetime.now().isoformat()
+    }
+    
+    def generate():
+        pieces = []
+        try:
+            for text in stream_ai_response(user_message):
+                pieces.append(text)
+                yield sse_event("token", {"text": text})
+            ai_response = "".join(pieces)
+            
+            # The storage lock is only taken now, not while the model generates
+            save_chat_turn(user_entry, ai_response)
+            
+            yield sse_event("done", {"response": ai_response, "status": "success"})
+        except Exception as e:
+            print(f"❌ Chat stream error: {e}")
+            traceback.print_exc()
+            yield sse_event("error", {
+                "error": f"Failed to process message: {str(e)}",
+                "status": "error"
+            })
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # Don't let nginx buffer the stream
+    })
+
 @app.route('/prompt', methods=['POST'])
 def prompt_fallback():
     """Legacy endpoint fallback - redirects to /api/chat"""
@@ -383,33 +804,17 @@ def prompt_fallback():
         if not user_message:
             return jsonify({"error": "Prompt is required"}), 400
         
-        # Load chat history
-        storage_data = load_data(STORAGE_FILE)
-        chat_history = storage_data.get("conversation_history", [])
-        
-        # Add user message to history
-        chat_history.append({
+        user_entry = {
             "role": "user",
             "content": user_message,
             "timestamp": datetime.now().isoformat()
-        })
+        }
         
-        # Get AI response
+        # Get AI response (no storage lock held while the provider answers)
         ai_response = get_ai_response(user_message)
         
-        # Add AI response to history
-        chat_history.append({
-            "role": "assistant", 
-            "content": ai_response,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # Update storage
-        storage_data["conversation_history"] = chat_history
-        save_data(STORAGE_FILE, storage_data)
-        
-        # Update analytics
-        update_analytics("conversation")
+        # Append both messages to the history journal, update analytics
+        save_chat_turn(user_entry, ai_response)
         
         return jsonify({
             "response": ai_response,
@@ -426,37 +831,136 @@ def prompt_fallback():
 
 @app.route('/api/history')
 def get_history():
-    """Get chat history"""
+    """
+    Get chat history.
+    
+    Without query parameters the full history is returned. With ``limit``
+    (and optionally ``before`` or ``after`` cursors) only that page is read,
+    along with ``total``, ``next_cursor`` and ``has_more``.
+    """
     try:
-        data = load_data(STORAGE_FILE)
-        return jsonify({
-            "history": data.get("conversation_history", []),
-            "status": "success"
-        })
+        if not any(key in request.args for key in ('limit', 'before', 'after')):
+            return jsonify({
+                "history": history.read_all(),
+                "status": "success"
+            })
+        
+        try:
+            limit = min(int(request.args.get('limit', HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+            before = request.args.get('before')
+            before = int(before) if before is not None else None
+            after = request.args.get('after')
+            after = int(after) if after is not None else None
+            if limit < 1 or (before is not None and after is not None):
+                raise ValueError
+        except ValueError:
+            return jsonify({"error": "Invalid pagination parameters"}), 400
+        
+        page = history.page(limit, before=before, after=after)
+        return jsonify({**page, "status": "success"})
     except Exception as e:
         print(f"Error getting history: {e}")
         return jsonify({"error": "Failed to load history"}), 500
 
+@app.route('/api/history/search')
+def search_history():
+    """
+    Full-text search over past conversations.
+    
+    Query parameters: ``q`` (required; every term must match), ``limit``
+    (default 20, max 100), ``cursor`` (``next_cursor`` from the previous
+    page) and ``role`` (user|assistant). Hits carry the message position
+    usable with ``/api/history?before=``, a ``<mark>``-highlighted snippet
+    and a relevance score.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Query parameter q is required"}), 400
+    role = request.args.get('role')
+    if role not in (None, 'user', 'assistant'):
+        return jsonify({"error": "role must be user or assistant"}), 400
+    try:
+        limit = int(request.args.get('limit', HISTORY_SEARCH_LIMIT))
+        cursor = int(request.args.get('cursor', 0))
+        if not 1 <= limit <= HISTORY_SEARCH_MAX_LIMIT or cursor < 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+    
+    try:
+        results = history.search(query, limit, cursor=cursor, role=role)
+        return jsonify({**results, "query": query, "status": "success"})
+    except Exception as e:
+        print(f"Error searching history: {e}")
+        return jsonify({"error": "Failed to search history"}), 500
+
 @app.route('/api/stats')
 def get_stats():
     """Get statistics for the dashboard"""
     try:
         analytics = get_analytics()
         todos = get_todos()
-        active_todos = len([t for t in todos if not t.get('completed', False)])
+        active_todos = len([t for t in todos if not t['completed']])
         
         return jsonify({
-            "messageCount": analytics.get("total_conversations", 0),
+            "messageCount": analytics["total_conversations"],
             "sessionTime": "Active",
             "todoCount": active_todos,
-            "completedTasks": analytics.get("total_tasks_completed", 0),
-            "totalTasks": analytics.get("total_tasks_created", 0),
+            "completedTasks": analytics["total_tasks_completed"],
+            "totalTasks": analytics["total_tasks_created"],
             "status": "success"
         })
     except Exception as e:
         print(f"Error getting stats: {e}")
         return jsonify({"error": "Failed to load stats"}), 500
 
+@app.route('/api/analytics/timeseries')
+def get_analytics_timeseries():
+    """
+    Get task and conversation counts per day or hour.
+    
+    Query parameters: ``granularity`` (day|hour, default day), ``start`` and
+    ``end`` as ISO dates/datetimes (default: the last 7 days or 24 hours).
+    Values with a UTC offset are converted to server local time, which
+    the buckets are keyed in. Answered entirely from the rollup counters.
+    """
+    try:
+        granularity = request.args.get('granularity', 'day')
+        now = datetime.now()
+        default_span = timedelta(hours=23) if granularity == 'hour' else timedelta(days=6)
+        end = (rollups.to_local_time(datetime.fromisoformat(request.args['end']))
+               if 'end' in request.args else now)
+        start = (rollups.to_local_time(datetime.fromisoformat(request.args['start']))
+                 if 'start' in request.args else end - default_span)
+        result = rollups.timeseries(
+            load_data(STORAGE_FILE).get("analytics_rollups", {}), start, end, granularity
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        **result,
+        "status": "success"
+    })
+
+@app.route('/api/storage/stats')
+def get_storage_stats():
+    """Get storage engine counters (read cache and lock wait)"""
+    return jsonify({**storage.engine.stats(), "status": "success"})
+
+@app.route('/api/llm/stats')
+def get_llm_stats():
+    """Get OpenRouter client counters (connection reuse, per-call timing, response caches)"""
+    return jsonify({
+        **llm.stats(),
+        **response_cache.get_cache().stats(),
+        **semantic_cache.get_cache().stats(),
+        "status": "success"
+    })
+
 @app.route('/api/todos', methods=['GET'])
 def api_get_todos():
     """Get todos via API"""
@@ -480,21 +984,127 @@ def api_add_todo():
         if not task:
             return jsonify({"error": "Task is required"}), 400
         
-        add_todo_to_storage(task)
+        todo_item = add_todo_to_storage(task)
         return jsonify({
             "message": "Todo added successfully",
+            "todo": todo_item,
+            "status": "success"
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/todos/batch', methods=['POST'])
+def api_batch_todos():
+    """
+    Apply many todo operations in one request and one storage commit.
+    
+    Body: {"operations": [...]} (or a bare list) of add/update/complete/delete
+    operations. A malformed item rejects the whole batch with 400 before
+    anything is written; otherwise every item gets a result, in order.
+    """
+    try:
+        data = request.get_json(silent=True)
+        operations = data if isinstance(data, list) else (data or {}).get('operations')
+        error = validate_todo_batch(operations)
+        if error:
+            return jsonify({"error": error}), 400
+        
+        results = apply_todo_batch(operations)
+        return jsonify({
+            "results": results,
+            "applied": sum(1 for result in results if result["status"] != "not_found"),
+            "status": "success"
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/todos/search')
+def api_search_todos():
+    """
+    Search todos by text.
+    
+    Query parameters: q (required; every term must match), limit
+    (default 20, max 200) and prefix (default true; set to false for
+    whole-word matches only).
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Query parameter q is required"}), 400
+    try:
+        limit = int(request.args.get('limit', TODO_SEARCH_LIMIT))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if not 1 <= limit <= TODO_SEARCH_MAX_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {TODO_SEARCH_MAX_LIMIT}"}), 400
+    prefix = request.args.get('prefix', 'true').lower() not in ('0', 'false', 'no')
+    
+    try:
+        results = search_todos(query, limit, prefix)
+        return jsonify({
+            "results": [{**todo_item, "score": score} for todo_item, score in results],
+            "count": len(results),
+            "query": query,
             "status": "success"
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/todos/<int:todo_id>', methods=['GET'])
+def api_get_todo(todo_id):
+    """Get one todo by id"""
+    todo_item = get_todo(todo_id)
+    if todo_item is None:
+        return jsonify({"error": "Todo not found"}), 404
+    return jsonify({"todo": todo_item, "status": "success"})
+
+@app.route('/api/todos/<int:todo_id>', methods=['PATCH'])
+def api_update_todo(todo_id):
+    """Update a todo's task text and/or completion state by id"""
+    try:
+        data = request.get_json() or {}
+        task = data.get('task')
+        if task is not None:
+            task = str(task).strip()
+            if not task:
+                return jsonify({"error": "Task cannot be empty"}), 400
+        completed = data.get('completed')
+        if completed is not None and not isinstance(completed, bool):
+            return jsonify({"error": "completed must be true or false"}), 400
+        
+        todo_item = update_todo_in_storage(todo_id, task=task, completed=completed)
+        if todo_item is None:
+            return jsonify({"error": "Todo not found"}), 404
+        return jsonify({"todo": todo_item, "status": "success"})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/todos/<int:todo_id>/complete', methods=['POST'])
+def api_complete_todo(todo_id):
+    """Mark a todo as completed by id"""
+    try:
+        todo_item = update_todo_in_storage(todo_id, completed=True)
+        if todo_item is None:
+            return jsonify({"error": "Todo not found"}), 404
+        return jsonify({"todo": todo_item, "status": "success"})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/todos/<int:todo_id>', methods=['DELETE'])
+def api_delete_todo(todo_id):
+    """Delete a todo by id"""
+    try:
+        removed = remove_todo_from_storage(todo_id)
+        if removed is None:
+            return jsonify({"error": "Todo not found"}), 404
+        return jsonify({"todo": removed, "status": "success"})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/clear', methods=['POST'])
 def clear_history():
     """Clear chat history"""
     try:
-        data = load_data(STORAGE_FILE)
-        data["conversation_history"] = []
-        save_data(STORAGE_FILE, data)
+        history.clear()
         return jsonify({"status": "success", "message": "Chat history cleared"})
     except Exception as e:
         print(f"Error clearing history: {e}")
@@ -516,6 +1126,11 @@ def favicon():
     """Serve favicon"""
     return send_from_directory('static', 'favicon.ico')
 
+@app.before_request
+def ensure_started():
+    """Run start_app() under servers that only import app (gunicorn, Vercel)"""
+    start_app()
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -526,8 +1141,8 @@ def internal_error(error):
     return jsonify({"error": "Internal server error"}), 500
 
 if __name__ == '__main__':
-    # Initialize storage
-    init_storage()
+    # Initialize storage, import legacy history, warm the OpenRouter connection
+    start_app()
     
     print("🚀 Starting Rex AI Assistant - Full Featured Mobile App")
     print("=" * 60)
@@ -547,10 +1162,13 @@ if __name__ == '__main__':
     print("  • Desktop version: http://localhost:5000/desktop") 
     print()
     print("🔧 API Endpoints:")
-    print("  • Chat: POST /api/chat")
+    print("  • Chat: POST /api/chat, POST /api/chat/stream (Server-Sent Events)")
     print("  • Stats: GET /api/stats") 
-    print("  • Todos: GET/POST /api/todos")
-    print("  • History: GET /api/history")
+    print("  • Todos: GET/POST /api/todos, GET/PATCH/DELETE /api/todos/<id>, GET /api/todos/search, POST /api/todos/batch")
+    print("  • History: GET /api/history, GET /api/history/search")
+    print()
+    print("⚡ Production: gunicorn app.gateway:app -k uvicorn.workers.UvicornWorker")
+    print("  (async chat; slow AI replies don't block other requests)")
     
     try:
         port = int(os.environ.get('PORT', 5000))
@@ -3,10 +3,10 @@ import os
 from flask import Flask, render_template, request, jsonify, send_from_directory
 from pathlib import Path
 import traceback
-import requests
 from datetime import datetime
 import time
 from dotenv import load_dotenv
+from app import llm
 
 # Load environment variables
 load_dotenv()
@@ -64,35 +64,21 @@ def get_ai_response(user_input):
         # Try OpenRouter API first
         api_key = os.getenv("OPENROUTER_API_KEY")
         if api_key:
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "model": "deepseek/deepseek-chat",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are Rex, an intelligent AI assistant. You help users with conversations, tasks, creativity, coding, and productivity. Be helpful, friendly, and concise. You can also manage todos - when users mention adding tasks, help them organize their work."
-                    },
-                    {
-                        "role": "user", 
-                        "content": user_input
-                    }
-                ]
-            }
-            
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
+            messages = [
+                {
+                    "role": "system",
+                    "content": "You are Rex, an intelligent AI assistant. You help users with conversations, tasks, creativity, coding, and productivity. Be helpful, friendly, and concise. You can also manage todos - when users mention adding tasks, help them organize their work."
+                },
+                {
+                    "role": "user", 
+                    "content": user_input
+                }
+            ]
             
-            if response.status_code == 200:
-                result = response.json()
-                return result['choices'][0]['message']['content']
+            # Pooled keep-alive connection (app/llm.py)
+            content, _ = llm.chat_completion(messages, timeout=30)
+            if content is not None:
+                return content
         
         # Fallback to intelligent rule-based responses
         return get_intelligent_response(user_input)
@@ -494,6 +480,7 @@ def internal_error(error):
 if __name__ == '__main__':
     # Initialize storage
     init_storage()
+    llm.preconnect()  # Open the OpenRouter connection before the first turn
     
     print("🚀 Starting Rex AI Assistant - Full Featured Mobile App")
     print("=" * 60)
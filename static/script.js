@@ -881,8 +881,8 @@ class AiAssistant {
             // Close mobile sidebar if open
             this.closeSidebar();
 
-            // Send to backend
-            const response = await fetch('/api/chat', {
+            // Stream the reply as it is generated (Server-Sent Events)
+            const response = await fetch('/api/chat/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -894,16 +894,15 @@ class AiAssistant {
                 throw new Error(`HTTP ${response.status}: ${response.statusText}`);
             }
 
-            const data = await response.json();
+            const reply = await this.readChatStream(response);
             
             this.hideTypingIndicator();
             
-            if (data.response) {
-                this.addMessage(data.response, 'bot');
+            if (reply) {
                 this.updateStats();
                 
                 if (this.notificationsEnabled && !document.hasFocus()) {
-                    this.showNotification('New message received', data.response.substring(0, 100));
+                    this.showNotification('New message received', reply.substring(0, 100));
                 }
             } else {
                 throw new Error('No response received from AI');
@@ -920,6 +919,111 @@ class AiAssistant {
         }
     }
 
+    /**
+     * Render a /api/chat/stream reply token by token
+     * Resolves with the full reply once the server has saved the turn
+     */
+    async readChatStream(response) {
+        let buffer = '';
+        let reply = '';
+        let savedReply = null;
+        let messageElement = null;
+        let renderQueued = false;
+
+        let failed = false;
+
+        const render = () => {
+            renderQueued = false;
+            if (failed) return;  // The bubble was dropped after a stream error
+            messageElement.innerHTML = this.formatMessage(reply);
+            this.scrollToBottom();
+        };
+
+        const handleEvent = (block) => {
+            let event = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (!data) return;
+
+            const payload = JSON.parse(data);
+            if (event === 'token') {
+                if (!messageElement) {
+                    // First token: swap the typing indicator for the reply
+                    this.hideTypingIndicator();
+                    messageElement = this.addStreamingMessage();
+                }
+                reply += payload.text;
+                // Re-render at most once per frame, however fast tokens arrive
+                if (!renderQueued) {
+                    renderQueued = true;
+                    requestAnimationFrame(render);
+                }
+            } else if (event === 'done') {
+                savedReply = payload.response;
+            } else if (event === 'error') {
+                throw new Error(payload.error);
+            }
+        };
+
+        const consume = (chunk) => {
+            buffer += chunk;
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                handleEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+            }
+        };
+
+        try {
+            if (response.body) {
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    consume(decoder.decode(value, { stream: true }));
+                }
+            } else {
+                // No streamed fetch bodies in this browser: render the whole reply at once
+                consume(await response.text());
+            }
+
+            if (savedReply === null) {
+                throw new Error('Reply stream ended early');
+            }
+        } catch (error) {
+            // Drop the half-written reply; the caller shows the error message instead
+            failed = true;
+            if (messageElement) messageElement.remove();
+            throw error;
+        }
+        if (!messageElement) {
+            this.hideTypingIndicator();
+            messageElement = this.addStreamingMessage();
+        }
+        reply = savedReply;
+        render();
+
+        // Store in chat history
+        this.chatHistory.push({ text: reply, sender: 'bot', timestamp: Date.now() });
+        this.saveChatHistory();
+        return reply;
+    }
+
+    addStreamingMessage() {
+        const chatHistory = document.querySelector('.chat-history');
+        const messageElement = document.createElement('div');
+        messageElement.className = 'message bot-message';
+        if (chatHistory) {
+            chatHistory.appendChild(messageElement);
+            this.scrollToBottom();
+        }
+        return messageElement;
+    }
+
     addMessage(text, sender) {
         const chatHistory = document.querySelector('.chat-history');
         if (!chatHistory) return;
@@ -1,5 +1,5 @@
 // Service Worker for Rex AI Assistant PWA - Performance Optimized
-const CACHE_NAME = 'rex-ai-v2.0.0';
+const CACHE_NAME = 'rex-ai-v2.1.0';
 const urlsToCache = [
   '/',
   '/static/style.css',
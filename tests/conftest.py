@@ -0,0 +1,126 @@
+"""Shared fixtures: every test gets its own storage directory."""
+
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from app import storage  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A StorageEngine with its own lock file (sync durability, file backend)"""
+    return storage.StorageEngine(
+        backend=storage.FileBackend(), lock_file=tmp_path / ".storage.lock", durability="sync"
+    )
+
+
+@pytest.fixture
+def app_main(tmp_path, monkeypatch, engine):
+    """main.py with storage.json, todolist.json and history under tmp_path"""
+    import main
+    from app.history import HistoryJournal
+
+    storage_file = tmp_path / "storage.json"
+    monkeypatch.setattr(storage, "engine", engine)
+    monkeypatch.setattr(main, "STORAGE_FILE", storage_file)
+    monkeypatch.setattr(main, "TODO_FILE", tmp_path / "todolist.json")
+    monkeypatch.setattr(main, "history", HistoryJournal(storage_file))
+    monkeypatch.setattr(main, "_started", True)  # Skip start_app()'s preconnect
+    main.init_storage()
+    return main
+
+
+@pytest.fixture
+def client(app_main):
+    return app_main.app.test_client()
+
+
+@pytest.fixture
+def manager(app_main):
+    """The JSON StorageManager (agent tools) on the test's todolist.json"""
+    return storage.StorageManager(app_main.STORAGE_FILE, app_main.TODO_FILE, storage.engine)
+
+
+class FakeOpenRouterHandler(BaseHTTPRequestHandler):
+    """Answers like OpenRouter's /chat/completions, with keep-alive"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._send(200, b"")
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server.requests.append({"headers": dict(self.headers), "payload": payload})
+        if server.status != 200:
+            self._send(server.status, b'{"error": {"message": "rate limited"}}')
+            return
+        if not payload.get("stream"):
+            reply = {"choices": [{"message": {"content": "".join(server.chunks)}}]}
+            self._send(200, json.dumps(reply).encode())
+            return
+
+        events = [": OPENROUTER PROCESSING"] + [
+            "data: " + json.dumps({"choices": [{"delta": {"content": chunk}}]})
+            for chunk in server.chunks
+        ]
+        if server.stream_error:
+            events.append("data: " + json.dumps({"error": {"message": server.stream_error}}))
+        events.append("data: [DONE]")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for event in events:
+                body = (event + "\n\n").encode()
+                self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except ConnectionError:
+            pass  # The client stopped reading
+
+
+class FakeOpenRouter(ThreadingHTTPServer):
+    """A local stand-in for the OpenRouter API, served from a thread"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeOpenRouterHandler)
+        self.requests = []
+        self.status = 200
+        self.chunks = ["Hello", ", ", "world"]
+        self.stream_error = None  # Sent as an error event after the chunks
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_port}/api/v1"
+
+
+@pytest.fixture
+def openrouter():
+    server = FakeOpenRouter()
+    threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import analytics
+
+
+def test_record_event_fills_day_and_hour_buckets():
+    rollups = {}
+    when = datetime(2026, 10, 10, 14, 30)
+
+    analytics.record_event(rollups, "task_created", when=when, count=2)
+    analytics.record_event(rollups, "task_completed", when=when)
+
+    assert rollups["daily"]["2026-10-10"] == [2, 1, 0]
+    assert rollups["hourly"]["2026-10-10T14"] == [2, 1, 0]
+    assert rollups["best_day"] == "2026-10-10"
+
+
+def test_best_day_ties_go_to_the_earliest_day():
+    rollups = {}
+    first, second, third = (datetime(2026, 10, day, 9) for day in (10, 11, 12))
+    analytics.record_event(rollups, "task_completed", when=second)
+    analytics.record_event(rollups, "task_completed", when=first)  # Backdated, ties day 11
+    assert rollups["best_day"] == "2026-10-10"
+
+    analytics.record_event(rollups, "task_completed", when=third, count=2)
+    analytics.retract_event(rollups, "task_completed", third)  # Back to a three-way tie
+    assert rollups["best_day"] == "2026-10-10"
+
+    analytics.retract_event(rollups, "task_completed", first)
+    assert rollups["best_day"] == "2026-10-11"
+
+
+def test_timeseries_zero_fills_and_totals():
+    rollups = {}
+    analytics.record_event(rollups, "conversation", when=datetime(2026, 10, 2, 8))
+
+    result = analytics.timeseries(rollups, datetime(2026, 10, 1), datetime(2026, 10, 3))
+
+    assert [entry["bucket"] for entry in result["series"]] == [
+        "2026-10-01", "2026-10-02", "2026-10-03"
+    ]
+    assert result["totals"] == {"tasks_created": 0, "tasks_completed": 0, "conversations": 1}
+
+
+def test_timeseries_accepts_aware_datetimes():
+    rollups = {}
+    when = datetime(2026, 10, 10, 12)
+    analytics.record_event(rollups, "conversation", when=when)
+    aware = when.astimezone(timezone.utc)
+
+    result = analytics.timeseries(rollups, aware - timedelta(hours=1), aware, "hour")
+
+    assert result["totals"]["conversations"] == 1
+
+
+@pytest.mark.parametrize("granularity, start, end", [
+    ("week", datetime(2026, 10, 1), datetime(2026, 10, 2)),
+    ("day", datetime(2026, 10, 2), datetime(2026, 10, 1)),
+    ("hour", datetime(2026, 1, 1), datetime(2026, 10, 1)),
+])
+def test_timeseries_rejects_bad_ranges(granularity, start, end):
+    with pytest.raises(ValueError):
+        analytics.timeseries({}, start, end, granularity)
+
+
+@pytest.mark.parametrize("params", [
+    {"start": "2026-10-10T00:00:00+00:00"},
+    {"end": "2026-10-16T00:00:00+00:00"},
+    {"start": "2026-10-10T00:00:00+02:00", "end": "2026-10-16T00:00:00Z"},
+    {"start": "2026-10-10T00:00:00+00:00", "end": "2026-10-16T00:00:00"},
+])
+def test_timeseries_endpoint_accepts_utc_offsets(client, params):
+    response = client.get("/api/analytics/timeseries", query_string=params)
+
+    assert response.status_code == 200
+    assert response.json["status"] == "success"
+
+
+def test_timeseries_endpoint_counts_recorded_events(app_main, client):
+    app_main.update_analytics("task_created")
+    now = datetime.now().astimezone()
+
+    response = client.get("/api/analytics/timeseries", query_string={
+        "granularity": "hour",
+        "start": (now - timedelta(hours=1)).isoformat(),
+        "end": now.isoformat()
+    })
+
+    assert response.json["totals"]["tasks_created"] == 1
+
+
+@pytest.mark.parametrize("params", [
+    {"start": "yesterday"},
+    {"granularity": "minute"},
+    {"start": "2026-10-16", "end": "2026-10-10"},
+])
+def test_timeseries_endpoint_rejects_bad_input(client, params):
+    assert client.get("/api/analytics/timeseries", query_string=params).status_code == 400
@@ -0,0 +1,89 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks import bench_storage
+
+
+def result(median_ms, operation="load_data", group="main", size=1000, backend="file"):
+    return {"size": size, "backend": backend, "group": group, "operation": operation,
+            "median_ms": median_ms}
+
+
+def test_measure_reports_sorted_sample_statistics():
+    delays = iter([0.004, 0.001, 0.002])
+    calls = []
+
+    def fn(arg):
+        calls.append(arg)
+        deadline = bench_storage.time.perf_counter() + next(delays)
+        while bench_storage.time.perf_counter() < deadline:
+            pass
+
+    timing = bench_storage.measure(fn, 3, setup=lambda i: i * 10)
+
+    assert calls == [0, 10, 20]
+    assert timing["samples"] == 3
+    assert timing["min_ms"] <= timing["median_ms"] <= timing["p95_ms"] <= timing["max_ms"]
+    assert timing["min_ms"] >= 1
+    assert timing["max_ms"] >= 4
+
+
+def test_compare_flags_slowdowns_past_the_threshold():
+    baseline = {"results": [result(10.0), result(10.0, operation="save_data")]}
+    results = {"results": [result(13.0), result(12.0, operation="save_data")]}
+
+    regressions = bench_storage.compare(results, baseline, 1.25)
+
+    assert [(row["operation"], before, ratio) for row, before, ratio in regressions] == [
+        ("load_data", 10.0, 1.3)
+    ]
+
+
+def test_compare_ignores_noise_setup_rows_and_new_operations():
+    baseline = {"results": [result(0.1), result(100.0, group="setup", operation="seed")]}
+    results = {"results": [
+        result(0.1 + bench_storage.NOISE_FLOOR_MS / 2),
+        result(500.0, group="setup", operation="seed"),
+        result(50.0, operation="new_route")
+    ]}
+
+    assert bench_storage.compare(results, baseline, 1.25) == []
+
+
+def test_synthetic_todos_have_sequential_ids_and_fixed_shape():
+    todos = bench_storage.synthetic_todos(8)
+
+    assert [todo["id"] for todo in todos] == list(range(1, 9))
+    assert len({frozenset(todo) for todo in todos}) == 1
+    assert [todo["completed"] for todo in todos[:4]] == [True, False, False, False]
+    assert [todo["created_at"] for todo in todos] == sorted(todo["created_at"] for todo in todos)
+
+
+def test_write_history_writes_one_message_per_line(tmp_path):
+    path = tmp_path / "history.jsonl"
+
+    bench_storage.write_history(path, 5)
+
+    messages = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [m["role"] for m in messages] == ["user", "assistant"] * 2 + ["user"]
+
+
+@pytest.mark.parametrize("backend", ["file", "sqlite"])
+def test_worker_times_every_group_for_a_small_size(tmp_path, backend):
+    output = tmp_path / "rows.json"
+
+    subprocess.run(
+        [sys.executable, bench_storage.__file__, "--worker", backend, "20",
+         "--repeat", "1", "--worker-output", str(output)],
+        cwd=bench_storage.ROOT, check=True, stdout=subprocess.DEVNULL
+    )
+
+    rows = json.loads(output.read_text())
+    groups = {row["group"] for row in rows}
+    expected = {"SQLiteStorageManager"} if backend == "sqlite" else {
+        "main", "routes", "StorageManager"}
+    assert groups == expected | {"setup"}
+    assert all(row["size"] == 20 and row["backend"] == backend for row in rows)
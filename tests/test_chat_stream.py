@@ -0,0 +1,183 @@
+import json
+
+import pytest
+import requests
+
+from app import llm, response_cache, semantic_cache
+from app.response_cache import ResponseCache
+
+
+@pytest.fixture
+def llm_client(openrouter):
+    client = llm.LLMClient(api_key="test-key", base_url=openrouter.base_url, pool_size=2)
+    client.session.trust_env = False  # Never route the local server through a proxy
+    yield client
+    client.session.close()
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """A fake streaming provider for main.py; set .pieces and .error per test"""
+    class Upstream:
+        pieces = ["Hel", "lo ", "there"]
+        error = None  # Raised after the pieces, like a failure mid-stream
+        calls = 0
+
+    def stream_chat_completion(messages, timeout=30, **options):
+        Upstream.calls += 1
+        yield from Upstream.pieces
+        if Upstream.error:
+            raise Upstream.error
+
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setattr(llm, "stream_chat_completion", stream_chat_completion)
+    monkeypatch.setattr(response_cache, "_cache",
+                        ResponseCache(ttl=60, max_bytes=1 << 20, max_entries=100))
+    monkeypatch.setattr(semantic_cache, "_cache", semantic_cache.SemanticCache(threshold=0))
+    return Upstream
+
+
+def stream_messages(messages):
+    return [{"role": "user", "content": text} for text in messages]
+
+
+def sse_events(response):
+    """Parse an SSE body into (event, payload) pairs"""
+    events = []
+    for block in response.get_data(as_text=True).split("\n\n"):
+        if not block:
+            continue
+        event, data = "message", ""
+        for line in block.split("\n"):
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data += line[5:].strip()
+        events.append((event, json.loads(data)))
+    return events
+
+
+def post_stream(client, message):
+    return client.post("/api/chat/stream", json={"message": message})
+
+
+def test_stream_yields_deltas_and_skips_comments_and_done(llm_client, openrouter):
+    timing = {}
+
+    pieces = list(llm_client.stream_chat_completion(stream_messages(["hi"]), timing=timing))
+
+    assert pieces == ["Hello", ", ", "world"]
+    assert openrouter.requests[0]["payload"]["stream"] is True
+    assert timing["status"] == 200
+    assert 0 < timing["ttfb_ms"] <= timing["ttft_ms"] <= timing["total_ms"]
+    assert "cancelled" not in timing
+    assert llm_client.stats()["llm_errors"] == 0
+
+
+def test_streamed_connection_is_pooled_again(llm_client):
+    timings = [{}, {}]
+    for timing in timings:
+        list(llm_client.stream_chat_completion(stream_messages(["hi"]), timing=timing))
+
+    assert [timing["reused"] for timing in timings] == [False, True]
+
+
+def test_error_mid_stream_raises_after_the_earlier_pieces(llm_client, openrouter):
+    openrouter.stream_error = "upstream overloaded"
+    pieces = []
+
+    with pytest.raises(llm.LLMError, match="upstream overloaded"):
+        for text in llm_client.stream_chat_completion(stream_messages(["hi"])):
+            pieces.append(text)
+
+    assert pieces == ["Hello", ", ", "world"]
+    assert llm_client.stats()["llm_errors"] == 1
+
+
+def test_non_200_stream_raises_http_error(llm_client, openrouter):
+    openrouter.status = 503
+    timing = {}
+
+    with pytest.raises(requests.HTTPError):
+        list(llm_client.stream_chat_completion(stream_messages(["hi"]), timing=timing))
+
+    assert timing["status"] == 503
+    assert llm_client.stats()["llm_errors"] == 1
+
+
+def test_closing_the_stream_early_marks_it_cancelled(llm_client):
+    timing = {}
+    stream = llm_client.stream_chat_completion(stream_messages(["hi"]), timing=timing)
+
+    assert next(stream) == "Hello"
+    stream.close()  # The browser went away
+
+    assert timing["cancelled"] is True
+    assert "total_ms" in timing
+    assert llm_client.stats()["llm_errors"] == 0
+
+
+def test_chat_stream_sends_tokens_then_saves_the_turn(app_main, client, upstream):
+    response = post_stream(client, "hello")
+
+    assert response.mimetype == "text/event-stream"
+    assert sse_events(response) == [
+        ("token", {"text": "Hel"}), ("token", {"text": "lo "}), ("token", {"text": "there"}),
+        ("done", {"response": "Hello there", "status": "success"})
+    ]
+    history = app_main.history.read_all()
+    assert [(m["role"], m["content"]) for m in history] == [
+        ("user", "hello"), ("assistant", "Hello there")
+    ]
+    assert app_main.get_analytics()["total_conversations"] == 1
+
+
+def test_chat_stream_replays_a_cached_reply_as_one_token(client, upstream):
+    sse_events(post_stream(client, "hello"))  # Read to the end, so the reply is cached
+
+    events = sse_events(post_stream(client, "hello"))
+
+    assert events[0] == ("token", {"text": "Hello there"})
+    assert events[-1][0] == "done"
+    assert upstream.calls == 1
+
+
+def test_error_mid_stream_sends_an_error_event_and_saves_nothing(app_main, client, upstream):
+    upstream.error = llm.LLMError("upstream overloaded")
+
+    events = sse_events(post_stream(client, "hello"))
+
+    assert [event for event, _ in events] == ["token", "token", "token", "error"]
+    assert events[-1][1] == {"error": "Failed to process message: upstream overloaded",
+                             "status": "error"}
+    assert app_main.history.read_all() == []
+    assert app_main.get_analytics()["total_conversations"] == 0
+
+
+def test_failure_before_any_text_falls_back_to_the_rule_based_reply(app_main, client,
+                                                                    upstream):
+    upstream.pieces = []
+    upstream.error = requests.ConnectionError("offline")
+
+    events = sse_events(post_stream(client, "hello"))
+
+    fallback = app_main.get_intelligent_response("hello")
+    assert events == [("token", {"text": fallback}),
+                      ("done", {"response": fallback, "status": "success"})]
+    assert len(app_main.history.read_all()) == 2
+
+
+def test_without_an_api_key_the_fallback_is_one_token(app_main, client, upstream, monkeypatch):
+    monkeypatch.delenv("OPENROUTER_API_KEY")
+
+    events = sse_events(post_stream(client, "hello"))
+
+    assert [event for event, _ in events] == ["token", "done"]
+    assert upstream.calls == 0
+
+
+def test_empty_message_is_rejected_before_streaming(client):
+    response = client.post("/api/chat/stream", json={"message": "   "})
+
+    assert response.status_code == 400
+    assert response.json["error"] == "Message is required"
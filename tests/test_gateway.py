@@ -0,0 +1,209 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import gateway, llm, response_cache, semantic_cache
+from app.response_cache import ResponseCache
+
+
+@pytest.fixture
+def asgi(app_main, monkeypatch):
+    """A Gateway over main.app, with fresh caches and one provider slot"""
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+    monkeypatch.setattr(response_cache, "_cache",
+                        ResponseCache(ttl=60, max_bytes=1 << 20, max_entries=100))
+    monkeypatch.setattr(semantic_cache, "_cache", semantic_cache.SemanticCache(threshold=0))
+    app = gateway.Gateway(app_main.app, max_concurrency=1, queue_timeout=0.05, wsgi_threads=2)
+    yield app
+    app.executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def provider(asgi, openrouter, monkeypatch):
+    """Point the gateway's async client at the local fake OpenRouter"""
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    original = llm.AsyncLLMClient.__init__
+
+    def init(self, api_key=None, base_url=openrouter.base_url, **options):
+        original(self, api_key or "test-key", base_url, **options)
+
+    monkeypatch.setattr(llm.AsyncLLMClient, "__init__", init)
+    return openrouter
+
+
+def run(asgi, scenario):
+    """Run scenario(http) on a fresh event loop, with an httpx client on the gateway"""
+    async def main():
+        transport = httpx.ASGITransport(app=asgi)
+        async with httpx.AsyncClient(transport=transport, base_url="http://rex") as http:
+            try:
+                return await scenario(http)
+            finally:
+                if asgi.client is not None:
+                    await asgi.client.aclose()
+    return asyncio.run(main())
+
+
+def sse_events(body):
+    """Parse an SSE body into (event, payload) pairs"""
+    events = []
+    for block in body.split("\n\n"):
+        if block:
+            lines = dict(line.split(": ", 1) for line in block.split("\n"))
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_other_routes_pass_through_to_flask(asgi):
+    async def scenario(http):
+        created = await http.post("/api/todos", json={"task": "Via the gateway"})
+        listed = await http.get("/api/todos", params={"unused": "1"})
+        missing = await http.get("/api/todos/999/nope")
+        return created, listed, missing
+
+    created, listed, missing = run(asgi, scenario)
+
+    assert created.json()["todo"]["task"] == "Via the gateway"
+    assert created.headers["content-type"] == "application/json"
+    assert [todo["task"] for todo in listed.json()["todos"]] == ["Via the gateway"]
+    assert missing.status_code == 404
+
+
+def test_chat_answers_from_the_provider_and_saves_the_turn(asgi, provider, app_main):
+    async def scenario(http):
+        first = await http.post("/api/chat", json={"message": "tell me a joke"})
+        repeat = await http.post("/prompt", json={"prompt": "Tell me a joke!"})
+        return first, repeat
+
+    first, repeat = run(asgi, scenario)
+
+    assert first.json() == {"response": "Hello, world", "status": "success"}
+    assert repeat.json()["response"] == "Hello, world"
+    assert len(provider.requests) == 1  # The repeat came from the cache
+    assert [m["content"] for m in app_main.history.read_all()] == [
+        "tell me a joke", "Hello, world", "Tell me a joke!", "Hello, world"
+    ]
+    assert asgi.in_flight == 0
+
+
+def test_chat_without_an_api_key_uses_the_rule_based_reply(asgi, app_main):
+    response = run(asgi, lambda http: http.post("/api/chat", json={"message": "hello"}))
+
+    assert response.json()["response"] == app_main.get_intelligent_response("hello")
+    assert asgi.client is None or asgi.client.stats()["llm_calls"] == 0
+
+
+def test_chat_requires_a_message(asgi):
+    response = run(asgi, lambda http: http.post("/api/chat", json={"message": "  "}))
+
+    assert response.status_code == 400
+    assert response.json() == {"error": "Message is required"}
+
+
+def test_oversize_chat_body_gets_413(asgi, app_main, monkeypatch):
+    monkeypatch.setattr(gateway, "MAX_CHAT_BODY_BYTES", 64)
+
+    response = run(asgi, lambda http: http.post("/api/chat", json={"message": "x" * 100}))
+
+    assert response.status_code == 413
+    assert response.json() == {"error": "Request body too large"}
+    assert app_main.history.read_all() == []
+
+
+def test_chat_gets_503_when_every_provider_slot_is_busy(asgi, provider, app_main):
+    async def scenario(http):
+        await asgi._provider_slot()  # Another chat holds the only slot
+        try:
+            busy = await http.post("/api/chat", json={"message": "hello"})
+            stream = await http.post("/api/chat/stream", json={"message": "hello"})
+        finally:
+            asgi._release_slot()
+        stats = await http.get("/api/gateway/stats")
+        return busy, stream, stats
+
+    busy, stream, stats = run(asgi, scenario)
+
+    assert busy.status_code == 503
+    assert busy.json()["status"] == "error"
+    assert [event for event, _ in sse_events(stream.text)] == ["error"]
+    assert stats.json()["rejected"] == 2
+    assert stats.json()["in_flight"] == 0
+    assert app_main.history.read_all() == []
+    assert provider.requests == []
+
+
+def test_stream_sends_tokens_then_saves_the_turn(asgi, provider, app_main):
+    response = run(asgi, lambda http: http.post("/api/chat/stream", json={"message": "hi"}))
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert sse_events(response.text) == [
+        ("token", {"text": "Hello"}), ("token", {"text": ", "}), ("token", {"text": "world"}),
+        ("done", {"response": "Hello, world", "status": "success"})
+    ]
+    assert [m["content"] for m in app_main.history.read_all()] == ["hi", "Hello, world"]
+
+
+def test_stream_error_mid_reply_sends_an_error_event(asgi, provider, app_main):
+    provider.stream_error = "upstream overloaded"
+
+    response = run(asgi, lambda http: http.post("/api/chat/stream", json={"message": "hi"}))
+
+    events = sse_events(response.text)
+    assert [event for event, _ in events] == ["token", "token", "token", "error"]
+    assert "upstream overloaded" in events[-1][1]["error"]
+    assert app_main.history.read_all() == []
+
+
+@pytest.mark.parametrize("last_token", ["Hello", "world"])
+def test_client_leaving_mid_stream_saves_nothing(asgi, provider, app_main, last_token):
+    async def scenario():
+        inbox = asyncio.Queue()
+        inbox.put_nowait({"type": "http.request", "body": b'{"message": "hi"}'})
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+            if f'"text": "{last_token}"'.encode() in message.get("body", b""):
+                inbox.put_nowait({"type": "http.disconnect"})  # Tab closed
+                await asyncio.sleep(0)
+
+        scope = {"type": "http", "method": "POST", "path": "/api/chat/stream",
+                 "headers": [(b"content-type", b"application/json")]}
+        try:
+            await asgi(scope, inbox.get, send)
+        finally:
+            await asgi.client.aclose()
+        return sent
+
+    sent = asyncio.run(scenario())
+
+    bodies = b"".join(message.get("body", b"") for message in sent)
+    assert b"event: done" not in bodies
+    assert app_main.history.read_all() == []
+    assert asgi.in_flight == 0
+
+
+def test_reply_finished_after_the_client_left_is_not_saved(asgi, app_main, monkeypatch):
+    async def stream_ai_response(user_message):
+        yield "The whole reply"
+
+    monkeypatch.setattr(asgi, "stream_ai_response", stream_ai_response)
+
+    async def scenario():
+        disconnected = asyncio.Event()
+        disconnected.set()  # Seen before the relay was cancelled
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        user_entry = {"role": "user", "content": "hi", "timestamp": "2026-10-18T09:00:00"}
+        await asgi._relay_stream(send, user_entry, disconnected)
+        return sent
+
+    sent = asyncio.run(scenario())
+
+    assert len(sent) == 1
+    assert app_main.history.read_all() == []
@@ -0,0 +1,85 @@
+import pytest
+
+from app.history import HistoryJournal
+
+
+def message(i, day="2026-10-01"):
+    return {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}",
+            "timestamp": f"{day}T09:00:{i % 60:02d}"}
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return HistoryJournal(tmp_path / "storage.json", compact_threshold=10_000,
+                          hot_max_messages=0, hot_max_age_days=0)
+
+
+def contents(page):
+    return [m["content"] for m in page["history"]]
+
+
+def test_page_walks_backwards_from_the_newest_messages(journal):
+    journal.append(*(message(i) for i in range(5)))
+    journal.compact()  # Positions span the snapshot and the journal
+    journal.append(*(message(i) for i in range(5, 10)))
+
+    first = journal.page(4)
+    second = journal.page(4, before=first["next_cursor"])
+    last = journal.page(4, before=second["next_cursor"])
+
+    assert contents(first) == [f"message {i}" for i in range(6, 10)]
+    assert contents(second) == [f"message {i}" for i in range(2, 6)]
+    assert contents(last) == ["message 0", "message 1"]
+    assert (first["total"], first["has_more"], last["has_more"]) == (10, True, False)
+
+
+def test_page_walks_forwards_after_a_cursor(journal):
+    journal.append(*(message(i) for i in range(6)))
+    journal.compact()
+
+    page = journal.page(3, after=1)
+
+    assert contents(page) == ["message 2", "message 3", "message 4"]
+    assert page["next_cursor"] == 4
+    assert contents(journal.page(3, after=page["next_cursor"])) == ["message 5"]
+
+
+def test_offset_index_follows_snapshot_growth_and_other_workers(journal, tmp_path):
+    journal.append(*(message(i) for i in range(3)))
+    journal.compact()
+    assert journal.count() == 3
+
+    other_worker = HistoryJournal(tmp_path / "storage.json", compact_threshold=10_000,
+                                  hot_max_messages=0, hot_max_age_days=0)
+    other_worker.append(message(3))
+    other_worker.compact()
+
+    assert journal.count() == 4
+    assert contents(journal.page(2)) == ["message 2", "message 3"]
+
+
+def test_archived_messages_keep_their_positions(journal):
+    journal.append(*(message(i, day="2026-09-01") for i in range(4)))
+    journal.append(*(message(i, day="2026-10-01") for i in range(4, 8)))
+
+    assert journal.archive(max_messages=2) == 6
+
+    assert journal.count() == 8
+    assert [m["content"] for m in journal.read_all()] == [f"message {i}" for i in range(8)]
+    assert contents(journal.page(3, before=5)) == ["message 2", "message 3", "message 4"]
+
+
+def test_segments_rearchived_by_another_worker_are_not_served_stale(journal, tmp_path):
+    journal.append(*(message(i) for i in range(4)))
+    journal.archive(max_messages=1)
+    assert contents(journal.page(2, before=2)) == ["message 0", "message 1"]
+
+    # Another worker clears history and archives new messages, reusing
+    # the same segment file name
+    other_worker = HistoryJournal(tmp_path / "storage.json", compact_threshold=10_000,
+                                  hot_max_messages=0, hot_max_age_days=0)
+    other_worker.clear()
+    other_worker.append(*({**message(i), "content": f"new {i}"} for i in range(4)))
+    other_worker.archive(max_messages=1)
+
+    assert contents(journal.page(2, before=2)) == ["new 0", "new 1"]
@@ -0,0 +1,85 @@
+import pytest
+
+from app.history import HistoryJournal
+from app.history_search import build_match_query
+
+
+def message(content, role="user", day="2026-10-01"):
+    return {"role": role, "content": content, "timestamp": f"{day}T09:00:00"}
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return HistoryJournal(tmp_path / "storage.json", compact_threshold=10_000,
+                          hot_max_messages=0, hot_max_age_days=0)
+
+
+def positions(results):
+    return [hit["position"] for hit in results["hits"]]
+
+
+def test_build_match_query_ands_terms_and_prefixes_longer_ones():
+    assert build_match_query("Milk, milk a BREAD") == '"milk"* "a" "bread"*'
+    assert build_match_query("  ?! ") is None
+
+
+def test_appends_leave_indexing_to_the_next_search(journal):
+    journal.append(message("plan the garden"), message("buy seeds", role="assistant"))
+
+    assert journal.search_index.indexed_count() == 0
+    assert positions(journal.search("garden", 10)) == [0]
+    assert journal.search_index.indexed_count() == 2
+
+
+def test_sync_indexes_only_new_messages(journal):
+    journal.append(message("first note"))
+    assert journal.search_index.sync(journal) == 1
+    assert journal.search_index.sync(journal) == 0
+
+    journal.append(message("second note"), message("third note"))
+
+    assert journal.search_index.sync(journal) == 2
+    assert positions(journal.search("note", 10)) == [2, 1, 0]
+
+
+def test_search_filters_by_role_pages_and_marks_snippets(journal):
+    journal.append(*(message(f"report <draft> {i}") for i in range(3)))
+    journal.append(message("report reviewed", role="assistant"))
+
+    first = journal.search("report", 2, role="user")
+    assert first["total"] == 3 and first["has_more"] and first["next_cursor"] == 2
+    assert "<mark>report</mark> &lt;draft&gt;" in first["hits"][0]["snippet"]
+    last = journal.search("report", 2, cursor=first["next_cursor"], role="user")
+    assert len(last["hits"]) == 1 and last["next_cursor"] is None
+    assert positions(journal.search("reviewed", 10)) == [3]
+
+
+def test_search_finds_archived_messages_at_their_positions(journal):
+    journal.append(*(message(f"september item {i}", day="2026-09-01") for i in range(4)))
+    journal.append(*(message(f"october item {i}") for i in range(4)))
+
+    journal.archive(max_messages=2)
+
+    assert positions(journal.search("september", 10)) == [3, 2, 1, 0]
+    assert positions(journal.search("october 1", 10)) == [5]
+
+
+def test_background_compaction_catches_the_index_up(tmp_path):
+    journal = HistoryJournal(tmp_path / "storage.json", compact_threshold=2,
+                             hot_max_messages=0, hot_max_age_days=0)
+    journal.append(message("one"), message("two"), message("three"))
+
+    journal._compact_in_background()  # What the compaction thread runs
+
+    assert journal.search_index.indexed_count() == 3
+
+
+def test_clear_empties_the_index(journal):
+    journal.append(message("forget me"))
+    journal.search("forget", 10)
+
+    journal.clear()
+    journal.append(message("fresh start"))
+
+    assert journal.search("forget", 10)["total"] == 0
+    assert positions(journal.search("fresh", 10)) == [0]
@@ -0,0 +1,84 @@
+import socket
+
+import pytest
+import requests
+
+from app import llm
+
+
+@pytest.fixture
+def client(openrouter):
+    client = llm.LLMClient(api_key="test-key", base_url=openrouter.base_url, pool_size=2)
+    client.session.trust_env = False  # Never route the local server through a proxy
+    yield client
+    client.session.close()
+
+
+def test_completion_returns_the_reply_and_its_timing(client, openrouter):
+    content, timing = client.chat_completion([{"role": "user", "content": "hi"}],
+                                             model="test/model", temperature=0)
+
+    assert content == "Hello, world"
+    assert timing["status"] == 200
+    assert timing["reused"] is False and timing["connect_ms"] > 0
+    assert 0 < timing["ttfb_ms"] <= timing["total_ms"]
+    request = openrouter.requests[0]
+    assert request["headers"]["Authorization"] == "Bearer test-key"
+    assert request["payload"] == {"model": "test/model", "temperature": 0,
+                                  "messages": [{"role": "user", "content": "hi"}]}
+
+
+def test_later_calls_reuse_the_pooled_connection(client):
+    timings = [client.chat_completion([{"role": "user", "content": "hi"}])[1] for _ in range(3)]
+
+    assert [timing["reused"] for timing in timings] == [False, True, True]
+    assert [timing["connect_ms"] for timing in timings][1:] == [0, 0]
+    stats = client.stats()
+    assert stats["llm_calls"] == 3
+    assert stats["llm_new_connections"] == 1
+    assert stats["llm_reuse_rate"] == pytest.approx(66.7)
+    assert stats["llm_last_call"] == timings[-1]
+
+
+def test_preconnect_warms_the_pool_for_the_first_call(client):
+    assert client.preconnect() > 0
+
+    _, timing = client.chat_completion([{"role": "user", "content": "hi"}])
+
+    assert timing["reused"] is True
+    assert client.stats()["llm_new_connections"] == 1
+
+
+def test_non_200_reply_returns_none_and_counts_an_error(client, openrouter):
+    openrouter.status = 429
+
+    content, timing = client.chat_completion([{"role": "user", "content": "hi"}])
+
+    assert content is None
+    assert timing["status"] == 429
+    assert client.stats()["llm_errors"] == 1
+
+
+def test_network_errors_raise_and_count(openrouter):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        closed_port = probe.getsockname()[1]
+    client = llm.LLMClient(api_key="k", base_url=f"http://127.0.0.1:{closed_port}/api/v1")
+    client.session.trust_env = False
+
+    with pytest.raises(requests.ConnectionError):
+        client.chat_completion([{"role": "user", "content": "hi"}], timeout=2)
+
+    assert client.stats()["llm_errors"] == 1
+    assert client.stats()["llm_calls"] == 1
+
+
+def test_shared_client_is_rebuilt_in_a_forked_worker(monkeypatch):
+    monkeypatch.setattr(llm, "_client", None)
+    monkeypatch.setattr(llm, "_client_pid", None)
+    parent = llm.get_client()
+    assert llm.get_client() is parent
+
+    monkeypatch.setattr(llm.os, "getpid", lambda: -1)  # As seen from a forked child
+
+    assert llm.get_client() is not parent
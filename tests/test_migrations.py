@@ -0,0 +1,130 @@
+import gzip
+import json
+import threading
+
+import pytest
+
+from app import schema, storage
+from app.history import HistoryJournal
+
+
+def v0_message(i, day="2026-09-01"):
+    """A message as older versions wrote it: unordered keys, no role"""
+    return {"timestamp": f"{day}T09:00:{i:02d}", "content": f"message {i}"}
+
+
+def test_migrations_register_once_per_version():
+    with pytest.raises(ValueError):
+        schema.migration(0)(lambda document: document)
+
+
+def test_upgrade_document_runs_migrations_from_version_0():
+    document = schema.upgrade_document({
+        "todos": ["Bare string todo", {"id": 1, "task": "Dup", "priority": "urgent"},
+                  {"id": 1, "task": "Dup again", "completed": True}],
+        "todo_stats": {"total": 99},
+        "conversation_history": [v0_message(0)],
+        "analytics": {"total_conversations": 4}
+    })
+
+    assert document[schema.SCHEMA_KEY] == schema.SCHEMA_VERSION
+    assert [list(todo)[:len(schema.TODO_FIELDS)] for todo in document["todos"]] == (
+        [list(schema.TODO_FIELDS)] * 3
+    )
+    assert sorted(todo["id"] for todo in document["todos"]) == [1, 2, 3]
+    assert document["next_id"] == 4
+    assert document["todos"][1]["priority"] == "medium"
+    assert "todo_stats" not in document
+    assert document["conversation_history"][0]["role"] == "user"
+    assert document["analytics"]["total_conversations"] == 4
+    assert document["analytics"]["total_tasks_created"] == 0
+    assert document["user_name"] is None
+
+
+def test_upgrade_document_leaves_newer_and_empty_documents_alone():
+    newer = {schema.SCHEMA_KEY: schema.SCHEMA_VERSION + 1, "todos": ["unknown shape"]}
+
+    assert schema.upgrade_document(dict(newer)) == newer
+    assert schema.upgrade_document({}) == {}
+
+
+def test_upgrade_jsonl_streams_and_drops_a_torn_tail(tmp_path):
+    path = tmp_path / "history.jsonl"
+    path.write_bytes(b"".join(json.dumps(v0_message(i)).encode() + b"\n" for i in range(3))
+                     + b'{"content": "torn')
+
+    assert schema.upgrade_jsonl(path) == (3, 3)
+
+    lines = path.read_text().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"role": "user", "content": f"message {i}", "timestamp": f"2026-09-01T09:00:{i:02d}"}
+        for i in range(3)
+    ]
+
+
+def test_upgrade_jsonl_leaves_current_files_in_place(tmp_path):
+    path = tmp_path / "history.jsonl"
+    path.write_text(json.dumps(schema.normalize_message(v0_message(0))) + "\n")
+    inode = path.stat().st_ino
+
+    assert schema.upgrade_jsonl(path) == (1, 0)
+    assert path.stat().st_ino == inode
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+@pytest.mark.parametrize("format_name", ["json", "json-compact"])
+def test_migrate_file_upgrades_documents_in_their_format(tmp_path, format_name):
+    path = tmp_path / "todolist.json"
+    serializer = storage.get_serializer(format_name)
+    path.write_bytes(storage.encode_document({"todos": ["Old todo"]}, serializer))
+
+    assert storage.migrate_file(path) == f"schema version 0 -> {schema.SCHEMA_VERSION}"
+    assert storage.migrate_file(path) == f"already at schema version {schema.SCHEMA_VERSION}"
+
+    raw = path.read_bytes()
+    assert storage.detect_format(raw) == format_name
+    assert storage.decode_document(raw)["todos"][0]["task"] == "Old todo"
+
+
+def write_v0_history(tmp_path):
+    """Snapshot, journal and one archived segment, all in the v0 shape"""
+    journal = HistoryJournal(tmp_path / "storage.json", compact_threshold=10_000,
+                             hot_max_messages=0, hot_max_age_days=0)
+    journal.append(*(v0_message(i) for i in range(4)))
+    journal.archive(max_messages=2)  # Messages 0-1 go to a gzip segment
+    journal.append(v0_message(4, day="2026-10-01"))  # Stays in the journal
+    return journal
+
+
+def test_migrate_file_upgrades_the_whole_history(tmp_path):
+    journal = write_v0_history(tmp_path)
+    assert journal.read_all()[0].get("role") is None  # Caches the old segment
+
+    result = storage.migrate_file(journal.snapshot_file)
+
+    assert result == "5 of 5 records upgraded"
+    messages = journal.read_all()
+    assert [message["content"] for message in messages] == [f"message {i}" for i in range(5)]
+    assert all(list(message) == list(schema.MESSAGE_FIELDS) for message in messages)
+    segment = journal.archive_dir / journal._load_manifest()["segments"][0]["file"]
+    archived = [json.loads(line) for line in gzip.decompress(segment.read_bytes()).splitlines()]
+    assert [message["role"] for message in archived] == ["user", "user"]
+    assert storage.migrate_file(journal.journal_file) == "0 of 5 records upgraded"
+
+
+def test_history_upgrade_waits_for_the_history_lock(tmp_path):
+    journal = write_v0_history(tmp_path)
+    before = journal.snapshot_file.read_bytes()
+    results = []
+    upgrade = threading.Thread(
+        target=lambda: results.append(storage.migrate_file(journal.snapshot_file))
+    )
+
+    with journal._lock:  # Stands in for another worker mid-append or compaction
+        upgrade.start()
+        upgrade.join(timeout=0.2)
+        assert upgrade.is_alive()
+        assert journal.snapshot_file.read_bytes() == before
+
+    upgrade.join()
+    assert results == ["5 of 5 records upgraded"]
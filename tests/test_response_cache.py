@@ -0,0 +1,118 @@
+import pytest
+
+from app import llm, response_cache, semantic_cache, storage
+from app.response_cache import ENTRY_OVERHEAD_BYTES, ResponseCache, make_key
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    """Fresh process-wide caches (semantic matching off) for main.py"""
+    exact = ResponseCache(ttl=60, max_bytes=1 << 20, max_entries=100)
+    monkeypatch.setattr(response_cache, "_cache", exact)
+    monkeypatch.setattr(semantic_cache, "_cache", semantic_cache.SemanticCache(threshold=0))
+    return exact
+
+
+@pytest.fixture
+def provider(monkeypatch, engine):
+    """A fake OpenRouter that records whether the storage lock was held"""
+    calls = []
+
+    def chat_completion(messages, timeout=30, **options):
+        calls.append({"prompt": messages[-1]["content"],
+                      "in_transaction": storage.engine.current_unit_of_work() is not None})
+        return f"reply {len(calls)}", {}
+
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setattr(llm, "chat_completion", chat_completion)
+    return calls
+
+
+def test_make_key_folds_case_whitespace_and_trailing_punctuation():
+    assert make_key("Hi  there!", "m", "s") == make_key("hi there", "m", "s")
+    assert make_key("hi there", "m", "s") != make_key("hi where", "m", "s")
+
+
+def test_make_key_depends_on_model_system_prompt_and_state():
+    key = make_key("hi", "model-a", "system")
+
+    assert make_key("hi", "model-b", "system") != key
+    assert make_key("hi", "model-a", "other system") != key
+    assert make_key("hi", "model-a", "system", state=[1, 2]) != key
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = ResponseCache(ttl=60, max_bytes=1 << 20, max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    cache.get("a")
+
+    cache.put("c", "C")
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+    assert cache.evictions == 1
+
+
+def test_byte_budget_evicts_and_skips_oversized_replies():
+    cache = ResponseCache(ttl=60, max_bytes=2 * (ENTRY_OVERHEAD_BYTES + 10), max_entries=100)
+    cache.put("a", "x" * 10)
+    cache.put("b", "x" * 10)
+    cache.put("c", "x" * 10)
+    cache.put("huge", "x" * 1000)
+
+    assert cache.get("a") is None
+    assert cache.get("huge") is None
+    assert cache.bytes == 2 * (ENTRY_OVERHEAD_BYTES + 10)
+
+
+def test_expired_entries_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(ttl=60, max_bytes=1 << 20, max_entries=100)
+    cache.put("a", "A")
+
+    now[0] += 61
+
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["response_cache_expired"], stats["response_cache_entries"]) == (1, 0)
+
+
+def test_disabled_cache_never_stores(monkeypatch):
+    cache = ResponseCache(ttl=0, max_bytes=1 << 20, max_entries=100)
+    cache.put("a", "A")
+
+    assert cache.get("a") is None
+    assert cache.stats()["response_cache_enabled"] is False
+
+
+def test_requests_to_change_todos_are_not_cached(app_main):
+    assert app_main.response_cache_key("add todo: buy milk") is None
+    assert app_main.response_cache_key("please delete that task") is None
+
+
+def test_todo_questions_are_retired_by_the_next_todo_save(app_main):
+    before = app_main.response_cache_key("what are my todos")
+    assert app_main.response_cache_key("what are my todos") == before
+
+    app_main.add_todo_to_storage("Buy milk")
+
+    assert app_main.response_cache_key("what are my todos") != before
+
+
+def test_repeated_prompt_is_answered_from_the_cache(client, caches, provider):
+    first = client.post("/api/chat", json={"message": "Tell me a joke"}).get_json()
+    second = client.post("/api/chat", json={"message": "tell me a joke!"}).get_json()
+
+    assert first["response"] == second["response"] == "reply 1"
+    assert len(provider) == 1
+    assert caches.hits == 1
+
+
+def test_provider_is_called_outside_the_storage_transaction(client, app_main, caches, provider):
+    client.post("/api/chat", json={"message": "Tell me a joke"})
+    client.post("/prompt", json={"prompt": "Tell me a story"})
+
+    assert [call["in_transaction"] for call in provider] == [False, False]
+    assert app_main.history.count() == 4
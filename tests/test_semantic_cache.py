@@ -0,0 +1,147 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from app import response_cache, semantic_cache  # noqa: E402
+from app.semantic_cache import SemanticCache  # noqa: E402
+
+MODEL = "test/model"
+SYSTEM = "You are a test assistant."
+
+# (cached prompt, new prompt) pairs that deserve the same reply
+PARAPHRASES = [
+    ("hi there", "hello there"),
+    ("hey", "Hello!"),
+    ("tell me a joke", "can you tell me a joke please"),
+    ("tell me a joke", "give me a joke"),
+    ("what is the capital of france", "What's the capital of France?"),
+    ("how do I reverse a list in python", "how to reverse lists in python"),
+    ("is 17 a prime number", "Is 17 prime number?"),
+    ("convert 100 miles to km", "please convert 100 miles to km"),
+    ("explain recursion", "can you explain recursion to me"),
+    ("write a haiku about autumn", "please write me a haiku about autumn"),
+    ("thanks", "thank you"),
+]
+
+# (cached prompt, new prompt) pairs that look alike but ask something else
+DIFFERENT_QUESTIONS = [
+    ("is 17 a prime number", "is 15 a prime number"),
+    ("convert 100 miles to km", "convert 5 miles to km"),
+    ("convert 5 miles to km", "convert 5 km to miles"),
+    ("what is 2 plus 2", "what is 2 plus 3"),
+    ("how do I reverse a list in python", "how do I reverse a string in python"),
+    ("what is the capital of portugal", "what is the capital of spain"),
+    ("what is the capital of portugal", "what is the capital of c++"),
+    ("tell me a joke", "tell me a joke about cats"),
+    ("explain recursion in python", "explain recursion in java"),
+    ("why is the sky blue", "what is the sky blue"),
+    ("is coffee healthy", "is coffee not healthy"),
+    ("how does photosynthesis work", "how does photosynthesis work in plants"),
+    ("hi there", "hi there, what time is it"),
+]
+
+
+@pytest.fixture
+def cache():
+    return SemanticCache(threshold=semantic_cache.DEFAULT_THRESHOLD, max_entries=100, ttl=60)
+
+
+@pytest.mark.parametrize("cached, prompt", PARAPHRASES)
+def test_paraphrase_gets_the_cached_reply(cache, cached, prompt):
+    cache.put(cached, "REPLY", MODEL, SYSTEM)
+
+    assert cache.get(prompt, MODEL, SYSTEM) == "REPLY"
+
+
+@pytest.mark.parametrize("cached, prompt", DIFFERENT_QUESTIONS)
+def test_different_question_misses(cache, cached, prompt):
+    cache.put(cached, "REPLY", MODEL, SYSTEM)
+
+    assert cache.get(prompt, MODEL, SYSTEM) is None
+
+
+def test_common_words_must_still_match_closely():
+    # "python" and "java" in most prompts: no longer rare, so only the
+    # threshold keeps them apart
+    cache = SemanticCache(threshold=semantic_cache.DEFAULT_THRESHOLD, max_entries=1000, ttl=60)
+    for i in range(200):
+        cache.put(f"python java topic{i} question{i}", f"background {i}", MODEL, SYSTEM)
+    cache.put("explain recursion in python", "PYTHON", MODEL, SYSTEM)
+
+    assert cache.get("can you explain recursion in python", MODEL, SYSTEM) == "PYTHON"
+    assert cache.get("explain recursion in java", MODEL, SYSTEM) is None
+
+
+def test_numbers_pick_between_near_identical_prompts(cache):
+    cache.put("is 15 a prime number", "FIFTEEN", MODEL, SYSTEM)
+    cache.put("is 17 a prime number", "SEVENTEEN", MODEL, SYSTEM)
+
+    assert cache.get("Is 17 a prime number?", MODEL, SYSTEM) == "SEVENTEEN"
+    assert cache.get("is 15 a prime number please", MODEL, SYSTEM) == "FIFTEEN"
+    assert cache.get("is 16 a prime number", MODEL, SYSTEM) is None
+
+
+@pytest.mark.parametrize("model, system", [("other/model", SYSTEM), (MODEL, "Be terse.")])
+def test_replies_are_kept_per_model_and_system_prompt(cache, model, system):
+    cache.put("tell me a joke", "REPLY", MODEL, SYSTEM)
+
+    assert cache.get("tell me a joke", model, system) is None
+    assert cache.get("tell me a joke", MODEL, SYSTEM) == "REPLY"
+
+
+def test_least_recently_used_entry_is_replaced_when_full():
+    cache = SemanticCache(threshold=semantic_cache.DEFAULT_THRESHOLD, max_entries=2, ttl=60)
+    cache.put("tell me a joke", "JOKE", MODEL, SYSTEM)
+    cache.put("write a haiku about autumn", "HAIKU", MODEL, SYSTEM)
+    cache.get("tell me a joke", MODEL, SYSTEM)
+
+    cache.put("explain recursion", "RECURSION", MODEL, SYSTEM)
+
+    assert cache.get("write a haiku about autumn", MODEL, SYSTEM) is None
+    assert cache.get("tell me a joke", MODEL, SYSTEM) == "JOKE"
+    assert cache.get("explain recursion", MODEL, SYSTEM) == "RECURSION"
+    assert cache.stats()["semantic_cache_evictions"] == 1
+
+
+def test_lookups_survive_many_evictions():
+    cache = SemanticCache(threshold=semantic_cache.DEFAULT_THRESHOLD, max_entries=4, ttl=60)
+    for i in range(3000):
+        cache.put(f"what is topic{i}", f"reply {i}", MODEL, SYSTEM)
+
+    assert cache.get("what is topic2999", MODEL, SYSTEM) == "reply 2999"
+    assert cache.get("what is topic0", MODEL, SYSTEM) is None
+    assert cache.entries == 4
+
+
+def test_expired_entries_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "monotonic", lambda: now[0])
+    cache = SemanticCache(threshold=semantic_cache.DEFAULT_THRESHOLD, max_entries=10, ttl=60)
+    cache.put("tell me a joke", "REPLY", MODEL, SYSTEM)
+
+    now[0] += 61
+
+    assert cache.get("tell me a joke", MODEL, SYSTEM) is None
+    assert (cache.expired, cache.entries) == (1, 0)
+
+
+def test_zero_threshold_disables_the_cache():
+    cache = SemanticCache(threshold=0, max_entries=10, ttl=60)
+    cache.put("tell me a joke", "REPLY", MODEL, SYSTEM)
+
+    assert cache.get("tell me a joke", MODEL, SYSTEM) is None
+    assert cache.stats()["semantic_cache_enabled"] is False
+
+
+def test_chat_paraphrase_is_served_for_the_same_system_prompt_only(monkeypatch):
+    import main
+    monkeypatch.setattr(response_cache, "_cache", response_cache.ResponseCache(
+        ttl=60, max_bytes=1 << 20, max_entries=100))
+    monkeypatch.setattr(semantic_cache, "_cache", SemanticCache(
+        threshold=semantic_cache.DEFAULT_THRESHOLD, max_entries=100, ttl=60))
+    _, cache_key = main.get_cached_response("hi there")
+    main.cache_ai_response("hi there", cache_key, "Hello!")
+
+    assert main.get_cached_response("hello there")[0] == "Hello!"
+    monkeypatch.setattr(main, "AI_SYSTEM_PROMPT", "You are a pirate.")
+    assert main.get_cached_response("hello there")[0] is None
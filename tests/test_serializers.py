@@ -0,0 +1,48 @@
+import pytest
+
+from app import storage
+
+DOCUMENT = {
+    "schema_version": 1,
+    "todos": [{"id": 1, "task": "Café ☕", "completed": False, "due_date": None}],
+    "next_id": 2
+}
+
+
+@pytest.mark.parametrize("name", ["json", "json-compact", "msgpack"])
+def test_formats_round_trip_and_are_detected(name):
+    if name == "msgpack":
+        pytest.importorskip("msgpack")
+    raw = storage.encode_document(DOCUMENT, storage.get_serializer(name))
+
+    assert storage.detect_format(raw) == name
+    assert storage.decode_document(raw) == DOCUMENT
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError, match="Unknown storage format"):
+        storage.get_serializer("yaml")
+
+
+def test_empty_file_decodes_to_empty_document():
+    assert storage.decode_document(b"  \n") == {}
+
+
+def test_backend_reads_files_written_in_any_format(tmp_path):
+    doc = tmp_path / "doc.json"
+    storage.FileBackend(storage.get_serializer("json-compact")).write(doc, DOCUMENT)
+
+    assert storage.FileBackend(storage.get_serializer("json")).read(doc) == DOCUMENT
+
+
+def test_convert_file_rewrites_in_the_new_format(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "LOCK_FILE", tmp_path / ".lock")
+    doc = tmp_path / "doc.json"
+    storage.FileBackend(storage.get_serializer("json")).write(doc, DOCUMENT)
+
+    old_format, old_size, new_size = storage.convert_file(doc, "json-compact")
+
+    assert old_format == "json"
+    assert new_size == doc.stat().st_size < old_size
+    assert storage.detect_format(doc.read_bytes()) == "json-compact"
+    assert storage.decode_document(doc.read_bytes()) == DOCUMENT
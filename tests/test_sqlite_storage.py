@@ -0,0 +1,110 @@
+import json
+
+from app.storage import SQLiteStorageManager
+
+
+def write_json_storage(path, todos, next_id):
+    """Write todolist.json to path and storage.json (holding the user name) beside it"""
+    path.write_text(json.dumps({"schema_version": 1, "todos": todos, "next_id": next_id}))
+    (path.parent / "storage.json").write_text(json.dumps({
+        "schema_version": 1,
+        "conversation_history": [],
+        "user_name": "Ada"
+    }))
+
+
+def open_sqlite(tmp_path, json_file):
+    return SQLiteStorageManager(
+        db_file=tmp_path / "storage.db", json_file=json_file,
+        storage_file=tmp_path / "storage.json"
+    )
+
+
+def make_json_todo(todo_id, task, completed=False):
+    return {
+        "id": todo_id, "task": task, "priority": "high", "due_date": None,
+        "created_at": "2026-10-01T09:00:00", "completed": completed, "completed_at": None
+    }
+
+
+def test_migration_keeps_json_ids(tmp_path):
+    json_file = tmp_path / "todolist.json"
+    write_json_storage(json_file, [
+        make_json_todo(3, "Buy milk"),
+        make_json_todo(7, "Ship release", completed=True)
+    ], next_id=8)
+
+    manager = open_sqlite(tmp_path, json_file)
+
+    assert [todo["id"] for todo in manager.get_todos()] == [3, 7]
+    assert manager.get_todo(7)["task"] == "Ship release"
+    assert manager.get_todo(7)["completed"] is True
+    assert manager.get_meta("user_name") == "Ada"
+
+
+def test_migration_continues_the_json_id_sequence(tmp_path):
+    json_file = tmp_path / "todolist.json"
+    # Todo 9 was deleted before the migration; its id must not come back
+    write_json_storage(json_file, [make_json_todo(4, "Water plants")], next_id=10)
+
+    manager = open_sqlite(tmp_path, json_file)
+
+    assert manager.add_todo("New task")["id"] == 10
+
+
+def test_migration_runs_once(tmp_path):
+    json_file = tmp_path / "todolist.json"
+    write_json_storage(json_file, [make_json_todo(1, "Only once")], next_id=2)
+
+    open_sqlite(tmp_path, json_file)
+    manager = open_sqlite(tmp_path, json_file)
+
+    assert [todo["id"] for todo in manager.get_todos()] == [1]
+    assert manager.add_todo("Next")["id"] == 2
+
+
+def test_fts_search_ranks_prefixes_and_follows_edits(tmp_path):
+    manager = SQLiteStorageManager(db_file=tmp_path / "storage.db", json_file=None)
+    milk = manager.add_todo("Buy milk and bread")
+    bake = manager.add_todo("Bake bread")
+    manager.add_todo("Pay the milkman")
+
+    assert [todo["id"] for todo, _ in manager.search_todos("bre mil")] == [milk["id"]]
+    assert len(manager.search_todos("milk")) == 2
+    assert len(manager.search_todos("milk", prefix=False)) == 1
+
+    manager.update_todo(bake["id"], task="Bake sourdough")
+    assert [todo["id"] for todo, _ in manager.search_todos("bread")] == [milk["id"]]
+    assert [todo["id"] for todo, _ in manager.search_todos("sourdough")] == [bake["id"]]
+
+    manager.remove_todo_by_id(milk["id"])
+    assert manager.search_todos("bread") == []
+
+    manager.clear_todos()
+    assert manager.search_todos("sourdough") == []
+    assert manager.find_todos("sourdough") == []
+
+
+def test_fts_indexes_todos_written_before_the_index_existed(tmp_path):
+    db_file = tmp_path / "storage.db"
+    manager = SQLiteStorageManager(db_file=db_file, json_file=None)
+    todo = manager.add_todo("Renew passport")
+    manager.set_meta("fts_version", "0")  # As if todo_fts predates this todo
+    with manager._connect() as conn:
+        conn.execute("INSERT INTO todo_fts (todo_fts) VALUES ('delete-all')")
+    assert manager.search_todos("passport") == []
+
+    reopened = SQLiteStorageManager(db_file=db_file, json_file=None)
+
+    assert [found["id"] for found, _ in reopened.search_todos("passport")] == [todo["id"]]
+
+
+def test_sqlite_fuzzy_lookup_sees_other_connections(tmp_path):
+    db_file = tmp_path / "storage.db"
+    reader = SQLiteStorageManager(db_file=db_file, json_file=None)
+    writer = SQLiteStorageManager(db_file=db_file, json_file=None)
+    assert reader.find_todos("grocery list") == []
+
+    todo = writer.add_todo("Grocery list")
+
+    assert [found["id"] for found, _ in reader.find_todos("grocry lst")] == [todo["id"]]
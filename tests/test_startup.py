@@ -0,0 +1,37 @@
+import subprocess
+import sys
+
+from tests.conftest import REPO_ROOT
+
+
+def test_importing_main_touches_no_files(tmp_path):
+    before = {path.name: path.stat().st_mtime_ns for path in REPO_ROOT.iterdir()}
+
+    subprocess.run(
+        [sys.executable, "-c", "import main, index, main_complete"],
+        cwd=REPO_ROOT, check=True,
+        env={"PATH": "", "OPENROUTER_API_KEY": "", "PYTHONDONTWRITEBYTECODE": "1"}
+    )
+
+    after = {path.name: path.stat().st_mtime_ns for path in REPO_ROOT.iterdir()}
+    assert {k: v for k, v in after.items() if before.get(k) != v} == {}
+
+
+def test_first_request_imports_legacy_history(app_main, client, monkeypatch):
+    app_main.save_data(app_main.STORAGE_FILE, {
+        **app_main.load_data(app_main.STORAGE_FILE),
+        "conversation_history": [
+            {"role": "user", "content": "hello", "timestamp": "2025-01-01T09:00:00"},
+            {"role": "assistant", "content": "hi", "timestamp": "2025-01-01T09:00:01"},
+        ]
+    })
+    preconnects = []
+    monkeypatch.setattr(app_main.llm, "preconnect", lambda: preconnects.append(True))
+    monkeypatch.setattr(app_main, "_started", False)
+
+    client.get("/api/todos")
+    client.get("/api/todos")
+
+    assert app_main.history.count() == 2
+    assert app_main.load_data(app_main.STORAGE_FILE)["conversation_history"] == []
+    assert preconnects == [True]
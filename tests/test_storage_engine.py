@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+
+import pytest
+
+from app import storage
+
+
+def test_load_reuses_the_parsed_document(engine, tmp_path):
+    doc = tmp_path / "doc.json"
+    engine.save(doc, {"n": 1})
+    engine.invalidate()
+
+    first = engine.load(doc)
+    second = engine.load(doc)
+
+    assert first is second
+    assert engine.cache_misses == 1
+    assert engine.cache_hits == 1
+
+
+def test_load_rereads_a_file_changed_by_another_writer(engine, tmp_path):
+    doc = tmp_path / "doc.json"
+    engine.save(doc, {"n": 1})
+    assert engine.load(doc)["n"] == 1
+
+    doc.write_text(json.dumps({"n": 22222}))
+    stat = doc.stat()
+    os.utime(doc, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert engine.load(doc)["n"] == 22222
+
+
+def test_load_of_a_missing_file_is_empty_and_uncached(engine, tmp_path):
+    doc = tmp_path / "missing.json"
+
+    assert engine.load(doc) == {}
+    assert engine.stats()["cached_documents"] == 0
+
+
+def test_atomic_write_keeps_the_old_file_when_the_write_fails(tmp_path):
+    doc = tmp_path / "doc.json"
+    doc.write_bytes(b'{"n": 1}')
+
+    with pytest.raises(TypeError):
+        storage.atomic_write_bytes(doc, "not bytes")
+
+    assert doc.read_bytes() == b'{"n": 1}'
+    assert [p.name for p in tmp_path.iterdir()] == ["doc.json"]
+
+
+def test_transactions_in_two_workers_do_not_lose_updates(tmp_path):
+    # Two engines on one lock file behave like two gunicorn workers
+    workers = [
+        storage.StorageEngine(backend=storage.FileBackend(), lock_file=tmp_path / ".lock",
+                              durability="sync")
+        for _ in range(2)
+    ]
+    doc = tmp_path / "counter.json"
+
+    def increment(worker):
+        for _ in range(50):
+            with worker.transaction():
+                data = worker.load(doc)
+                data["n"] = data.get("n", 0) + 1
+                worker.save(doc, data)
+
+    threads = [threading.Thread(target=increment, args=(w,)) for w in workers for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert storage.FileBackend().read(doc)["n"] == 200
+
+
+def test_storage_manager_does_not_reset_existing_todos(engine, tmp_path):
+    files = {"storage_file": tmp_path / "storage.json", "todo_file": tmp_path / "todolist.json"}
+    first = storage.StorageManager(engine=engine, **files)
+    first.add_todo("Keep me")
+
+    second = storage.StorageManager(engine=engine, **files)
+
+    assert [todo["task"] for todo in second.get_todos()] == ["Keep me"]
+
+
+@pytest.mark.parametrize("durability", ["sync", "batched", "relaxed"])
+def test_rollback_discards_in_place_edits(tmp_path, durability):
+    engine = storage.StorageEngine(backend=storage.FileBackend(), lock_file=tmp_path / ".lock",
+                                   durability=durability, flush_interval_ms=10_000)
+    doc = tmp_path / "doc.json"
+    engine.save(doc, {"value": 1})
+
+    with pytest.raises(RuntimeError):
+        with engine.transaction():
+            data = engine.load(doc)
+            data["value"] = 999
+            engine.save(doc, data)
+            raise RuntimeError("request failed")
+
+    assert engine.load(doc)["value"] == 1
+    engine.flush()
+    engine.invalidate()
+    assert engine.load(doc)["value"] == 1
+    assert storage.FileBackend().read(doc)["value"] == 1
+
+
+@pytest.mark.parametrize("durability", ["batched", "relaxed"])
+def test_commit_after_pending_write_keeps_both_changes(tmp_path, durability):
+    engine = storage.StorageEngine(backend=storage.FileBackend(), lock_file=tmp_path / ".lock",
+                                   durability=durability, flush_interval_ms=10_000)
+    doc = tmp_path / "doc.json"
+    engine.save(doc, {"a": 1})
+
+    with engine.transaction():
+        data = engine.load(doc)
+        data["b"] = 2
+        engine.save(doc, data)
+
+    engine.flush()
+    assert storage.FileBackend().read(doc) == {"a": 1, "b": 2}
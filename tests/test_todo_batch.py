@@ -0,0 +1,88 @@
+import copy
+from datetime import datetime
+
+
+def post_batch(client, *operations):
+    return client.post("/api/todos/batch", json={"operations": list(operations)})
+
+
+def test_mixed_batch_applies_in_order(app_main, client):
+    kept = client.post("/api/todos", json={"task": "Existing"}).json["todo"]["id"]
+    gone = client.post("/api/todos", json={"task": "Remove me"}).json["todo"]["id"]
+
+    response = post_batch(
+        client,
+        {"op": "add", "task": "  Fresh task  "},
+        {"op": "update", "id": kept, "task": "Existing, renamed"},
+        {"op": "complete", "id": kept},
+        {"op": "delete", "id": gone},
+        {"op": "complete", "id": 999}
+    )
+
+    assert response.status_code == 200
+    body = response.json
+    assert [result["status"] for result in body["results"]] == [
+        "created", "updated", "completed", "deleted", "not_found"
+    ]
+    assert body["applied"] == 4
+    todos = {todo["id"]: todo for todo in client.get("/api/todos").json["todos"]}
+    added = body["results"][0]["todo"]["id"]
+    assert set(todos) == {kept, added}
+    assert todos[added]["task"] == "Fresh task"
+    assert todos[kept]["task"] == "Existing, renamed"
+    assert todos[kept]["completed"] is True
+    assert [todo["id"] for todo, _ in app_main.search_todos("renamed")] == [kept]
+
+
+def test_invalid_operation_rejects_the_whole_batch(app_main, client):
+    todo_id = client.post("/api/todos", json={"task": "Untouched"}).json["todo"]["id"]
+    before = copy.deepcopy(app_main.load_data(app_main.TODO_FILE))
+    analytics_before = app_main.get_analytics()["total_tasks_created"]
+
+    response = post_batch(
+        client,
+        {"op": "add", "task": "Never added"},
+        {"op": "complete", "id": todo_id},
+        {"op": "update", "id": todo_id, "task": "   "}
+    )
+
+    assert response.status_code == 400
+    assert response.json["error"] == "Operation 2: task cannot be empty"
+    assert app_main.load_data(app_main.TODO_FILE) == before
+    assert app_main.get_analytics()["total_tasks_created"] == analytics_before
+    assert post_batch(client, {"op": "rename", "id": 1}).json["error"] == (
+        "Operation 0: op must be add, update, complete or delete"
+    )
+    assert post_batch(client, {"op": "delete", "id": "1"}).json["error"] == (
+        "Operation 0: id must be an integer"
+    )
+
+
+def test_batch_records_analytics_once_per_kind(app_main, client):
+    post_batch(
+        client,
+        {"op": "add", "task": "One"},
+        {"op": "add", "task": "Two"},
+        {"op": "add", "task": "Three"},
+        {"op": "complete", "id": 1},
+        {"op": "complete", "id": 2},
+        {"op": "update", "id": 2, "completed": False},  # Completed and undone in one batch
+        {"op": "complete", "id": 1}  # Already done: not counted twice
+    )
+
+    analytics = app_main.get_analytics()
+    assert analytics["total_tasks_created"] == 3
+    assert analytics["total_tasks_completed"] == 1
+    today = datetime.now().strftime("%Y-%m-%d")
+    daily = app_main.load_data(app_main.STORAGE_FILE)["analytics_rollups"]["daily"]
+    assert daily[today][:2] == [3, 1]
+
+
+def test_batch_can_uncomplete_an_earlier_completion(app_main, client):
+    todo_id = client.post("/api/todos", json={"task": "Done yesterday"}).json["todo"]["id"]
+    client.post(f"/api/todos/{todo_id}/complete")
+
+    result = post_batch(client, {"op": "update", "id": todo_id, "completed": False})
+
+    assert result.json["results"][0]["todo"]["completed_at"] is None
+    assert app_main.get_analytics()["total_tasks_completed"] == 0
@@ -0,0 +1,85 @@
+import importlib
+
+import pytest
+
+from app import storage
+from app.search import TrigramIndex
+
+
+def ids(matches):
+    return [todo["id"] for todo, _ in matches]
+
+
+def test_trigram_index_tolerates_typos_and_filler_words():
+    index = TrigramIndex([
+        {"id": 1, "task": "Buy groceries for the week"},
+        {"id": 2, "task": "Call the plumber"},
+        {"id": 3, "task": "Grocery list"}
+    ])
+
+    matches = index.search("the grocry thing")
+    assert {todo_id for todo_id, _ in matches} == {1, 3}
+    assert matches[0][0] == 3  # Closer word, fewer extra grams
+    assert all(0 < score <= 1 for _, score in matches)
+    assert index.search("zzzz") == []
+
+
+def test_fuzzy_ranking_prefers_the_closest_task(manager):
+    manager.add_todo("Book dentist appointment")
+    target = manager.add_todo("Renew passport")
+    manager.add_todo("Pass the salt")
+
+    matches = manager.find_todos("renw pasport", limit=2)
+
+    assert ids(matches)[0] == target["id"]
+    assert matches[0][1] > (matches[1][1] if len(matches) > 1 else 0)
+
+
+def test_trigram_index_follows_update_remove_and_clear(manager):
+    keep = manager.add_todo("Water the plants")
+    change = manager.add_todo("Write quarterly report")
+    assert ids(manager.find_todos("quartrly report")) == [change["id"]]
+
+    manager.update_todo(change["id"], task="Write annual summary")
+    assert manager.find_todos("quartrly report") == []
+    assert ids(manager.find_todos("anual sumary")) == [change["id"]]
+
+    manager.remove_todo_by_id(keep["id"])
+    assert manager.find_todos("water plants") == []
+
+    manager.clear_todos()
+    assert manager.find_todos("annual summary") == []
+
+
+@pytest.fixture
+def tools(manager, monkeypatch):
+    """app.tools bound to the test's StorageManager (needs langchain_core)"""
+    pytest.importorskip("langchain_core")
+    # app.tools opens its storage at import; hand it the test's manager instead
+    monkeypatch.setattr(storage, "create_storage_manager", lambda: manager)
+    module = importlib.import_module("app.tools")
+    monkeypatch.setattr(module, "storage", manager)
+    return module
+
+
+def test_find_todo_tool_lists_ids_best_first(tools, manager):
+    manager.add_todo("Buy groceries")
+    wanted = manager.add_todo("Pick up dry cleaning")
+
+    reply = tools.find_todo.invoke({"query": "the dry cleanng thing"})
+
+    lines = reply.splitlines()
+    assert lines[0].startswith("🔍 Best matches")
+    assert lines[1].startswith(f"⏳ #{wanted['id']} Pick up dry cleaning (match ")
+
+
+def test_find_todo_tool_reports_no_match(tools):
+    assert tools.find_todo.invoke({"query": "xylophone"}) == "🔍 No tasks resemble 'xylophone'"
+
+
+def test_agent_offers_find_todo(tools):
+    pytest.importorskip("langchain")
+    pytest.importorskip("langchain_openai")
+    agent = importlib.import_module("app.agent")
+
+    assert "find_todo" in [tool.name for tool in agent.tools]
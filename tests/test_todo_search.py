@@ -0,0 +1,62 @@
+from app import storage
+from app.search import TodoSearchIndex
+
+
+def ids(matches):
+    return [todo["id"] for todo, _ in matches]
+
+
+def test_search_index_ands_terms_and_matches_prefixes():
+    index = TodoSearchIndex([
+        {"id": 1, "task": "Buy milk and bread"},
+        {"id": 2, "task": "Bake bread"},
+        {"id": 3, "task": "Pay the milkman"}
+    ])
+
+    assert [todo_id for todo_id, _ in index.search("bread")] == [2, 1]  # Newer first on ties
+    assert [todo_id for todo_id, _ in index.search("bre mil")] == [1]
+    assert [todo_id for todo_id, _ in index.search("milk")] == [1, 3]  # Exact beats prefix
+    assert index.search("milk", prefix=False) == [(1, index.search("milk")[0][1])]
+    assert index.search("m") == []  # Too short to be a prefix
+
+
+def test_search_ranks_rarer_terms_higher():
+    index = TodoSearchIndex([
+        {"id": 1, "task": "Email report"},
+        {"id": 2, "task": "Email team"},
+        {"id": 3, "task": "Email invoice report"}
+    ])
+
+    scores = dict(index.search("email"))
+    assert scores[1] == scores[2] == scores[3]
+    assert index.search("report email")[0][1] > scores[1]
+
+
+def test_index_follows_update_remove_and_clear(manager):
+    keep = manager.add_todo("Water the plants")
+    change = manager.add_todo("Write quarterly report")
+    assert ids(manager.search_todos("quarterly")) == [change["id"]]
+
+    manager.update_todo(change["id"], task="Write annual summary")
+    assert manager.search_todos("quarterly") == []
+    assert ids(manager.search_todos("annual")) == [change["id"]]
+
+    manager.remove_todo_by_id(keep["id"])
+    assert manager.search_todos("plants") == []
+
+    manager.clear_todos()
+    assert manager.search_todos("annual") == []
+    fresh = manager.add_todo("Fresh start")
+    assert ids(manager.search_todos("fresh")) == [fresh["id"]]
+
+
+def test_web_edits_keep_the_shared_index_current(app_main, client, manager):
+    todo_id = client.post("/api/todos", json={"task": "Draft blog post"}).json["todo"]["id"]
+    assert ids(manager.search_todos("blog")) == [todo_id]
+
+    client.patch(f"/api/todos/{todo_id}", json={"task": "Draft newsletter"})
+    assert manager.search_todos("blog") == []
+    assert [todo["id"] for todo, _ in app_main.search_todos("newsletter")] == [todo_id]
+
+    client.delete(f"/api/todos/{todo_id}")
+    assert manager.search_todos("newsletter") == []
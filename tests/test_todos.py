@@ -0,0 +1,107 @@
+from datetime import datetime
+
+from app import storage
+
+
+def test_todo_ids_are_stable_and_never_reused(client):
+    first = client.post("/api/todos", json={"task": "First"}).json["todo"]
+    second = client.post("/api/todos", json={"task": "Second"}).json["todo"]
+    client.delete(f"/api/todos/{second['id']}")
+
+    third = client.post("/api/todos", json={"task": "Third"}).json["todo"]
+
+    assert third["id"] > second["id"] > first["id"]
+    assert client.get(f"/api/todos/{first['id']}").json["todo"]["task"] == "First"
+    assert client.get(f"/api/todos/{second['id']}").status_code == 404
+
+
+def test_uncompleting_a_todo_takes_the_completion_back(app_main, client):
+    todo_id = client.post("/api/todos", json={"task": "Flip me"}).json["todo"]["id"]
+
+    client.post(f"/api/todos/{todo_id}/complete")
+    client.patch(f"/api/todos/{todo_id}", json={"completed": False})
+    client.post(f"/api/todos/{todo_id}/complete")
+
+    analytics = app_main.get_analytics()
+    assert analytics["total_tasks_completed"] == 1
+    assert analytics["completion_rate"] == 100
+    daily = app_main.load_data(app_main.STORAGE_FILE)["analytics_rollups"]["daily"]
+    assert daily[datetime.now().strftime("%Y-%m-%d")][1] == 1
+
+
+def test_uncompleting_the_only_completion_resets_the_counters(app_main, client):
+    todo_id = client.post("/api/todos", json={"task": "Undo me"}).json["todo"]["id"]
+    client.post(f"/api/todos/{todo_id}/complete")
+
+    client.patch(f"/api/todos/{todo_id}", json={"completed": False})
+
+    analytics = app_main.get_analytics()
+    assert analytics["total_tasks_completed"] == 0
+    assert analytics["completion_rate"] == 0
+    assert analytics["most_productive_day"] is None
+    assert client.get(f"/api/todos/{todo_id}").json["todo"]["completed_at"] is None
+
+
+def test_completing_twice_counts_once(app_main, client):
+    todo_id = client.post("/api/todos", json={"task": "Once"}).json["todo"]["id"]
+
+    client.post(f"/api/todos/{todo_id}/complete")
+    client.post(f"/api/todos/{todo_id}/complete")
+
+    assert app_main.get_analytics()["total_tasks_completed"] == 1
+
+
+def agent_storage(app_main):
+    """The JSON StorageManager the LangChain tools would use, on the test's files"""
+    return storage.StorageManager(app_main.STORAGE_FILE, app_main.TODO_FILE, storage.engine)
+
+
+def test_agent_tools_and_web_api_share_one_todo_list(app_main, client):
+    manager = agent_storage(app_main)
+    from_agent = manager.add_todo("Added by the agent", priority="high")
+    from_web = client.post("/api/todos", json={"task": "Added on the web"}).json["todo"]
+
+    assert from_web["id"] == from_agent["id"] + 1
+    assert [todo["task"] for todo in client.get("/api/todos").json["todos"]] == [
+        "Added by the agent", "Added on the web"
+    ]
+    assert manager.get_todo(from_web["id"])["task"] == "Added on the web"
+    assert "todo_list" not in app_main.load_data(app_main.STORAGE_FILE)
+
+
+def test_agent_analytics_recount_after_web_edits(app_main, client):
+    manager = agent_storage(app_main)
+    todo_id = manager.add_todo("Finish on the web")["id"]
+    assert manager.get_analytics()["completed"] == 0
+
+    client.post(f"/api/todos/{todo_id}/complete")
+
+    assert manager.get_analytics()["completed"] == 1
+
+
+def test_legacy_agent_todos_move_into_todolist_once(app_main, client):
+    client.post("/api/todos", json={"task": "Web todo"})  # Takes id 1
+    data = app_main.load_data(app_main.STORAGE_FILE)
+    data["todo_list"] = [
+        {**make_todo_fields(1), "task": "Agent todo with a taken id"},
+        {**make_todo_fields(5), "task": "Agent todo with a free id"}
+    ]
+    data["next_todo_id"] = 7
+    app_main.save_data(app_main.STORAGE_FILE, data)
+
+    assert storage.merge_legacy_todo_list(app_main.STORAGE_FILE, app_main.TODO_FILE) == 2
+    assert storage.merge_legacy_todo_list(app_main.STORAGE_FILE, app_main.TODO_FILE) == 0
+
+    todos = client.get("/api/todos").json["todos"]
+    assert [(todo["id"], todo["task"]) for todo in todos] == [
+        (1, "Web todo"), (7, "Agent todo with a taken id"), (5, "Agent todo with a free id")
+    ]
+    assert client.post("/api/todos", json={"task": "Next"}).json["todo"]["id"] == 8
+    assert "next_todo_id" not in app_main.load_data(app_main.STORAGE_FILE)
+
+
+def make_todo_fields(todo_id):
+    return {
+        "id": todo_id, "task": "", "priority": "medium", "due_date": None,
+        "created_at": "2026-10-01T09:00:00", "completed": False, "completed_at": None
+    }
@@ -0,0 +1,141 @@
+import threading
+
+import pytest
+
+from app import storage
+
+
+def wal_engine(tmp_path, checkpoint_bytes=1024 * 1024):
+    """A StorageEngine on the WAL backend, like a worker with REX_STORAGE_BACKEND=wal"""
+    return storage.StorageEngine(
+        backend=storage.WalBackend(checkpoint_bytes=checkpoint_bytes),
+        lock_file=tmp_path / ".lock", durability="sync"
+    )
+
+
+def save_todos(engine, doc, *tasks):
+    """Save a todo document holding tasks, one record per task"""
+    engine.save(doc, {"todos": [{"id": i, "task": task} for i, task in enumerate(tasks, 1)]})
+
+
+def tasks(document):
+    return [todo["task"] for todo in document["todos"]]
+
+
+def test_saves_append_to_the_log_and_replay_after_a_restart(tmp_path):
+    engine = wal_engine(tmp_path)
+    doc = tmp_path / "todolist.json"
+    save_todos(engine, doc, "one")
+    save_todos(engine, doc, "one", "two")
+    save_todos(engine, doc, "one, edited", "two")
+
+    assert engine.backend.checkpoints == 1
+    assert engine.backend.appends == 2
+    restarted = storage.WalBackend()
+    assert tasks(restarted.read(doc)) == ["one, edited", "two"]
+    assert restarted.recoveries[doc.name]["records"] == 2
+
+
+def test_torn_final_record_is_dropped_and_the_next_save_checkpoints(tmp_path):
+    engine = wal_engine(tmp_path)
+    doc = tmp_path / "todolist.json"
+    save_todos(engine, doc, "one")
+    save_todos(engine, doc, "one", "two")
+    save_todos(engine, doc, "one", "two", "three")
+    log = storage.wal_path(doc)
+    log.write_bytes(log.read_bytes()[:-3])  # Crash mid-append
+
+    restarted = wal_engine(tmp_path)
+    document = restarted.load(doc)
+
+    assert tasks(document) == ["one", "two"]
+    assert restarted.backend.recoveries[doc.name]["torn_tail"] is True
+    document["todos"].append({"id": 3, "task": "three again"})
+    restarted.save(doc, document)
+    assert restarted.backend.checkpoints == 1
+    assert tasks(storage.WalBackend().read(doc)) == ["one", "two", "three again"]
+
+
+def test_log_left_over_from_an_interrupted_checkpoint_is_ignored(tmp_path):
+    engine = wal_engine(tmp_path)
+    doc = tmp_path / "todolist.json"
+    save_todos(engine, doc, "old")
+    save_todos(engine, doc, "old", "appended")
+    stale_log = storage.wal_path(doc).read_bytes()
+    # Crash after the checkpoint's new snapshot landed, before its new log did
+    checkpoint = engine.backend.serialize({"todos": [{"id": 1, "task": "new"}]})
+    storage.atomic_write_bytes(doc, checkpoint)
+    storage.wal_path(doc).write_bytes(stale_log)
+
+    restarted = storage.WalBackend()
+
+    assert tasks(restarted.read(doc)) == ["new"]
+    assert restarted.recoveries[doc.name]["stale_log"] is True
+
+
+def test_log_is_folded_into_a_snapshot_at_the_checkpoint_size(tmp_path):
+    engine = wal_engine(tmp_path, checkpoint_bytes=256)
+    doc = tmp_path / "todolist.json"
+    names = []
+    for i in range(20):
+        names.append(f"task number {i}")
+        save_todos(engine, doc, *names)
+
+    assert engine.backend.checkpoints > 1
+    assert storage.wal_path(doc).stat().st_size < 256 + 128
+    assert tasks(storage.WalBackend().read(doc)) == names
+
+
+def test_two_workers_appending_to_one_log_lose_nothing(tmp_path):
+    # Two engines on one lock file behave like two gunicorn workers
+    workers = [wal_engine(tmp_path) for _ in range(2)]
+    doc = tmp_path / "counter.json"
+
+    def increment(worker, name):
+        for _ in range(25):
+            with worker.transaction():
+                data = worker.load(doc)
+                data[name] = data.get(name, 0) + 1
+                data["n"] = data.get("n", 0) + 1
+                worker.save(doc, data)
+
+    threads = [threading.Thread(target=increment, args=(worker, f"w{i}"))
+               for i, worker in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    document = storage.WalBackend().read(doc)
+    assert (document["n"], document["w0"], document["w1"]) == (50, 25, 25)
+    assert all(worker.backend.appends for worker in workers)
+
+
+@pytest.mark.parametrize("backend", [storage.FileBackend, storage.WalBackend])
+def test_undecodable_document_is_quarantined_not_overwritten(tmp_path, backend):
+    engine = storage.StorageEngine(backend=backend(), lock_file=tmp_path / ".lock",
+                                   durability="sync")
+    todo_file = tmp_path / "todolist.json"
+    todo_file.write_bytes(b'{"todos": [{"id": 1, "task": "precious"')
+
+    manager = storage.StorageManager(tmp_path / "storage.json", todo_file, engine)
+
+    assert manager.get_todos() == []
+    quarantined = list(tmp_path.glob("todolist.json.*.corrupt"))
+    assert len(quarantined) == 1
+    assert quarantined[0].read_bytes() == b'{"todos": [{"id": 1, "task": "precious"'
+    manager.add_todo("Fresh")
+    assert [todo["task"] for todo in manager.get_todos()] == ["Fresh"]
+
+
+def test_quarantine_moves_the_log_with_its_snapshot(tmp_path):
+    engine = wal_engine(tmp_path)
+    doc = tmp_path / "todolist.json"
+    save_todos(engine, doc, "one")
+    save_todos(engine, doc, "one", "two")
+    doc.write_bytes(b"\x00REX:bogus")
+
+    assert storage.WalBackend().read(doc) == {}
+
+    assert not storage.wal_path(doc).exists()
+    assert len(list(tmp_path.glob("todolist.json.*.wal.corrupt"))) == 1